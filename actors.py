@@ -0,0 +1,79 @@
+import asyncio
+import contextvars
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+import metrics
+
+log = logging.getLogger("actors")
+
+MAILBOX_CONCURRENCY = int(os.getenv("MAILBOX_CONCURRENCY", "64"))
+MAILBOX_MAX_PENDING = int(os.getenv("MAILBOX_MAX_PENDING", "5000"))
+
+
+def _chat_key(event) -> str:
+    try:
+        chat_id, user_id = event.get_ids()
+    except Exception:
+        return "global"
+    if chat_id is not None:
+        return f"chat:{chat_id}"
+    if user_id is not None:
+        return f"user:{user_id}"
+    return "global"
+
+
+class Mailboxes:
+    def __init__(self, handle, limit: int = MAILBOX_CONCURRENCY, max_pending: int = MAILBOX_MAX_PENDING):
+        self.handle = handle
+        self.sem = asyncio.Semaphore(limit)
+        self.max_pending = max_pending
+        self.boxes: Dict[str, Deque[Tuple[object, contextvars.Context, asyncio.Future]]] = {}
+        self.pending = 0
+        self.room = asyncio.Event()
+        self.room.set()
+
+    async def submit(self, event) -> asyncio.Future:
+        while self.pending >= self.max_pending:
+            self.room.clear()
+            await self.room.wait()
+        key = _chat_key(event)
+        done = asyncio.get_running_loop().create_future()
+        item = (event, contextvars.copy_context(), done)
+        self.pending += 1
+        box = self.boxes.get(key)
+        if box is not None:
+            box.append(item)
+            return done
+        box = self.boxes[key] = deque([item])
+        asyncio.create_task(self._run(key, box))
+        return done
+
+    async def _run(self, key: str, box: deque):
+        try:
+            while box:
+                event, ctx, done = box[0]
+                async with self.sem:
+                    try:
+                        await asyncio.create_task(self.handle(event), context=ctx)
+                    except Exception as e:
+                        log.exception("mailbox %s: handler failed: %s", key, e)
+                box.popleft()
+                if not done.done():
+                    done.set_result(None)
+                self.pending -= 1
+                if self.pending < self.max_pending:
+                    self.room.set()
+        finally:
+            if self.boxes.get(key) is box:
+                del self.boxes[key]
+
+
+def install(dp) -> Mailboxes:
+    boxes = Mailboxes(dp.handle)
+    metrics.watch_size("mailbox.chats", boxes.boxes)
+    metrics.STATE_SIZE.watch(lambda: boxes.pending, name="mailbox.pending")
+    dp.handle = boxes.submit
+    return boxes
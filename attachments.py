@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import aiofiles
+import aiohttp
+
+import metrics
+
+log = logging.getLogger("attachments")
+
+BASE_DIR = Path(__file__).resolve().parent
+BLOB_DIR = BASE_DIR / "homework_data" / "blobs"
+TMP_DIR = BLOB_DIR / "tmp"
+
+MAX_ATTACHMENT_BYTES = int(os.getenv("HW_MAX_ATTACHMENT_MB", "20")) * 1024 * 1024
+DOWNLOAD_CONCURRENCY = int(os.getenv("HW_DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_TIMEOUT_SEC = float(os.getenv("HW_DOWNLOAD_TIMEOUT_SEC", "120"))
+CHUNK_SIZE = 64 * 1024
+ORPHAN_TTL_SEC = 24 * 3600
+GC_INTERVAL_SEC = 3600
+
+_download_sem = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+_last_gc = {"ts": 0.0}
+
+
+class AttachmentTooLarge(Exception):
+    pass
+
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256
+
+
+def file_name(entry) -> str:
+    if isinstance(entry, dict):
+        return entry.get("name") or entry.get("sha256") or ""
+    return str(entry)
+
+
+def _ensure_manifest(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS homework_attachments (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            name TEXT,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL
+        )
+        """
+    )
+
+
+def _register_blob(db_path: Path, sha256: str, size: int, name: str):
+    with metrics.connect(db_path, "homework") as conn:
+        _ensure_manifest(conn)
+        conn.execute(
+            "INSERT INTO homework_attachments(sha256, size, name, refcount, created_at) VALUES (?,?,?,0,?) "
+            "ON CONFLICT(sha256) DO UPDATE SET created_at=excluded.created_at WHERE refcount <= 0",
+            (sha256, size, name, time.time()),
+        )
+
+
+def add_refs(conn: sqlite3.Connection, files: List[dict]):
+    _ensure_manifest(conn)
+    conn.executemany(
+        "UPDATE homework_attachments SET refcount = refcount + 1 WHERE sha256=?",
+        [(f["sha256"],) for f in files if isinstance(f, dict) and f.get("sha256")],
+    )
+
+
+def _collect_garbage_at(db_path: Path) -> int:
+    with metrics.connect(db_path, "homework") as conn:
+        return collect_garbage(conn)
+
+
+def collect_garbage(conn: sqlite3.Connection, orphan_ttl: float = ORPHAN_TTL_SEC) -> int:
+    _ensure_manifest(conn)
+    rows = conn.execute(
+        "SELECT sha256 FROM homework_attachments WHERE refcount <= 0 AND created_at < ?",
+        (time.time() - orphan_ttl,),
+    ).fetchall()
+    removed = 0
+    for (sha,) in rows:
+        try:
+            blob_path(sha).unlink(missing_ok=True)
+        except OSError as e:
+            log.warning("Не удалось удалить вложение %s: %s", sha, e)
+            continue
+        conn.execute("DELETE FROM homework_attachments WHERE sha256=? AND refcount <= 0", (sha,))
+        removed += 1
+    conn.commit()
+    return removed
+
+
+async def _download_to_blob(session: aiohttp.ClientSession, url: str, max_bytes: int) -> Tuple[str, int]:
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = TMP_DIR / f"{uuid.uuid4().hex}.part"
+    h = hashlib.sha256()
+    size = 0
+    try:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            if resp.content_length is not None and resp.content_length > max_bytes:
+                raise AttachmentTooLarge(resp.content_length)
+            async with aiofiles.open(tmp, "wb") as f:
+                async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise AttachmentTooLarge(size)
+                    h.update(chunk)
+                    await f.write(chunk)
+
+        sha = h.hexdigest()
+        dst = blob_path(sha)
+        if dst.exists():
+            tmp.unlink(missing_ok=True)
+        else:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, dst)
+        return sha, size
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+async def store_attachments(
+    items: List[dict],
+    db_path: Path,
+    max_bytes: int = MAX_ATTACHMENT_BYTES,
+) -> Tuple[List[dict], List[Tuple[str, str]]]:
+    stored: List[Optional[dict]] = [None] * len(items)
+    failed: List[Tuple[str, str]] = []
+    timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT_SEC)
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async def _one(i: int, it: dict):
+            name = it["name"]
+            declared = it.get("size")
+            if declared is not None and declared > max_bytes:
+                failed.append((name, "слишком большой файл"))
+                return
+            async with _download_sem:
+                try:
+                    sha, size = await _download_to_blob(session, it["url"], max_bytes)
+                except AttachmentTooLarge:
+                    failed.append((name, "слишком большой файл"))
+                    return
+                except Exception as e:
+                    log.warning("Не удалось скачать вложение %s: %s", name, e)
+                    failed.append((name, "ошибка загрузки"))
+                    return
+            await asyncio.to_thread(_register_blob, db_path, sha, size, name)
+            stored[i] = {"name": name, "sha256": sha, "size": size}
+
+        await asyncio.gather(*(_one(i, it) for i, it in enumerate(items)))
+
+    if time.time() - _last_gc["ts"] > GC_INTERVAL_SEC:
+        _last_gc["ts"] = time.time()
+        try:
+            await asyncio.to_thread(_collect_garbage_at, db_path)
+        except Exception as e:
+            log.warning("attachments gc failed: %s", e)
+
+    return [s for s in stored if s is not None], failed
@@ -0,0 +1,282 @@
+import json
+import random
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+RING = [
+    ("08:30", "10:00"),
+    ("10:15", "11:45"),
+    ("12:00", "13:30"),
+    ("13:50", "15:20"),
+    ("15:35", "17:05"),
+    ("17:20", "18:50"),
+    ("19:05", "20:35"),
+]
+
+DISCIPLINES = [
+    "Эконометрика",
+    "Теория вероятностей и математическая статистика",
+    "Финансовые рынки и институты",
+    "Базы данных",
+    "Бухгалтерский учёт",
+    "Иностранный язык в профессиональной сфере",
+    "Макроэкономика",
+    "Машинное обучение",
+    "Корпоративные финансы",
+    "Физическая культура и спорт",
+    "Налоги и налогообложение",
+    "Анализ данных",
+]
+KINDS = ["Лекции", "Практические (семинарские) занятия", "Лабораторные работы"]
+SURNAMES = ["Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов", "Соколова", "Лебедев", "Новикова", "Морозов", "Волкова"]
+INITIALS = ["А.А.", "В.С.", "Е.Н.", "И.П.", "М.Ю.", "О.В.", "С.К."]
+BUILDINGS = ["Ленинградский пр-т, 49", "Ленинградский пр-т, 51", "Кибальчича, 1", "Щербаковская, 38"]
+GROUP_PREFIXES = ["ПИ", "БИ", "ФБ", "ЭБ", "МЭ", "ГМУ", "ЮР", "СА"]
+
+
+def group_name(i: int) -> str:
+    n = len(GROUP_PREFIXES)
+    return f"{GROUP_PREFIXES[i % n]}{21 + (i // n) % 4}-{i // (n * 4) + 1}"
+
+
+def teacher(rnd: random.Random, oid: int, with_email: bool = False) -> dict:
+    title = f"{SURNAMES[oid % len(SURNAMES)]} {INITIALS[oid % len(INITIALS)]}"
+    t = {
+        "lecturer": title,
+        "lecturer_title": title,
+        "lecturerOid": oid,
+        "lecturerUID": str(10_000 + oid),
+        "lecturerRank": rnd.choice(["доцент", "профессор", "ст. преподаватель"]),
+    }
+    if with_email:
+        t["lecturerEmail"] = f"t{oid}@fa.ru"
+    return t
+
+
+def lesson(
+    rnd: random.Random,
+    day: date,
+    slot: int,
+    group_oid: int,
+    lesson_oid: int,
+    teachers: Optional[List[dict]] = None,
+    stream: Optional[List[int]] = None,
+) -> dict:
+    begin, end = RING[slot]
+    kind = rnd.choice(KINDS)
+    teachers = teachers if teachers is not None else [teacher(rnd, rnd.randrange(400), rnd.random() < 0.3)]
+    groups = stream or [group_oid]
+    rec = {
+        "auditorium": f"{rnd.randint(1, 9)}{rnd.randint(0, 9)}{rnd.randint(1, 20):02d}",
+        "auditoriumAmount": rnd.choice([30, 60, 120]),
+        "auditoriumOid": rnd.randrange(2000),
+        "author": "",
+        "beginLesson": begin,
+        "building": rnd.choice(BUILDINGS),
+        "buildingOid": rnd.randrange(10),
+        "contentOfLoadOid": rnd.randrange(100_000),
+        "createddate": "2025-08-20T10:00:00Z",
+        "date": day.isoformat(),
+        "dayOfWeek": day.isoweekday(),
+        "dayOfWeekString": ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"][day.weekday()],
+        "detailInfo": "",
+        "discipline": rnd.choice(DISCIPLINES),
+        "disciplineOid": rnd.randrange(5000),
+        "endLesson": end,
+        "group": ", ".join(group_name(g) for g in groups) if len(groups) > 1 else group_name(group_oid),
+        "groupOid": group_oid if len(groups) == 1 else 0,
+        "kindOfWork": "Лекции" if len(groups) > 1 else kind,
+        "lessonNumberStart": slot + 1,
+        "lessonNumberEnd": slot + 1,
+        "lessonOid": lesson_oid,
+        "listGroups": [{"group": group_name(g), "groupOid": g} for g in groups],
+        "listOfLecturers": teachers,
+        "modifieddate": "2025-08-20T10:00:00Z",
+        "stream": "Поток" if len(groups) > 1 else None,
+        "subGroup": None,
+        "url1": "",
+        "url2": "",
+    }
+    for t in teachers[:1]:
+        rec.update({"lecturer": t["lecturer"], "lecturer_title": t["lecturer_title"], "lecturerOid": t["lecturerOid"]})
+    return rec
+
+
+def group_day(rnd: random.Random, group_oid: int, day: date, lesson_base: int = 0) -> List[dict]:
+    if day.weekday() == 6:
+        return []
+    first = rnd.randint(0, 2)
+    count = rnd.randint(2, 5)
+    return [
+        lesson(rnd, day, slot, group_oid, lesson_base + i)
+        for i, slot in enumerate(range(first, min(first + count, len(RING))))
+    ]
+
+
+def group_week(seed: int = 1, group_oid: int = 1, start: Optional[date] = None) -> List[dict]:
+    rnd = random.Random(seed)
+    start = start or date.today() - timedelta(days=date.today().weekday())
+    out: List[dict] = []
+    for i in range(7):
+        out += group_day(rnd, group_oid, start + timedelta(days=i), lesson_base=group_oid * 1000 + i * 10)
+    return out
+
+
+def teacher_week(seed: int = 1, teacher_oid: int = 7, start: Optional[date] = None) -> List[dict]:
+    rnd = random.Random(seed)
+    start = start or date.today() - timedelta(days=date.today().weekday())
+    t = teacher(rnd, teacher_oid)
+    out: List[dict] = []
+    for i in range(6):
+        day = start + timedelta(days=i)
+        for slot in sorted(rnd.sample(range(len(RING)), rnd.randint(1, 4))):
+            g = rnd.randrange(1, 300)
+            stream = [g, g + 1, g + 2] if rnd.random() < 0.3 else None
+            out.append(lesson(rnd, day, slot, g, teacher_oid * 1000 + i * 10 + slot, [t], stream))
+    return out
+
+
+def homework_db(path: Path, groups: int = 300, rows_per_group: int = 400, seed: int = 1) -> Dict[str, List[str]]:
+    rnd = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    start = date.today() - timedelta(days=120)
+    tables = {}
+    with sqlite3.connect(path) as conn:
+        for g in range(groups):
+            table = group_name(g)
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS "{table}" (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    subject TEXT NOT NULL,
+                    deadline TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    files TEXT DEFAULT '[]',
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            rows = []
+            for _ in range(rows_per_group):
+                deadline = (start + timedelta(days=rnd.randrange(240))).strftime("%d.%m.%Y")
+                files = [{"name": f"task_{rnd.randrange(100)}_{deadline}.pdf", "sha256": "%064x" % rnd.getrandbits(256), "size": rnd.randrange(1, 10**6)}] if rnd.random() < 0.3 else []
+                rows.append((rnd.choice(DISCIPLINES), deadline, f"Решить задачи {rnd.randint(1, 50)}-{rnd.randint(51, 99)} из задачника, подготовить доклад", json.dumps(files, ensure_ascii=False)))
+            conn.executemany(
+                f'INSERT INTO "{table}"(subject, deadline, task, files) VALUES (?,?,?,?)', rows
+            )
+            tables[table] = sorted({r[1] for r in rows})
+        conn.commit()
+    return tables
+
+
+def week_dates(start: Optional[date] = None) -> List[str]:
+    start = start or date.today() - timedelta(days=date.today().weekday())
+    return [(start + timedelta(days=i)).strftime("%d.%m.%Y") for i in range(7)]
+
+
+def event_ts(epoch: float, where: str = "message"):
+    from types import SimpleNamespace
+
+    ms = int(epoch * 1000)
+    if where == "event":
+        return SimpleNamespace(timestamp=ms, message=None)
+    if where == "body":
+        return SimpleNamespace(message=SimpleNamespace(body=SimpleNamespace(timestamp=ms)))
+    if where == "none":
+        return SimpleNamespace(message=SimpleNamespace(body=SimpleNamespace()))
+    return SimpleNamespace(message=SimpleNamespace(timestamp=ms, body=None))
+
+
+def now_ts() -> float:
+    return datetime.now().timestamp()
+
+
+def _parse_ruz_date(s: str) -> date:
+    return datetime.strptime(s, "%Y.%m.%d").date()
+
+
+class SyntheticRuz:
+    def __init__(self, groups: int = 200, teachers: int = 400, seed: int = 1):
+        self.groups = groups
+        self.teachers = teachers
+        self.seed = seed
+        self._days: Dict[date, Dict[int, List[dict]]] = {}
+        self._by_teacher: Dict[date, Dict[int, List[dict]]] = {}
+
+    def group_oid(self, i: int) -> int:
+        return 100_000 + i
+
+    def teacher_oid(self, i: int) -> int:
+        return 500_000 + i
+
+    def teacher_title(self, oid: int) -> str:
+        i = oid - 500_000
+        return f"{SURNAMES[i % len(SURNAMES)]}{'' if i < len(SURNAMES) else i // len(SURNAMES)} {INITIALS[i % len(INITIALS)]}"
+
+    def _teacher(self, oid: int) -> dict:
+        title = self.teacher_title(oid)
+        return {"lecturer": title, "lecturer_title": title, "lecturerOid": oid, "lecturerUID": str(oid)}
+
+    def _day(self, d: date) -> Dict[int, List[dict]]:
+        day = self._days.get(d)
+        if day is not None:
+            return day
+        day, by_teacher = {}, {}
+        for i in range(self.groups):
+            oid = self.group_oid(i)
+            rnd = random.Random(hash((self.seed, oid, d.toordinal())))
+            recs = []
+            if d.weekday() != 6:
+                first = rnd.randint(0, 2)
+                for n, slot in enumerate(range(first, min(first + rnd.randint(2, 5), len(RING)))):
+                    t = self._teacher(self.teacher_oid(rnd.randrange(self.teachers)))
+                    rec = lesson(rnd, d, slot, oid, oid * 100_000 + d.toordinal() % 10_000 * 10 + n, [t])
+                    rec["group"] = group_name(i)
+                    rec["listGroups"] = [{"group": group_name(i), "groupOid": oid}]
+                    recs.append(rec)
+                    by_teacher.setdefault(t["lecturerOid"], []).append(rec)
+            day[oid] = recs
+        self._days[d] = day
+        self._by_teacher[d] = by_teacher
+        return day
+
+    def _range(self, start: str, finish: str):
+        d, end = _parse_ruz_date(start), _parse_ruz_date(finish)
+        while d <= end:
+            yield d
+            d += timedelta(days=1)
+
+    def search_group(self, term: str) -> List[dict]:
+        key = "".join((term or "").split()).lower()
+        out = []
+        for i in range(self.groups):
+            name = group_name(i)
+            if key and key in name.lower():
+                out.append({"id": str(self.group_oid(i)), "label": name, "description": "Синтетический факультет", "type": "group"})
+        out.sort(key=lambda g: (g["label"].lower() != key, g["label"]))
+        return out[:50]
+
+    def search_teacher(self, term: str) -> List[dict]:
+        key = (term or "").strip().lower()
+        out = []
+        for i in range(self.teachers):
+            oid = self.teacher_oid(i)
+            title = self.teacher_title(oid)
+            if key and title.lower().startswith(key):
+                out.append({"id": str(oid), "label": title, "description": "доцент", "type": "person"})
+        return out[:50]
+
+    def timetable_group(self, group_id, start: str, finish: str) -> List[dict]:
+        oid = int(group_id)
+        return [r for d in self._range(start, finish) for r in self._day(d).get(oid, [])]
+
+    def timetable_teacher(self, teacher_id, start: str, finish: str) -> List[dict]:
+        oid = int(teacher_id)
+        out = []
+        for d in self._range(start, finish):
+            self._day(d)
+            out += self._by_teacher[d].get(oid, [])
+        return sorted(out, key=lambda r: (r["date"], r["beginLesson"]))
@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fixtures import SyntheticRuz, group_name  # noqa: E402
+
+log = logging.getLogger("loadtest")
+
+BOT_USER_ID = 1
+
+_current_flow: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("flow", default=None)
+
+
+class FakeBot:
+    def __init__(self):
+        self.me = SimpleNamespace(user_id=BOT_USER_ID, username="finmax_loadtest_bot", first_name="FinMAX")
+        self.id = BOT_USER_ID
+        self.auto_requests = True
+        self.commands = []
+        self.api_calls: Dict[str, int] = {}
+        self.sent: Dict[str, int] = {}
+        self.texts: Dict[int, List[str]] = {}
+
+    def _record(self, chat_id, text):
+        flow = _current_flow.get() or "background"
+        self.sent[flow] = self.sent.get(flow, 0) + 1
+        if chat_id is not None and text:
+            self.texts.setdefault(chat_id, []).append(text)
+
+    async def get_me(self):
+        return self.me
+
+    async def get_chat_by_id(self, chat_id):
+        self.api_calls["get_chat_by_id"] = self.api_calls.get("get_chat_by_id", 0) + 1
+        return SimpleNamespace(chat_id=chat_id, type="dialog")
+
+    async def send_message(self, chat_id=None, user_id=None, text=None, attachments=None, **kwargs):
+        self._record(chat_id, text)
+
+    async def send_callback(self, callback_id=None, message=None, notification=None, **kwargs):
+        self._record(None, notification)
+
+    async def delete_webhook(self):
+        pass
+
+
+class StubFaAPI:
+    HOST = "stub://ruz"
+
+    def __init__(self, ruz: SyntheticRuz, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.ruz = ruz
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.calls: Dict[str, int] = {}
+        self.errors = 0
+
+    def _wait(self, method: str):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        delay = max(0.0, random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+        if delay:
+            time.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            raise ConnectionError(f"stub {method} failed")
+
+    def search_group(self, group_name: str):
+        self._wait("search_group")
+        return self.ruz.search_group(group_name)
+
+    def timetable_group(self, group_id, date_begin=None, date_end=None):
+        self._wait("timetable_group")
+        return self.ruz.timetable_group(group_id, date_begin, date_end)
+
+    def search_teacher(self, teacher_name: str):
+        self._wait("search_teacher")
+        return self.ruz.search_teacher(teacher_name)
+
+    def timetable_teacher(self, teacher_id, date_begin=None, date_end=None):
+        self._wait("timetable_teacher")
+        return self.ruz.timetable_teacher(teacher_id, date_begin, date_end)
+
+
+def _user(uid: int) -> dict:
+    return {"user_id": uid, "first_name": f"Студент {uid}", "is_bot": False, "last_activity_time": int(time.time() * 1000)}
+
+
+def _message(chat_id: int, uid: int, text: Optional[str], seq: int) -> dict:
+    ts = int(time.time() * 1000)
+    return {
+        "sender": _user(uid),
+        "recipient": {"chat_id": chat_id, "user_id": BOT_USER_ID, "chat_type": "dialog"},
+        "timestamp": ts,
+        "body": {"mid": f"mid.{chat_id}.{seq}", "seq": seq, "text": text, "attachments": []},
+    }
+
+
+def message_created(chat_id: int, uid: int, text: str, seq: int) -> dict:
+    return {
+        "update_type": "message_created",
+        "timestamp": int(time.time() * 1000),
+        "message": _message(chat_id, uid, text, seq),
+    }
+
+
+def message_callback(chat_id: int, uid: int, payload: str, seq: int) -> dict:
+    ts = int(time.time() * 1000)
+    return {
+        "update_type": "message_callback",
+        "timestamp": ts,
+        "callback": {"timestamp": ts, "callback_id": f"cb.{chat_id}.{seq}", "payload": payload, "user": _user(uid)},
+        "message": _message(chat_id, BOT_USER_ID, "…", seq),
+    }
+
+
+def _flows(ruz: SyntheticRuz, rnd: random.Random) -> Dict[str, Tuple[List[Tuple[str, str]], Tuple[str, int]]]:
+    g = group_name(rnd.randrange(ruz.groups))
+    t = ruz.teacher_title(ruz.teacher_oid(rnd.randrange(ruz.teachers))).split()[0]
+    deadline = (date.today() + timedelta(days=rnd.randint(1, 14))).strftime("%d.%m.%Y")
+    return {
+        "group_week": (
+            [("text", "Расписание"), ("text", "Группы"), ("text", g), ("text", "Эта неделя")],
+            ("Выберите дальнейшее действие:", 1),
+        ),
+        "teacher_week": (
+            [("text", "Расписание"), ("text", "Преподаватели"), ("text", t), ("text", "Эта неделя")],
+            ("Выберите период:", 2),
+        ),
+        "homework_add": (
+            [
+                ("text", "Домашняя работа"),
+                ("callback", "hw:add"),
+                ("text", g),
+                ("text", "Эконометрика"),
+                ("text", deadline),
+                ("text", f"Решить задачи {rnd.randint(1, 99)}"),
+                ("callback", "hw:nofile"),
+            ],
+            ("✅ Домашняя работа добавлена.", 1),
+        ),
+    }
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(q * (len(values) - 1)))))
+    return values[k]
+
+
+def _isolate_storage(tmp: Path):
+    import group_registry
+    import homework
+    import reminders
+    import notifications
+    import attachments
+
+    homework.DB_PATH = tmp / "homework.db"
+    homework.DATA_DIR = tmp / "homework_data"
+    reminders.REMINDERS_DB_PATH = tmp / "reminders.db"
+    notifications.SUBSCRIPTIONS_DB_PATH = tmp / "subscriptions.db"
+    attachments.BLOB_DIR = tmp / "blobs"
+    attachments.TMP_DIR = attachments.BLOB_DIR / "tmp"
+    group_registry.REGISTRY_DB_PATH = tmp / "groups.db"
+    group_registry.ALIASES.clear()
+    group_registry.NAMES.clear()
+
+
+async def run(args) -> dict:
+    os.environ.setdefault("MAX_TOKEN", "loadtest")
+    from maxapi.methods.types.getted_updates import get_update_model
+
+    import main
+    import timetable_cache
+    import upstream
+
+    tmp = Path(tempfile.mkdtemp(prefix="finmax-load-"))
+    _isolate_storage(tmp)
+
+    ruz = SyntheticRuz(groups=args.groups, teachers=args.teachers, seed=args.seed)
+    stub = StubFaAPI(ruz, args.latency_ms, args.jitter_ms, args.error_rate)
+    upstream.fa = stub
+
+    bot = FakeBot()
+    dp = main.dp
+    dp.bot = bot
+    if dp not in dp.routers:
+        dp.routers.append(dp)
+
+    handler_errors = {"n": 0}
+
+    class _ErrorCounter(logging.Handler):
+        def emit(self, record):
+            if record.levelno >= logging.ERROR:
+                handler_errors["n"] += 1
+
+    logging.getLogger("dispatcher").addHandler(_ErrorCounter())
+
+    rnd = random.Random(args.seed)
+    weights = dict(w.split("=") for w in args.mix.split(","))
+    names = list(weights)
+    flow_weights = [float(weights[n]) for n in names]
+
+    latencies: Dict[str, List[float]] = {n: [] for n in names}
+    completed: Dict[str, int] = {n: 0 for n in names}
+    started: Dict[str, int] = {n: 0 for n in names}
+    events = {"n": 0}
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def _user_session(i: int):
+        chat_id = 10_000_000 + i
+        uid = 20_000_000 + i
+        flow = rnd.choices(names, flow_weights)[0]
+        steps, done_marker = _flows(ruz, rnd)[flow]
+        async with sem:
+            _current_flow.set(flow)
+            started[flow] += 1
+            for seq, (kind, value) in enumerate(steps, start=1):
+                raw = message_created(chat_id, uid, value, seq) if kind == "text" else message_callback(chat_id, uid, value, seq)
+                event = await get_update_model(raw, bot)
+                t0 = time.perf_counter()
+                done = await dp.handle(event)
+                if isinstance(done, asyncio.Future):
+                    await done
+                latencies[flow].append(time.perf_counter() - t0)
+                events["n"] += 1
+                if args.think_ms:
+                    await asyncio.sleep(rnd.uniform(0, args.think_ms / 1000.0))
+            prefix, times = done_marker
+            if sum(1 for x in bot.texts.get(chat_id, []) if x.startswith(prefix)) >= times:
+                completed[flow] += 1
+
+    if args.cold:
+        timetable_cache.DAYS.clear()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_user_session(i) for i in range(args.users)))
+    wall = time.perf_counter() - t0
+
+    flows = {}
+    for n in names:
+        lat = latencies[n]
+        flows[n] = {
+            "sessions": started[n],
+            "completed": completed[n],
+            "events": len(lat),
+            "outbound_messages": bot.sent.get(n, 0),
+            "outbound_per_event": (bot.sent.get(n, 0) / len(lat)) if lat else 0.0,
+            "p50_ms": _pct(lat, 0.50) * 1000,
+            "p95_ms": _pct(lat, 0.95) * 1000,
+            "p99_ms": _pct(lat, 0.99) * 1000,
+            "max_ms": (max(lat) * 1000) if lat else 0.0,
+            "mean_ms": (statistics.fmean(lat) * 1000) if lat else 0.0,
+        }
+
+    return {
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "upstream_latency_ms": args.latency_ms,
+        "upstream_error_rate": args.error_rate,
+        "wall_s": wall,
+        "events": events["n"],
+        "throughput_eps": events["n"] / wall if wall else 0.0,
+        "handler_errors": handler_errors["n"],
+        "upstream_calls": stub.calls,
+        "bot_api_calls": bot.api_calls,
+        "upstream_errors": stub.errors,
+        "flows": flows,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="FinMAX end-to-end load test with a fake MAX bot and stub fa_api")
+    ap.add_argument("--users", type=int, default=1000, help="number of simulated chats, each runs one flow")
+    ap.add_argument("--concurrency", type=int, default=100, help="chats active at the same time")
+    ap.add_argument("--mix", default="group_week=5,teacher_week=2,homework_add=3", help="flow weights")
+    ap.add_argument("--latency-ms", type=float, default=150.0, help="stub fa_api latency per call")
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--think-ms", type=float, default=0.0, help="max random pause between steps of a flow")
+    ap.add_argument("--groups", type=int, default=200)
+    ap.add_argument("--teachers", type=int, default=400)
+    ap.add_argument("--cold", action="store_true", help="start with an empty timetable cache")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write JSON report to this file (default: stdout)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s", stream=sys.stderr)
+    report = asyncio.run(run(args))
+
+    for name, f in report["flows"].items():
+        log.warning(
+            "%-14s sessions=%-5d done=%-5d events=%-6d sent=%-6d p50=%.1fms p95=%.1fms p99=%.1fms",
+            name, f["sessions"], f["completed"], f["events"], f["outbound_messages"], f["p50_ms"], f["p95_ms"], f["p99_ms"],
+        )
+    log.warning("throughput %.1f events/s over %.2fs, handler errors: %d", report["throughput_eps"], report["wall_s"], report["handler_errors"])
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(data, encoding="utf-8")
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench import fixtures  # noqa: E402
+from compact_snapshot import CompactStore  # noqa: E402
+
+log = logging.getLogger("bench")
+
+CHECK_FIELDS = ("date", "beginLesson", "endLesson", "discipline", "kindOfWork", "auditorium", "group", "lessonOid")
+
+
+def _payloads(groups: int, start: date, end: date) -> Dict[str, bytes]:
+    ruz = fixtures.SyntheticRuz(groups=groups)
+    s, e = start.strftime("%Y.%m.%d"), end.strftime("%Y.%m.%d")
+    out = {}
+    for i in range(groups):
+        gid = str(ruz.group_oid(i))
+        out[gid] = json.dumps(ruz.timetable_group(gid, s, e), ensure_ascii=False).encode("utf-8")
+    return out
+
+
+class _PayloadFa:
+    HOST = "bench://ruz"
+
+    def __init__(self, payloads: Dict[str, bytes]):
+        self.payloads = payloads
+
+    def timetable_group(self, group_id, date_begin=None, date_end=None):
+        return json.loads(self.payloads[str(group_id)])
+
+
+def _rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _traced(build):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, peak, elapsed
+
+
+def _check(raw: Dict[str, List[dict]], store: CompactStore) -> int:
+    bad = 0
+    for gid, recs in raw.items():
+        got = store.get(gid)
+        if len(got) != len(recs):
+            bad += 1
+            continue
+        for a, b in zip(recs, got):
+            if any((a.get(f) or "") != (b.get(f) or "") for f in CHECK_FIELDS):
+                bad += 1
+                break
+            if [t["lecturerOid"] for t in a["listOfLecturers"]] != [t["lecturerOid"] for t in b["listOfLecturers"]]:
+                bad += 1
+                break
+    return bad
+
+
+def run_real(groups: int) -> dict:
+    os.environ.setdefault("MAX_TOKEN", "bench")
+    import groups_schedule  # noqa: F401
+    import semester
+    import timetable_cache
+    import upstream
+
+    start, end = semester.semester_bounds(date.today())
+    payloads = _payloads(groups, start, end)
+    upstream.fa = _PayloadFa(payloads)
+    semester.SEMESTER_MAX_SNAPSHOTS = max(semester.SEMESTER_MAX_SNAPSHOTS, groups)
+    names = {str(fixtures.SyntheticRuz().group_oid(i)): fixtures.group_name(i) for i in range(groups)}
+
+    async def _fill():
+        for gid, name in names.items():
+            await semester.snapshot("group", gid, name)
+
+    gc.collect()
+    rss0 = _rss()
+    _, held, peak, elapsed = _traced(lambda: asyncio.run(_fill()))
+    rss = _rss() - rss0
+    lessons = sum(len(v) for v in semester.STORE.entities.values())
+    log.info("semester path %10.1f MB traced, %.1f MB rss  (%d lessons, %d in timetable_cache)",
+             held / 1e6, rss / 1e6, lessons, len(timetable_cache.LESSONS))
+    return {
+        "real_bytes": held,
+        "real_peak_bytes": peak,
+        "real_rss_bytes": rss,
+        "real_build_s": elapsed,
+        "real_lessons": lessons,
+        "cache_lessons": len(timetable_cache.LESSONS),
+    }
+
+
+def run(groups: int, weeks: int) -> dict:
+    start = date.today() - timedelta(days=date.today().weekday())
+    end = start + timedelta(days=7 * weeks - 1)
+    t0 = time.perf_counter()
+    payloads = _payloads(groups, start, end)
+    log.info("fixtures ready in %.2fs (%d groups, %d weeks, %.1f MB json)",
+             time.perf_counter() - t0, groups, weeks, sum(map(len, payloads.values())) / 1e6)
+
+    raw, raw_bytes, raw_peak, raw_time = _traced(lambda: {gid: json.loads(p) for gid, p in payloads.items()})
+    lessons = sum(len(v) for v in raw.values())
+
+    def _build():
+        store = CompactStore()
+        for gid, p in payloads.items():
+            store.put(gid, json.loads(p))
+        return store
+
+    store, compact_bytes, compact_peak, compact_time = _traced(_build)
+    mismatched = _check(raw, store)
+    del raw
+    gc.collect()
+
+    t0 = time.perf_counter()
+    monday = start + timedelta(days=7 * (weeks // 2))
+    for gid in payloads:
+        store.get(gid, monday, monday + timedelta(days=6))
+    week_us = (time.perf_counter() - t0) / len(payloads) * 1e6
+
+    ratio = raw_bytes / compact_bytes if compact_bytes else 0.0
+    log.info("raw dicts     %10.1f MB  %8.1f B/lesson", raw_bytes / 1e6, raw_bytes / lessons)
+    log.info("compact store %10.1f MB  %8.1f B/lesson  (x%.1f smaller, %d strings)",
+             compact_bytes / 1e6, compact_bytes / lessons, ratio, len(store.strings))
+    log.info("decode one week: %.1f us per group", week_us)
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "groups": groups,
+        "weeks": weeks,
+        "lessons": lessons,
+        "raw_bytes": raw_bytes,
+        "raw_peak_bytes": raw_peak,
+        "raw_build_s": raw_time,
+        "compact_bytes": compact_bytes,
+        "compact_peak_bytes": compact_peak,
+        "compact_build_s": compact_time,
+        "strings": len(store.strings),
+        "ratio": ratio,
+        "decode_week_us": week_us,
+        "mismatched_groups": mismatched,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Memory footprint of raw fa_api timetables vs the compact snapshot store")
+    ap.add_argument("--groups", type=int, default=300)
+    ap.add_argument("--weeks", type=int, default=18, help="weeks per group (18 = one semester)")
+    ap.add_argument("--min-ratio", type=float, default=5.0, help="exit 1 if the compact store saves less than this")
+    ap.add_argument("--out", help="write JSON results to this file (default: stdout)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    report = run(args.groups, args.weeks)
+    real = run_real(args.groups)
+    report.update(real)
+    report["real_ratio"] = report["raw_bytes"] / real["real_bytes"] * real["real_lessons"] / report["lessons"] if real["real_bytes"] else 0.0
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(data, encoding="utf-8")
+    else:
+        print(data)
+
+    ratio = min(report["ratio"], report["real_ratio"])
+    failed = report["mismatched_groups"] or ratio < args.min_ratio
+    if failed:
+        log.error("FAILED ratio x%.1f (need x%.1f), %d mismatched groups", ratio, args.min_ratio, report["mismatched_groups"])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import logging
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench import fixtures  # noqa: E402
+
+log = logging.getLogger("bench")
+
+REGRESSION_THRESHOLD = 0.25
+
+
+def _measure(fn: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    t = timeit.Timer(fn)
+    loops, elapsed = t.autorange()
+    while elapsed < min_time:
+        loops *= 2
+        elapsed = t.timeit(loops)
+    runs = [v / loops for v in t.repeat(repeat=repeat, number=loops)]
+    return {
+        "loops": loops,
+        "best_us": min(runs) * 1e6,
+        "median_us": statistics.median(runs) * 1e6,
+        "stdev_us": (statistics.stdev(runs) if len(runs) > 1 else 0.0) * 1e6,
+    }
+
+
+def _cases(tmp: Path, scale: float) -> Dict[str, Callable[[], object]]:
+    import groups_schedule
+    import teachers_schedule
+    import homework
+
+    week = fixtures.group_week(seed=1)
+    days: Dict[str, List[dict]] = {}
+    for rec in week:
+        days.setdefault(rec["date"], []).append(rec)
+    busiest = max(days.values(), key=len)
+    t_week = fixtures.teacher_week(seed=2)
+    t_days: Dict[str, List[dict]] = {}
+    for rec in t_week:
+        t_days.setdefault(rec["date"], []).append(rec)
+    t_busiest = max(t_days.values(), key=len)
+    no_email = [dict(r, listOfLecturers=[{k: v for k, v in t.items() if k != "lecturerEmail"} for t in r["listOfLecturers"]]) for r in t_week]
+    last_email = no_email[:-1] + [dict(no_email[-1], listOfLecturers=[dict(no_email[-1]["listOfLecturers"][0], lecturerEmail="ivanov@fa.ru")])]
+    begins = [r["beginLesson"] for r in week] + ["09:00", "21:30", ""]
+
+    db_path = tmp / "homework.db"
+    tables = fixtures.homework_db(
+        db_path,
+        groups=max(1, int(300 * scale)),
+        rows_per_group=max(1, int(400 * scale)),
+    )
+    table = next(iter(tables))
+    conn = sqlite3.connect(db_path)
+    week_dates = fixtures.week_dates()
+
+    now = fixtures.now_ts()
+    ev_fresh = fixtures.event_ts(now)
+    ev_old = fixtures.event_ts(now - 3600, "body")
+    ev_none = fixtures.event_ts(now, "none")
+
+    return {
+        "groups._fmt_day[busiest_day]": lambda: groups_schedule._fmt_day(busiest, "ПИ21-1"),
+        "groups._fmt_day[week]": lambda: [groups_schedule._fmt_day(v, "ПИ21-1") for v in days.values()],
+        "teachers._fmt_day[busiest_day]": lambda: teachers_schedule._fmt_day(t_busiest, "Иванов А.А."),
+        "groups._teacher_names_from_record[week]": lambda: [groups_schedule._teacher_names_from_record(r) for r in week],
+        "groups._pair_no_by_begin": lambda: [groups_schedule._pair_no_by_begin(b) for b in begins],
+        "teachers._find_teacher_email[last]": lambda: teachers_schedule._find_teacher_email(last_email),
+        "teachers._find_teacher_email[miss]": lambda: teachers_schedule._find_teacher_email(no_email),
+        "homework._select_for_dates[week]": lambda: homework._select_for_dates(conn, table, week_dates),
+        "homework._extract_event_ts[message]": lambda: homework._extract_event_ts(ev_fresh),
+        "homework._extract_event_ts[missing]": lambda: homework._extract_event_ts(ev_none),
+        "homework._is_old_event[old]": lambda: homework._is_old_event(ev_old),
+    }
+
+
+def run(repeat: int, min_time: float, scale: float, only: str = "") -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="finmax-bench-") as tmp:
+        t0 = time.perf_counter()
+        cases = _cases(Path(tmp), scale)
+        log.info("fixtures ready in %.2fs", time.perf_counter() - t0)
+        for name, fn in cases.items():
+            if only and only not in name:
+                continue
+            results[name] = _measure(fn, repeat, min_time)
+            log.info("%-45s %12.2f us", name, results[name]["best_us"])
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    regressions = []
+    for name, res in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = res["best_us"] / base["best_us"] if base["best_us"] else 1.0
+        res["baseline_best_us"] = base["best_us"]
+        res["ratio"] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append(f"{name}: {base['best_us']:.2f}us -> {res['best_us']:.2f}us (x{ratio:.2f})")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="FinMAX hot-path micro-benchmarks")
+    ap.add_argument("--out", help="write JSON results to this file (default: stdout)")
+    ap.add_argument("--baseline", help="previous JSON results to compare against")
+    ap.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.2)
+    ap.add_argument("--scale", type=float, default=1.0, help="homework DB size factor (1.0 = 300 groups x 400 rows)")
+    ap.add_argument("--only", default="", help="run only cases whose name contains this substring")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    report = run(args.repeat, args.min_time, args.scale, args.only)
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        report["regressions"] = regressions
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(data, encoding="utf-8")
+    else:
+        print(data)
+
+    for r in regressions:
+        log.error("REGRESSION %s", r)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import sys
+from pathlib import Path
+from typing import Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fixtures import SyntheticRuz  # noqa: E402
+
+log = logging.getLogger("ruz_server")
+
+SEARCH_TYPES = {"group", "person", "auditorium", "building"}
+SCHEDULE_KINDS = {"group", "person", "auditorium", "building"}
+
+
+class Faults:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, timeout_rate: float = 0.0, timeout_s: float = 120.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.timeout_s = timeout_s
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+    def update(self, data: dict):
+        for k, v in data.items():
+            if k in vars(self):
+                setattr(self, k, type(getattr(self, k))(v))
+
+
+class RuzStandIn:
+    def __init__(self, faults: Faults, synthetic: Optional[SyntheticRuz], fixtures_dir: Optional[Path],
+                 record_from: str = "", seed: int = 1):
+        self.faults = faults
+        self.synthetic = synthetic
+        self.fixtures_dir = fixtures_dir
+        self.record_from = record_from.rstrip("/")
+        self.rnd = random.Random(seed)
+        self.stats = {"requests": 0, "fixture_hits": 0, "synthetic": 0, "recorded": 0, "errors": 0, "timeouts": 0, "misses": 0}
+
+    def _key(self, request: web.Request) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query.items()) if k != "lng")
+        return f"{request.path}?{query}"
+
+    def _fixture_path(self, key: str) -> Optional[Path]:
+        if self.fixtures_dir is None:
+            return None
+        return self.fixtures_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+    def _load_fixture(self, key: str):
+        path = self._fixture_path(key)
+        if path is None or not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def _save_fixture(self, key: str, status: int, body):
+        path = self._fixture_path(key)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"key": key, "status": status, "body": body}, ensure_ascii=False), encoding="utf-8")
+
+    async def _inject(self) -> Optional[web.Response]:
+        f = self.faults
+        if f.timeout_rate and self.rnd.random() < f.timeout_rate:
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(f.timeout_s)
+        delay = f.latency_ms
+        if f.jitter_ms:
+            delay = max(0.0, self.rnd.gauss(f.latency_ms, f.jitter_ms))
+        if delay:
+            await asyncio.sleep(delay / 1000.0)
+        if f.error_rate and self.rnd.random() < f.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=f.error_status, text="injected failure")
+        return None
+
+    def _synthetic(self, request: web.Request):
+        ruz = self.synthetic
+        if request.path == "/api/search":
+            kind = request.query.get("type", "")
+            term = request.query.get("term", "")
+            if kind == "group":
+                return ruz.search_group(term)
+            if kind == "person":
+                return ruz.search_teacher(term)
+            return []
+        _, _, _, kind, oid = request.path.split("/", 4)
+        start = request.query.get("start")
+        finish = request.query.get("finish") or start
+        if kind == "group":
+            return ruz.timetable_group(oid, start, finish)
+        if kind == "person":
+            return ruz.timetable_teacher(oid, start, finish)
+        return []
+
+    async def _record(self, request: web.Request, key: str):
+        url = self.record_from + request.path_qs
+        async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+            async with session.get(url, ssl=False) as resp:
+                body = await resp.json(content_type=None) if resp.status == 200 else await resp.text()
+                status = resp.status
+        self._save_fixture(key, status, body)
+        self.stats["recorded"] += 1
+        return status, body
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats["requests"] += 1
+        injected = await self._inject()
+        if injected is not None:
+            return injected
+
+        key = self._key(request)
+        fx = self._load_fixture(key)
+        if fx is not None:
+            self.stats["fixture_hits"] += 1
+            return web.json_response(fx["body"], status=fx["status"])
+
+        if self.record_from:
+            status, body = await self._record(request, key)
+            if status == 200:
+                return web.json_response(body)
+            return web.Response(status=status, text=str(body))
+
+        if self.synthetic is not None:
+            self.stats["synthetic"] += 1
+            return web.json_response(self._synthetic(request))
+
+        self.stats["misses"] += 1
+        return web.Response(status=404, text=f"no fixture for {key}")
+
+    async def search(self, request: web.Request) -> web.Response:
+        if request.query.get("type") not in SEARCH_TYPES:
+            return web.Response(status=400, text="unknown search type")
+        return await self.handle(request)
+
+    async def schedule(self, request: web.Request) -> web.Response:
+        if request.match_info["kind"] not in SCHEDULE_KINDS or "start" not in request.query:
+            return web.Response(status=400, text="bad schedule request")
+        return await self.handle(request)
+
+    async def control(self, request: web.Request) -> web.Response:
+        if request.method == "POST":
+            self.faults.update(await request.json())
+            log.warning("faults updated: %s", self.faults.as_dict())
+        return web.json_response({"faults": self.faults.as_dict(), "stats": self.stats})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/search", self.search)
+        app.router.add_get("/api/schedule/{kind}/{oid}", self.schedule)
+        app.router.add_route("*", "/__control", self.control)
+        return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local ruz.fa.ru stand-in. Point the bot at it with RUZ_HOST=http://HOST:PORT")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8085)
+    ap.add_argument("--fixtures", help="directory with recorded JSON responses (replayed first)")
+    ap.add_argument("--record", metavar="UPSTREAM", help="proxy fixture misses to UPSTREAM (e.g. https://ruz.fa.ru) and save them")
+    ap.add_argument("--no-synthetic", action="store_true", help="answer 404 on fixture misses instead of generating data")
+    ap.add_argument("--groups", type=int, default=200, help="size of the synthetic directory")
+    ap.add_argument("--teachers", type=int, default=400)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang for --timeout-s")
+    ap.add_argument("--timeout-s", type=float, default=120.0)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    if args.record and not args.fixtures:
+        ap.error("--record needs --fixtures to save responses into")
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(name)s: %(message)s")
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.timeout_rate, args.timeout_s)
+    synthetic = None if args.no_synthetic else SyntheticRuz(args.groups, args.teachers, args.seed)
+    server = RuzStandIn(
+        faults,
+        synthetic,
+        Path(args.fixtures) if args.fixtures else None,
+        record_from=args.record or "",
+        seed=args.seed,
+    )
+    log.warning("ruz stand-in on http://%s:%s (RUZ_HOST=http://%s:%s)", args.host, args.port, args.host, args.port)
+    web.run_app(server.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
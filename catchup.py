@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Set
+
+import homework
+import metrics
+
+log = logging.getLogger("catchup")
+
+CATCHUP_MAX_AGE = float(os.getenv("CATCHUP_MAX_AGE_SEC", "900"))
+CATCHUP_SETTLE = float(os.getenv("CATCHUP_SETTLE_SEC", "1.0"))
+CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", "16"))
+
+ENTRY_TEXTS = {
+    "Расписание", "Домашняя работа", "Почта", "Группы", "Преподаватели",
+    "⬅️ В меню", "⬅️ В расписание", "Посмотреть", "Добавить",
+}
+ENTRY_PAYLOADS = {"sched:root", "sched:groups", "sched:teachers", "menu:home", "hw:watch", "hw:add", "hw:search"}
+VIEW_TEXTS = {"Сегодня", "Завтра", "Эта неделя", "Следующая неделя", "📚 Семестр", "📅 В календарь"}
+VIEW_PAYLOADS = {"hw:today", "hw:tomorrow", "hw:thisweek", "hw:nextweek", "hw:search_next", "hw:search_prev"}
+
+
+def _text(event) -> str:
+    body = getattr(getattr(event, "message", None), "body", None)
+    return (getattr(body, "text", None) or "").strip()
+
+
+def _payload(event) -> str:
+    return (getattr(getattr(event, "callback", None), "payload", None) or "").strip()
+
+
+def _kind(event) -> str:
+    if getattr(getattr(event, "update_type", None), "value", None) == "bot_started":
+        return "entry"
+    text = _text(event)
+    payload = _payload(event)
+    if text.startswith("/") or text in ENTRY_TEXTS or payload in ENTRY_PAYLOADS:
+        return "entry"
+    if text in VIEW_TEXTS or payload in VIEW_PAYLOADS or payload.startswith("sem:"):
+        return "view"
+    return "input"
+
+
+def coalesce(events: List) -> List:
+    kinds = [_kind(e) for e in events]
+    start = None
+    for i in range(len(events) - 1, -1, -1):
+        if kinds[i] == "entry":
+            start = i
+            break
+    if start is None:
+        return []
+    out = []
+    for i in range(start, len(events)):
+        if kinds[i] == "view" and i + 1 < len(events) and kinds[i + 1] == "view":
+            continue
+        out.append(events[i])
+    return out
+
+
+def _chat_key(event) -> Optional[str]:
+    try:
+        chat_id, user_id = event.get_ids()
+    except Exception:
+        return None
+    if chat_id is None and user_id is None:
+        return None
+    return f"{chat_id}:{user_id}"
+
+
+def _is_backlog(event) -> bool:
+    if CATCHUP_MAX_AGE <= 0:
+        return False
+    ts = homework._extract_event_ts(event)
+    if ts is None:
+        return False
+    return (homework.BOOT_TS - CATCHUP_MAX_AGE) <= ts < (homework.BOOT_TS - homework.OLD_EVENT_SLOP)
+
+
+class Backlog:
+    def __init__(self, handle):
+        self.handle = handle
+        self.pending: Dict[str, List] = {}
+        self.live: Dict[str, List] = {}
+        self.active: Set[str] = set()
+        self.last_arrival = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, event) -> bool:
+        key = _chat_key(event)
+        if key is None:
+            return False
+        if not _is_backlog(event):
+            if key not in self.pending and key not in self.active:
+                return False
+            self.live.setdefault(key, []).append(event)
+            metrics.CATCHUP.inc(result="deferred")
+            return True
+        self.pending.setdefault(key, []).append(event)
+        self.last_arrival = time.monotonic()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._drain())
+        return True
+
+    async def _run(self, event):
+        done = await self.handle(event)
+        if isinstance(done, asyncio.Future):
+            await done
+
+    async def _replay(self, key: str, events: List, sem: asyncio.Semaphore):
+        keep = coalesce(events)
+        metrics.CATCHUP.inc(len(events) - len(keep), result="skipped")
+        try:
+            async with sem:
+                token = homework.REPLAY.set(True)
+                try:
+                    for ev in keep:
+                        await self._run(ev)
+                        metrics.CATCHUP.inc(result="processed")
+                finally:
+                    homework.REPLAY.reset(token)
+            queue = self.live.get(key)
+            while queue:
+                await self._run(queue.pop(0))
+        finally:
+            self.active.discard(key)
+            if key not in self.pending:
+                lost = self.live.pop(key, None)
+                if lost:
+                    log.warning("catch-up for %s: %d live events not delivered", key, len(lost))
+
+    async def _drain(self):
+        sem = asyncio.Semaphore(CATCHUP_CONCURRENCY)
+        while self.pending:
+            wait = CATCHUP_SETTLE - (time.monotonic() - self.last_arrival)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            batch, self.pending = self.pending, {}
+            self.active.update(batch)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(self._replay(k, evs, sem) for k, evs in batch.items()))
+            log.warning(
+                "caught up %d chats (%d events) in %.2fs",
+                len(batch), sum(len(v) for v in batch.values()), time.perf_counter() - t0,
+            )
+
+
+def install(dp):
+    backlog = Backlog(dp.handle)
+    orig = dp.handle
+
+    async def handle(event_object):
+        if backlog.offer(event_object):
+            return None
+        return await orig(event_object)
+
+    dp.handle = handle
+    return backlog
@@ -0,0 +1,183 @@
+from array import array
+from datetime import date
+from typing import Dict, Hashable, List, Optional
+
+EPOCH = date(2000, 1, 1).toordinal()
+NONE = -1
+
+STRING_FIELDS = ("discipline", "kindOfWork", "auditorium", "building", "group", "stream")
+
+
+def _str(x) -> str:
+    return x.strip() if isinstance(x, str) else ""
+
+
+def _minutes(s) -> int:
+    try:
+        h, m = _str(s).split(":")
+        return int(h) * 60 + int(m)
+    except ValueError:
+        return NONE
+
+
+def _hhmm(m: int) -> str:
+    return "" if m == NONE else f"{m // 60:02d}:{m % 60:02d}"
+
+
+def _oid(x) -> int:
+    try:
+        return int(x)
+    except (TypeError, ValueError):
+        return NONE
+
+
+class Strings:
+    __slots__ = ("items", "index")
+
+    def __init__(self):
+        self.items: List[str] = [""]
+        self.index: Dict[str, int] = {"": 0}
+
+    def intern(self, s: str) -> int:
+        i = self.index.get(s)
+        if i is None:
+            i = self.index[s] = len(self.items)
+            self.items.append(s)
+        return i
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class _Tuples:
+    __slots__ = ("items", "index")
+
+    def __init__(self):
+        self.items: List[tuple] = [()]
+        self.index: Dict[tuple, int] = {(): 0}
+
+    def intern(self, t: tuple) -> int:
+        i = self.index.get(t)
+        if i is None:
+            i = self.index[t] = len(self.items)
+            self.items.append(t)
+        return i
+
+
+class CompactStore:
+    def __init__(self):
+        self.strings = Strings()
+        self.lecturers = _Tuples()
+        self.groups = _Tuples()
+        self.day = array("H")
+        self.begin = array("h")
+        self.end = array("h")
+        self.lesson_oid = array("q")
+        self.group_oid = array("q")
+        self.cols = {f: array("I") for f in STRING_FIELDS}
+        self.lecturer_set = array("I")
+        self.group_set = array("I")
+        self.entities: Dict[Hashable, array] = {}
+        self.dead = 0
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    @property
+    def rows(self) -> int:
+        return len(self.day)
+
+    def _append(self, rec: dict) -> int:
+        s = self.strings.intern
+        d = _str(rec.get("date"))
+        try:
+            day = date.fromisoformat(d).toordinal() - EPOCH
+        except ValueError:
+            day = 0
+        self.day.append(day)
+        self.begin.append(_minutes(rec.get("beginLesson")))
+        self.end.append(_minutes(rec.get("endLesson")))
+        self.lesson_oid.append(_oid(rec.get("lessonOid")))
+        self.group_oid.append(_oid(rec.get("groupOid")))
+        for f in STRING_FIELDS:
+            self.cols[f].append(s(_str(rec.get(f))))
+
+        lecturers = []
+        arr = rec.get("listOfLecturers")
+        if isinstance(arr, list) and arr:
+            for t in arr:
+                if isinstance(t, dict):
+                    lecturers.append((s(_str(t.get("lecturer_title") or t.get("lecturer"))), _oid(t.get("lecturerOid"))))
+        elif rec.get("lecturer_title") or rec.get("lecturer"):
+            lecturers.append((s(_str(rec.get("lecturer_title") or rec.get("lecturer"))), _oid(rec.get("lecturerOid"))))
+        self.lecturer_set.append(self.lecturers.intern(tuple(lecturers)))
+
+        groups = []
+        arr = rec.get("listGroups")
+        if isinstance(arr, list):
+            for g in arr:
+                if isinstance(g, dict):
+                    groups.append((s(_str(g.get("group"))), _oid(g.get("groupOid"))))
+        self.group_set.append(self.groups.intern(tuple(groups)))
+        return len(self.day) - 1
+
+    def put(self, key: Hashable, records: List[dict]):
+        old = self.entities.get(key)
+        if old is not None:
+            self.dead += len(old)
+        self.entities[key] = array("I", (self._append(r) for r in records if isinstance(r, dict)))
+        if self.dead > max(1024, self.rows // 2):
+            self.compact()
+
+    def drop(self, key: Hashable):
+        old = self.entities.pop(key, None)
+        if old is not None:
+            self.dead += len(old)
+
+    def _decode(self, i: int) -> dict:
+        st = self.strings.items
+        lecturers = [
+            {"lecturer": st[n], "lecturer_title": st[n], "lecturerOid": None if oid == NONE else oid}
+            for n, oid in self.lecturers.items[self.lecturer_set[i]]
+        ]
+        rec = {
+            "date": date.fromordinal(self.day[i] + EPOCH).isoformat(),
+            "beginLesson": _hhmm(self.begin[i]),
+            "endLesson": _hhmm(self.end[i]),
+            "lessonOid": None if self.lesson_oid[i] == NONE else self.lesson_oid[i],
+            "groupOid": None if self.group_oid[i] == NONE else self.group_oid[i],
+            "listOfLecturers": lecturers,
+            "listGroups": [
+                {"group": st[n], "groupOid": None if oid == NONE else oid}
+                for n, oid in self.groups.items[self.group_set[i]]
+            ],
+        }
+        for f in STRING_FIELDS:
+            rec[f] = st[self.cols[f][i]]
+        if lecturers:
+            rec.update(lecturers[0])
+        return rec
+
+    def get(self, key: Hashable, start: Optional[date] = None, end: Optional[date] = None) -> Optional[List[dict]]:
+        rows = self.entities.get(key)
+        if rows is None:
+            return None
+        lo = 0 if start is None else start.toordinal() - EPOCH
+        hi = 1 << 16 if end is None else end.toordinal() - EPOCH
+        day = self.day
+        return [self._decode(i) for i in rows if lo <= day[i] <= hi]
+
+    def compact(self):
+        keep = array("I")
+        for key, rows in self.entities.items():
+            fresh = array("I")
+            for i in rows:
+                fresh.append(len(keep))
+                keep.append(i)
+            self.entities[key] = fresh
+        for name in ("day", "begin", "end", "lesson_oid", "group_oid", "lecturer_set", "group_set"):
+            col = getattr(self, name)
+            setattr(self, name, array(col.typecode, (col[i] for i in keep)))
+        for f, col in self.cols.items():
+            self.cols[f] = array(col.typecode, (col[i] for i in keep))
+        self.dead = 0
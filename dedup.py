@@ -0,0 +1,119 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import metrics
+
+log = logging.getLogger("dedup")
+
+BASE_DIR = Path(__file__).resolve().parent
+DEDUP_WINDOW = float(os.getenv("DEDUP_WINDOW_SEC", "900"))
+DEDUP_MAX = int(os.getenv("DEDUP_MAX_ENTRIES", "50000"))
+DEDUP_PATH = os.getenv("DEDUP_PATH", "")
+DEDUP_FLUSH_SEC = float(os.getenv("DEDUP_FLUSH_SEC", "30"))
+
+
+def update_key(event) -> Optional[str]:
+    kind = getattr(getattr(event, "update_type", None), "value", None) or "unknown"
+    cb_id = getattr(getattr(event, "callback", None), "callback_id", None)
+    if cb_id:
+        return f"{kind}:{cb_id}"
+    mid = getattr(getattr(getattr(event, "message", None), "body", None), "mid", None)
+    if mid:
+        return f"{kind}:{mid}"
+    ts = getattr(event, "timestamp", None)
+    if ts is None:
+        return None
+    try:
+        chat_id, user_id = event.get_ids()
+    except Exception:
+        chat_id = user_id = None
+    return f"{kind}:{chat_id}:{user_id}:{ts}"
+
+
+class SeenIndex:
+    def __init__(self, window: float = DEDUP_WINDOW, max_entries: int = DEDUP_MAX):
+        self.window = window
+        self.ring = deque(maxlen=max_entries)
+        self.keys = set()
+        self.dirty = False
+
+    def _evict(self, now: float):
+        ring = self.ring
+        while ring and (len(ring) >= ring.maxlen or now - ring[0][1] > self.window):
+            key, _ = ring.popleft()
+            self.keys.discard(key)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        self._evict(now)
+        if key in self.keys:
+            return True
+        self.ring.append((key, now))
+        self.keys.add(key)
+        self.dirty = True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def load(self, path: Path):
+        try:
+            rows = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("dedup index not loaded: %s", e)
+            return
+        now = time.time()
+        for key, ts in rows:
+            if now - ts <= self.window and key not in self.keys:
+                self.ring.append((key, ts))
+                self.keys.add(key)
+        log.info("dedup index restored: %d ids", len(self.keys))
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(list(self.ring), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self.dirty = False
+
+
+INDEX = SeenIndex()
+metrics.watch_size("dedup.index", INDEX)
+
+
+async def flush_loop():
+    if not DEDUP_PATH:
+        return
+    path = Path(DEDUP_PATH)
+    while True:
+        await asyncio.sleep(DEDUP_FLUSH_SEC)
+        if not INDEX.dirty:
+            continue
+        try:
+            await asyncio.to_thread(INDEX.save, path)
+        except OSError as e:
+            log.warning("dedup index not saved: %s", e)
+
+
+def install(dp):
+    if DEDUP_PATH:
+        INDEX.load(Path(DEDUP_PATH))
+    orig = dp.handle
+
+    async def handle(event_object):
+        key = update_key(event_object)
+        if key is not None and INDEX.seen(key):
+            metrics.DUPLICATES.inc(type=key.split(":", 1)[0])
+            log.info("duplicate update dropped: %s", key)
+            return None
+        return await orig(event_object)
+
+    dp.handle = handle
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+log = logging.getLogger("group_registry")
+
+BASE_DIR = Path(__file__).resolve().parent
+REGISTRY_DB_PATH = BASE_DIR / "data" / "groups.db"
+
+ALIASES: Dict[str, str] = {}
+NAMES: Dict[str, str] = {}
+metrics.watch_size("group_registry.aliases", ALIASES)
+
+_DASHES_RE = re.compile(r"[‐‑‒–—―−_]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def alias_key(text: str) -> str:
+    s = (text or "").strip().lower().replace("ё", "е")
+    s = _DASHES_RE.sub("-", s)
+    return _SPACE_RE.sub("", s)
+
+
+def _connect() -> sqlite3.Connection:
+    REGISTRY_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = metrics.connect(REGISTRY_DB_PATH, "groups")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS group_names (
+            group_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS group_aliases (
+            alias TEXT PRIMARY KEY,
+            group_id TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+    return conn
+
+
+def load() -> int:
+    with _connect() as conn:
+        names = dict(conn.execute("SELECT group_id, name FROM group_names").fetchall())
+        aliases = dict(conn.execute("SELECT alias, group_id FROM group_aliases").fetchall())
+    NAMES.update(names)
+    ALIASES.update({k: gid for k, gid in aliases.items() if gid in NAMES})
+    return len(NAMES)
+
+
+def lookup(text: str) -> Optional[Tuple[str, str]]:
+    gid = ALIASES.get(alias_key(text))
+    if gid is None:
+        return None
+    return gid, NAMES[gid]
+
+
+def canonical(text: str) -> str:
+    hit = lookup(text)
+    return hit[1] if hit else (text or "").strip()
+
+
+def remember_many(groups: Iterable[Tuple[str, str, Iterable[str]]]):
+    names = []
+    aliases = []
+    for gid, name, extra in groups:
+        gid = str(gid)
+        name = (name or "").strip()
+        if not name:
+            continue
+        names.append((gid, name))
+        for text in (name, *extra):
+            key = alias_key(text)
+            if key:
+                aliases.append((key, gid))
+    if not names:
+        return
+    with _connect() as conn:
+        conn.executemany("INSERT OR REPLACE INTO group_names(group_id, name) VALUES (?,?)", names)
+        conn.executemany("INSERT OR REPLACE INTO group_aliases(alias, group_id) VALUES (?,?)", aliases)
+    NAMES.update(names)
+    ALIASES.update(aliases)
+
+
+def remember(gid: str, name: str, *aliases: str):
+    remember_many([(gid, name, aliases)])
+
+
+def _label(g: dict, default: str = "") -> str:
+    return (
+        g.get("group")
+        or g.get("name")
+        or g.get("title")
+        or g.get("label")
+        or g.get("full_name")
+        or g.get("fullname")
+        or default
+    )
+
+
+async def resolve(text: str) -> Optional[Tuple[str, str]]:
+    hit = lookup(text)
+    metrics.cache_result("group_registry", hit is not None)
+    if hit is not None:
+        return hit
+
+    from groups_schedule import _search_group
+
+    groups: List[dict] = await _search_group(text.strip()) or []
+    if not groups:
+        return None
+    key = alias_key(text)
+    exact = [g for g in groups if alias_key(_label(g)) == key]
+    g = exact[0] if exact else groups[0]
+    gid = str(g.get("id"))
+    name = _label(g, text.strip())
+    extra = (text,) if exact or len(groups) == 1 else ()
+    await asyncio.to_thread(remember, gid, name, *extra)
+    return gid, name
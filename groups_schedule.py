@@ -1,14 +1,23 @@
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta, date
 from typing import Dict, List
 
 from pydantic import BaseModel
 from maxapi.types import MessageCreated
 
-from fa_api import FaAPI
 
 from homework import _reply_homework_for_date as _hw_reply_dz
+import metrics
+import tracing
+import timetable_cache
+import upstream
+import group_registry
+import ics_export
+import semester
+import reminders
+import notifications
 
 log = logging.getLogger("groups_schedule")
 
@@ -145,6 +154,12 @@ def _conv_key(event: MessageCreated) -> str:
         v = getattr(event, name, None)
         if v is not None:
             parts.append(f"{name}={v}")
+    if not parts:
+        try:
+            chat_id, user_id = event.get_ids()
+            parts = [f"chat_id={chat_id}", f"user_id={user_id}"]
+        except Exception:
+            pass
     return "|".join(parts) if parts else "global"
 
 def _st(event: MessageCreated) -> dict:
@@ -176,6 +191,14 @@ def _range_kb() -> InlineKeyboardAttachment:
                     {"type": "message", "text": "Выбрать дату"},
                     {"type": "message", "text": "Сменить группу"},
                 ],
+                [
+                    {"type": "message", "text": "📚 Семестр"},
+                    {"type": "message", "text": "📅 В календарь"},
+                ],
+                [
+                    {"type": "message", "text": "🔔 Напоминания"},
+                    {"type": "message", "text": "📣 Изменения"},
+                ],
                 [
                     {
                         "type": "message",
@@ -187,15 +210,68 @@ def _range_kb() -> InlineKeyboardAttachment:
         }
     )
 
-fa = FaAPI()
-
 async def _search_group(query: str):
-    return await asyncio.to_thread(fa.search_group, query)
+    try:
+        with tracing.span("search_group"), metrics.track(metrics.UPSTREAM_LATENCY, metrics.UPSTREAM_ERRORS, method="search_group"):
+            return await upstream.call("search_group", upstream.fa.search_group, query)
+    except Exception:
+        known = timetable_cache.find_group_by_name(query)
+        if not known:
+            raise
+        return known
 
-async def _timetable_group(group_id: str, start: datetime, end: datetime):
+async def _timetable_group(group_id: str, start: datetime, end: datetime, group_name: str = "", ingest: bool = True):
     s = start.strftime("%Y.%m.%d")
     e = end.strftime("%Y.%m.%d")
-    return await asyncio.to_thread(fa.timetable_group, group_id, s, e)
+    with tracing.span("timetable_group", group_id=group_id, start=s, end=e) as sp:
+        try:
+            with metrics.track(metrics.UPSTREAM_LATENCY, metrics.UPSTREAM_ERRORS, method="timetable_group"):
+                raw = await upstream.call("timetable_group", upstream.fa.timetable_group, group_id, s, e)
+        except Exception as ex:
+            cached = upstream.stale(
+                timetable_cache.group_records(group_id, start, end, ttl=upstream.STALE_TTL),
+                timetable_cache.group_fetched_at(group_id, start, end),
+                "group",
+            )
+            if cached is None:
+                raise
+            log.warning("serving stale timetable for %s: %s", group_id, ex)
+            sp.set(stale=True, records=len(cached))
+            return cached
+        sp.set(records=len(raw or []))
+    if not ingest:
+        return raw
+    try:
+        timetable_cache.ingest_group_snapshot(group_id, group_name, raw, start, end)
+    except Exception as ex:
+        log.debug("snapshot ingest failed for %s: %s", group_id, ex)
+    return raw
+
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL_SEC", "1800"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+
+async def prefetch_known_groups():
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    monday, sunday = _week_bounds(today)
+    end = sunday + timedelta(days=7)
+    sem = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def _one(gid: str, name: str):
+        async with sem:
+            try:
+                await _timetable_group(gid, monday, end, group_name=name)
+            except Exception as e:
+                log.debug("prefetch failed for %s: %s", name, e)
+
+    await asyncio.gather(*(_one(gid, name) for gid, name in list(timetable_cache.GROUPS.items())))
+
+async def prefetch_loop():
+    while True:
+        await asyncio.sleep(PREFETCH_INTERVAL)
+        try:
+            await prefetch_known_groups()
+        except Exception as e:
+            log.warning("prefetch loop error: %s", e)
 
 _RU_WEEKDAY_ACC = {
     0: "понедельник",
@@ -207,6 +283,7 @@ _RU_WEEKDAY_ACC = {
     6: "воскресенье",
 }
 
+@tracing.traced("fmt_day")
 def _fmt_day(records: List[dict], group_name: str) -> str:
     if not records:
         return f"Расписание для {group_name} на этот день пустое."
@@ -326,7 +403,7 @@ async def _show_schedule_and_homework_for_day(
         d_human = d.strftime("%d.%m.%Y")
 
         has_hw = False
-        with sqlite3.connect(_HW_DB_PATH) as conn:
+        with metrics.connect(_HW_DB_PATH, "homework") as conn:
             cur = conn.execute(
                 "SELECT name FROM sqlite_master WHERE type='table' AND (name=? OR LOWER(name)=LOWER(?)) LIMIT 1",
                 (group_name, group_name),
@@ -356,6 +433,7 @@ async def open_groups_menu(event: MessageCreated):
         "Введите название группы (например: БИ25-6):"
     )
 
+@metrics.timed("try_handle_group_message")
 async def try_handle_group_message(event: MessageCreated) -> bool:
     body = getattr(event.message, "body", None) or event.message
     text = (getattr(body, "text", None) or "").strip()
@@ -373,28 +451,18 @@ async def try_handle_group_message(event: MessageCreated) -> bool:
         query = text
         await event.message.answer("Ищу группу…")
         try:
-            groups = await _search_group(query)
+            found = await group_registry.resolve(query)
         except Exception as e:
             await event.message.answer(f"Ошибка при запросе группы: {e}")
             return True
 
-        if not groups:
+        if not found:
             await event.message.answer(
                 "Мы не нашли такую группу. Попробуйте ввести название ещё раз:"
             )
             return True
 
-        g = groups[0]
-        gid = str(g.get("id"))
-        name = (
-            g.get("group")
-            or g.get("name")
-            or g.get("title")
-            or g.get("label")
-            or g.get("full_name")
-            or g.get("fullname")
-            or query
-        )
+        gid, name = found
 
         st["mode"] = "IN_GROUP"
         st["group_id"] = gid
@@ -442,11 +510,48 @@ async def try_handle_group_message(event: MessageCreated) -> bool:
                 "Введите название группы (например: БИ25-6):"
             )
             return True
+        elif text == "📚 Семестр":
+            await semester.open_semester(event, "group", gid, name)
+            return True
+        elif text == "📅 В календарь":
+            await ics_export.send(event, "group", gid, name)
+            return True
+        elif text == "🔔 Напоминания":
+            on = await reminders.toggle_subscription(event, gid, name)
+            if on is None:
+                await event.message.answer("Не удалось определить чат для напоминаний.")
+            elif on:
+                await event.message.answer(
+                    f"🔔 Напоминания для {name} включены: за {reminders.DEFAULT_LEAD_MIN} минут до пар "
+                    f"и накануне дедлайнов ДЗ в {reminders.HW_REMIND_HOUR}:00.",
+                    attachments=[_range_kb()],
+                )
+            else:
+                await event.message.answer(
+                    f"🔕 Напоминания для {name} выключены.",
+                    attachments=[_range_kb()],
+                )
+            return True
+        elif text == "📣 Изменения":
+            on = await notifications.toggle_subscription(event, "group", gid, name)
+            if on is None:
+                await event.message.answer("Не удалось определить чат для уведомлений.")
+            elif on:
+                await event.message.answer(
+                    f"📣 Уведомления об изменениях в расписании {name} включены.",
+                    attachments=[_range_kb()],
+                )
+            else:
+                await event.message.answer(
+                    f"Уведомления об изменениях в расписании {name} выключены.",
+                    attachments=[_range_kb()],
+                )
+            return True
         else:
             return False
 
         try:
-            raw = await _timetable_group(gid, start, end)
+            raw = await _timetable_group(gid, start, end, group_name=name)
         except Exception as e:
             await event.message.answer(f"Ошибка при запросе расписания: {e}")
             return True
@@ -474,6 +579,10 @@ async def try_handle_group_message(event: MessageCreated) -> bool:
                 items = [r for r in raw if (r.get("date") or "") == day_iso] or raw
                 await _show_schedule_and_homework_for_day(event, name, day_iso, items)
 
+        note = upstream.stale_note(raw)
+        if note:
+            await event.message.answer(note)
+
         await event.message.answer(
             text="Выберите дальнейшее действие:",
             attachments=[_range_kb()],
@@ -507,7 +616,7 @@ async def try_handle_group_message(event: MessageCreated) -> bool:
 
         start = end = dt
         try:
-            raw = await _timetable_group(gid, start, end)
+            raw = await _timetable_group(gid, start, end, group_name=name)
         except Exception as e:
             await event.message.answer(f"Ошибка при запросе расписания: {e}")
             return True
@@ -515,6 +624,9 @@ async def try_handle_group_message(event: MessageCreated) -> bool:
         day_iso = start.strftime("%Y-%m-%d")
         items = [r for r in (raw or []) if (r.get("date") or "") == day_iso] or (raw or [])
         await _show_schedule_and_homework_for_day(event, name, day_iso, items)
+        note = upstream.stale_note(raw)
+        if note:
+            await event.message.answer(note)
 
         st["mode"] = "IN_GROUP"
         await event.message.answer(
@@ -1,18 +1,25 @@
 import asyncio
+import contextvars
 import logging
 import time
 import os
+import re
 import json
 import sqlite3
 from pathlib import Path
 from datetime import datetime, timedelta, date
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Set
 
 from maxapi.types import MessageCreated, MessageCallback
 from maxapi import F
 
 from maxapi.types import ButtonsPayload, CallbackButton, MessageButton
 
+import attachments
+import group_registry
+import metrics
+import upload_cache
+
 log = logging.getLogger("homework")
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -22,6 +29,10 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 BOOT_TS = time.time()
 OLD_EVENT_SLOP = 1.5
+REPLAY: contextvars.ContextVar[bool] = contextvars.ContextVar("replay", default=False)
+
+SEARCH_PAGE_SIZE = 5
+SERVICE_TABLE_PREFIXES = ("sqlite_", "homework_")
 
 
 def _to_epoch_seconds(v):
@@ -61,6 +72,8 @@ def _extract_event_ts(event) -> Optional[float]:
 
 
 def _is_old_event(event) -> bool:
+    if REPLAY.get():
+        return False
     ts = _extract_event_ts(event)
     return ts is not None and ts < (BOOT_TS - OLD_EVENT_SLOP)
 
@@ -97,6 +110,14 @@ def _dialog_key(event) -> str:
             v = getattr(msg, name, None)
             if v is not None:
                 return f"chat:{v}"
+    try:
+        chat_id, user_id = event.get_ids()
+        if chat_id is not None:
+            return f"chat:{chat_id}"
+        if user_id is not None:
+            return f"user:{user_id}"
+    except Exception:
+        pass
     return "chat:global"
 
 
@@ -143,12 +164,19 @@ def _msg_text(event) -> str:
 
     return (getattr(msg, "text", None) or "").strip()
 
+def homework_is_searching(event) -> bool:
+    key = _dialog_key(event)
+    st = _st(key)
+    mode = st.get("mode") or ""
+    return mode.startswith("SEARCH_")
+
 def homework_is_adding(event) -> bool:
     key = _dialog_key(event)
     st = _st(key)
     mode = st.get("mode") or ""
     return mode.startswith("ADD_")
 
+@metrics.timed("handle_add_message")
 async def handle_add_message(event: MessageCreated):
     if _is_old_event(event) or _is_from_bot(event.message):
         return
@@ -175,6 +203,8 @@ def homework_root_kb() -> dict:
     buttons = [
         [CallbackButton(text="Посмотреть", payload="hw:watch"),
          CallbackButton(text="Добавить",   payload="hw:add")],
+        [CallbackButton(text="Поиск ДЗ",   payload="hw:search"),
+         CallbackButton(text="📥 Импорт",  payload="hw:import")],
         [MessageButton(text="⬅️ В меню", payload="menu:home")],
     ]
     return ButtonsPayload(buttons=buttons).pack()
@@ -191,6 +221,19 @@ def _after_add_kb() -> dict:
 def _homework_root_kb() -> dict:
     return homework_root_kb()
 
+def _search_results_kb(has_prev: bool, has_next: bool) -> dict:
+    nav = []
+    if has_prev:
+        nav.append(CallbackButton(text="◀️ Назад", payload="hw:search_prev"))
+    if has_next:
+        nav.append(CallbackButton(text="Далее ▶️", payload="hw:search_next"))
+    buttons = []
+    if nav:
+        buttons.append(nav)
+    buttons.append([CallbackButton(text="Новый поиск", payload="hw:search")])
+    buttons.append([MessageButton(text="⬅️ В меню", payload="menu:home")])
+    return ButtonsPayload(buttons=buttons).pack()
+
 def _no_files_kb() -> dict:
     buttons = [[CallbackButton(text="Нет файлов (сохранить)", payload="hw:nofile")]]
     return ButtonsPayload(buttons=buttons).pack()
@@ -219,19 +262,8 @@ def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
     return cur.fetchone() is not None
 
 def _resolve_table_name(conn: sqlite3.Connection, group: str) -> Optional[str]:
-    cur = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-        (group,)
-    )
-    row = cur.fetchone()
-    if row:
-        return row[0]
-    cur = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND LOWER(name)=LOWER(?)",
-        (group,)
-    )
-    row = cur.fetchone()
-    return row[0] if row else None
+    table = group_registry.canonical(group)
+    return table if _table_exists(conn, table) else None
 
 def _create_group_table_if_needed(conn: sqlite3.Connection, table: str):
     if not _table_exists(conn, table):
@@ -248,6 +280,7 @@ def _create_group_table_if_needed(conn: sqlite3.Connection, table: str):
             """
         )
         conn.commit()
+    _ensure_fts_triggers(conn, table)
 
 def _select_for_dates(conn: sqlite3.Connection, table: str, date_strs: List[str]) -> List[dict]:
     q_marks = ",".join("?" for _ in date_strs)
@@ -263,13 +296,196 @@ def _select_for_dates(conn: sqlite3.Connection, table: str, date_strs: List[str]
         out.append({"subject": subject, "deadline": deadline, "task": task, "files": files_list})
     return out
 
-def _insert_homework(conn: sqlite3.Connection, table: str, subject: str, deadline: date, task: str, files: List[str]):
+_FTS_STATE = {"ready": False, "available": True}
+
+def _sql_literal(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+def _group_tables(conn: sqlite3.Connection) -> List[str]:
+    cur = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return [r[0] for r in cur.fetchall() if not r[0].startswith(SERVICE_TABLE_PREFIXES)]
+
+PRESENCE: Dict[str, Set[str]] = {}
+_PRESENCE_STATE = {"ready": False}
+
+def _merge_tables(conn: sqlite3.Connection, name: str, legacy: Optional[List[str]] = None) -> int:
+    if legacy is None:
+        key = group_registry.alias_key(name)
+        legacy = [t for t in _group_tables(conn) if t != name and group_registry.alias_key(t) == key]
+    if not legacy:
+        return 0
+    _ensure_fts(conn)
+    _create_group_table_if_needed(conn, name)
+    with conn:
+        for table in legacy:
+            conn.execute(
+                f'INSERT INTO "{name}"(subject, deadline, task, files, created_at) '
+                f'SELECT subject, deadline, task, files, created_at FROM "{table}" ORDER BY id'
+            )
+            conn.execute(f'DELETE FROM "{table}"')
+            conn.execute(f'DROP TABLE "{table}"')
+    present = PRESENCE.setdefault(name, set())
+    for table in legacy:
+        present |= PRESENCE.pop(table, set())
+    log.warning("homework tables %s merged into %s", ", ".join(legacy), name)
+    return len(legacy)
+
+def _adopt_legacy_tables(name: str) -> int:
+    if _PRESENCE_STATE["ready"]:
+        key = group_registry.alias_key(name)
+        if not any(t != name and group_registry.alias_key(t) == key for t in PRESENCE):
+            return 0
+    _ensure_db()
+    with metrics.connect(DB_PATH, "homework") as conn:
+        return _merge_tables(conn, name)
+
+def load_presence() -> int:
+    _ensure_db()
+    presence: Dict[str, Set[str]] = {}
+    with metrics.connect(DB_PATH, "homework") as conn:
+        _ensure_fts(conn)
+        by_key: Dict[str, List[str]] = {}
+        for table in _group_tables(conn):
+            by_key.setdefault(group_registry.alias_key(table), []).append(table)
+        for key, tables in by_key.items():
+            hit = group_registry.lookup(key)
+            if hit is not None and any(t != hit[1] for t in tables):
+                _merge_tables(conn, hit[1], [t for t in tables if t != hit[1]])
+        for table in _group_tables(conn):
+            presence[table] = {r[0] for r in conn.execute(f'SELECT DISTINCT deadline FROM "{table}"')}
+    PRESENCE.clear()
+    PRESENCE.update(presence)
+    _PRESENCE_STATE["ready"] = True
+    return len(presence)
+
+def _known_table(group: str) -> Optional[str]:
+    table = group_registry.canonical(group)
+    return table if table in PRESENCE else None
+
+async def _choose_group(event, text: str) -> Optional[str]:
+    try:
+        found = await group_registry.resolve(text)
+    except Exception as e:
+        log.warning("group lookup failed for %r: %s", text, e)
+        await event.message.answer("Не удалось проверить группу, РУЗ сейчас недоступен. Попробуйте ввести название ещё раз чуть позже:")
+        return None
+    if not found:
+        await event.message.answer("Мы не нашли такую группу. Попробуйте ввести название ещё раз:")
+        return None
+    await asyncio.to_thread(_adopt_legacy_tables, found[1])
+    return found[1]
+
+def _ensure_fts_triggers(conn: sqlite3.Connection, table: str):
+    if not _FTS_STATE["available"]:
+        return
+    grp = _sql_literal(table)
+    row_q = f"(SELECT rowid FROM homework_fts_rows WHERE grp={grp} AND hw_id=old.id)"
+    conn.executescript(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS "{table}__fts_ai" AFTER INSERT ON "{table}" BEGIN
+            INSERT INTO homework_fts_rows(grp, hw_id) VALUES ({grp}, new.id);
+            INSERT INTO homework_fts(rowid, subject, task, grp, deadline, hw_id)
+            VALUES (last_insert_rowid(), new.subject, new.task, {grp}, new.deadline, new.id);
+        END;
+        CREATE TRIGGER IF NOT EXISTS "{table}__fts_ad" AFTER DELETE ON "{table}" BEGIN
+            DELETE FROM homework_fts WHERE rowid={row_q};
+            DELETE FROM homework_fts_rows WHERE grp={grp} AND hw_id=old.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS "{table}__fts_au" AFTER UPDATE OF subject, task, deadline ON "{table}" BEGIN
+            UPDATE homework_fts SET subject=new.subject, task=new.task, deadline=new.deadline
+            WHERE rowid={row_q};
+        END;
+        """
+    )
+
+def _ensure_fts(conn: sqlite3.Connection) -> bool:
+    if _FTS_STATE["ready"]:
+        return True
+    if not _FTS_STATE["available"]:
+        return False
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name='homework_fts'").fetchone()
+    if row and "grp UNINDEXED" in row[0]:
+        log.warning("homework_fts: пересоздаю индекс с колонкой grp")
+        conn.execute("DROP TABLE homework_fts")
+        conn.execute("DROP TABLE IF EXISTS homework_fts_rows")
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS homework_fts USING fts5("
+            "subject, task, grp, deadline UNINDEXED, hw_id UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+    except sqlite3.OperationalError as e:
+        log.warning("FTS5 недоступен, поиск ДЗ отключён: %s", e)
+        _FTS_STATE["available"] = False
+        return False
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS homework_fts_rows ("
+        "grp TEXT NOT NULL, hw_id INTEGER NOT NULL, PRIMARY KEY (grp, hw_id))"
+    )
+
+    for table in _group_tables(conn):
+        _ensure_fts_triggers(conn, table)
+        missing = conn.execute(
+            f'SELECT id, subject, task, deadline FROM "{table}" '
+            f'WHERE id NOT IN (SELECT hw_id FROM homework_fts_rows WHERE grp=?)',
+            (table,),
+        ).fetchall()
+        for hw_id, subject, task, deadline in missing:
+            cur = conn.execute("INSERT INTO homework_fts_rows(grp, hw_id) VALUES (?, ?)", (table, hw_id))
+            conn.execute(
+                "INSERT INTO homework_fts(rowid, subject, task, grp, deadline, hw_id) VALUES (?,?,?,?,?,?)",
+                (cur.lastrowid, subject, task, table, deadline, hw_id),
+            )
+    conn.commit()
+    _FTS_STATE["ready"] = True
+    return True
+
+def _fts_query(text: str) -> str:
+    terms = re.findall(r"\w+", (text or "").lower())
+    return " ".join(f'"{t}"*' for t in terms)
+
+def _search_homework(conn: sqlite3.Connection, table: str, text: str, page: int) -> tuple[int, List[dict]]:
+    q = _fts_query(text)
+    if not q:
+        return 0, []
+    q = f'grp:"{table.replace(chr(34), chr(34) * 2)}" AND {{subject task}}:({q})'
+    total = conn.execute(
+        "SELECT count(*) FROM homework_fts WHERE homework_fts MATCH ? AND grp=?",
+        (q, table),
+    ).fetchone()[0]
+    cur = conn.execute(
+        "SELECT subject, deadline, snippet(homework_fts, 1, '«', '»', '…', 16) "
+        "FROM homework_fts WHERE homework_fts MATCH ? AND grp=? "
+        "ORDER BY bm25(homework_fts, 2.0, 1.0, 0.0) LIMIT ? OFFSET ?",
+        (q, table, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE),
+    )
+    return total, [{"subject": r[0], "deadline": r[1], "task": r[2]} for r in cur.fetchall()]
+
+def _insert_homework(conn: sqlite3.Connection, table: str, subject: str, deadline: date, task: str, files: List):
+    _ensure_fts(conn)
     _create_group_table_if_needed(conn, table)
     conn.execute(
         f'INSERT INTO "{table}"(subject, deadline, task, files) VALUES (?,?,?,?)',
         (subject, _human_date(deadline), task, json.dumps(files, ensure_ascii=False)),
     )
     conn.commit()
+    PRESENCE.setdefault(table, set()).add(_human_date(deadline))
+
+def _insert_homework_batch(conn: sqlite3.Connection, rows: Dict[str, List[tuple]]) -> int:
+    _ensure_fts(conn)
+    for table in rows:
+        _create_group_table_if_needed(conn, table)
+    n = 0
+    with conn:
+        for table, items in rows.items():
+            conn.executemany(
+                f'INSERT INTO "{table}"(subject, deadline, task, files) VALUES (?,?,?,?)',
+                [(subject, _human_date(deadline), task, "[]") for subject, deadline, task in items],
+            )
+            n += len(items)
+    for table, items in rows.items():
+        PRESENCE.setdefault(table, set()).update(_human_date(d) for _, d, _ in items)
+    return n
 
 async def open_homework_menu(event: MessageCreated):
     if _is_old_event(event) or _is_from_bot(event.message):
@@ -298,12 +514,14 @@ async def open_watch_menu(event: MessageCreated | MessageCallback):
         return
 
     if text:
-        group = text
+        group = await _choose_group(event, text)
+        if group is None:
+            return
         st["mode"] = "IN_GROUP"
         st["group_id"] = group
         st["group_name"] = group
 
-        await event.message.answer(f"Вы ввели номер группы: {group}")
+        await event.message.answer(f"Группа: {group}")
         await event.message.answer(
             text="Выберите период:",
             attachments=[_range_kb()],
@@ -312,52 +530,170 @@ async def open_watch_menu(event: MessageCreated | MessageCallback):
 
     await event.message.answer("Введите номер группы (например: БИ25-6):")
 
+def _hot_items(group: str, d_human: str, d_iso: str) -> Optional[List[dict]]:
+    if _PRESENCE_STATE["ready"]:
+        table = _known_table(group)
+        if not table:
+            return None
+        if not PRESENCE[table] & {d_human, d_iso}:
+            return []
+
+    with metrics.connect(DB_PATH, "homework") as conn:
+        table = _resolve_table_name(conn, group)
+        if not table:
+            return None
+        return _select_for_dates(conn, table, [d_human, d_iso])
+
+
 async def _reply_homework_for_date(event: MessageCreated, group: str, day: date):
     _ensure_db()
     d_human = _human_date(day)
     d_iso = _iso_date(day)
 
-    with sqlite3.connect(DB_PATH) as conn:
+    import homework_archive
+
+    items = _hot_items(group, d_human, d_iso)
+    if homework_archive.is_archived(day):
+        archived = await asyncio.to_thread(homework_archive.select_for_dates, group, [d_human, d_iso])
+        if archived:
+            items = archived + (items or [])
+    if items is None:
+        await event.message.answer("Для этой группы ДЗ пока не добавляли.")
+        return
+    if not items:
+        await event.message.answer(f"На {d_human} ничего не найдено.")
+        return
+
+    for it in items:
+        subject = (it.get("subject") or "Предмет").strip()
+        deadline_str = (it.get("deadline") or d_human).strip()
+        task = (it.get("task") or "").strip()
+        files = it.get("files") or []
+
+        lines = [
+            f"Домашняя работа на {d_human}",
+            f"Предмет: {subject}",
+            f"Дедлайн: {deadline_str}",
+        ]
+        if task:
+            lines.append(f"Задание: {task}")
+        if files:
+            for f in files:
+                lines.append(f"Файл: {attachments.file_name(f)}")
+
+        await event.message.answer("\n".join(lines))
+
+        for f in files:
+            if isinstance(f, dict) and f.get("sha256"):
+                try:
+                    sent = await upload_cache.send_file(event, DB_PATH, f)
+                except Exception as e:
+                    log.warning("send_file failed for %s: %s", f.get("sha256"), e)
+                    sent = False
+                if not sent:
+                    await event.message.answer(f"📎 Файл {attachments.file_name(f)} сейчас недоступен.")
+                continue
+            p = DATA_DIR / group / f
+            if p.exists():
+                await event.message.answer(f"📎 Файл: {p}")
+
+
+async def _reply_homework_for_week(event: MessageCreated, group: str, start: date):
+    monday = start - timedelta(days=start.weekday())
+    for i in range(6):  
+        day = monday + timedelta(days=i)
+        await _reply_homework_for_date(event, group, day)
+
+
+async def _start_search_flow(event: MessageCreated | MessageCallback):
+    if _is_old_event(event):
+        return
+    if isinstance(event, MessageCreated) and _is_from_bot(event.message):
+        return
+
+    key = _dialog_key(event)
+    st = _st(key)
+    group = st.get("group_name") or st.get("group_id")
+    st.pop("search", None)
+
+    if group:
+        st["mode"] = "SEARCH_ASK_QUERY"
+        await event.message.answer(f"Поиск ДЗ группы {group}.\nВведите слово или фразу (например: эссе, контрольная):")
+        return
+
+    st["mode"] = "SEARCH_ASK_GROUP"
+    await event.message.answer("Введите номер группы, в ДЗ которой искать (например: БИ25-6):")
+
+
+async def _reply_search_page(event: MessageCreated | MessageCallback):
+    key = _dialog_key(event)
+    st = _st(key)
+    search = st.get("search") or {}
+    group = search.get("group")
+    query = search.get("query")
+    page = search.get("page", 0)
+    if not (group and query):
+        await _start_search_flow(event)
+        return
+
+    _ensure_db()
+    with metrics.connect(DB_PATH, "homework") as conn:
+        if not _ensure_fts(conn):
+            await event.message.answer("Поиск ДЗ временно недоступен.")
+            return
         table = _resolve_table_name(conn, group)
         if not table:
             await event.message.answer("Для этой группы ДЗ пока не добавляли.")
             return
+        total, items = _search_homework(conn, table, query, page)
 
-        items = _select_for_dates(conn, table, [d_human, d_iso])
-        if not items:
-            await event.message.answer(f"На {d_human} ничего не найдено.")
-            return
+    if not total:
+        await event.message.answer(
+            f"По запросу «{query}» в ДЗ группы {group} ничего не найдено. Введите другой запрос:",
+            attachments=[_search_results_kb(False, False)],
+        )
+        return
 
-        for it in items:
-            subject = (it.get("subject") or "Предмет").strip()
-            deadline_str = (it.get("deadline") or d_human).strip()
-            task = (it.get("task") or "").strip()
-            files = it.get("files") or []
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    lines = [f"Поиск «{query}» в ДЗ группы {group}: найдено {total}, стр. {page + 1}/{pages}", ""]
+    for i, it in enumerate(items, start=page * SEARCH_PAGE_SIZE + 1):
+        lines.append(f"{i}. {it['deadline']} — {it['subject']}")
+        if it["task"]:
+            lines.append(f"    {it['task']}")
 
-            lines = [
-                f"Домашняя работа на {d_human}",
-                f"Предмет: {subject}",
-                f"Дедлайн: {deadline_str}",
-            ]
-            if task:
-                lines.append(f"Задание: {task}")
-            if files:
-                for fn in files:
-                    lines.append(f"Файл: {fn}")
+    await event.message.answer(
+        "\n".join(lines),
+        attachments=[_search_results_kb(page > 0, page + 1 < pages)],
+    )
 
-            await event.message.answer("\n".join(lines))
 
-            for fn in files:
-                p = DATA_DIR / group / fn
-                if p.exists():
-                    await event.message.answer(f"📎 Файл: {p}")
+@metrics.timed("handle_search_message")
+async def handle_search_message(event: MessageCreated):
+    if _is_old_event(event) or _is_from_bot(event.message):
+        return
+    text = _msg_text(event).strip()
+    if not text:
+        return
 
+    key = _dialog_key(event)
+    st = _st(key)
 
-async def _reply_homework_for_week(event: MessageCreated, group: str, start: date):
-    monday = start - timedelta(days=start.weekday())
-    for i in range(6):  
-        day = monday + timedelta(days=i)
-        await _reply_homework_for_date(event, group, day)
+    if st.get("mode") == "SEARCH_ASK_GROUP":
+        group = await _choose_group(event, text)
+        if group is None:
+            return
+        st["group_id"] = group
+        st["group_name"] = group
+        st["mode"] = "SEARCH_ASK_QUERY"
+        await event.message.answer(f"Группа: {group}\nВведите слово или фразу для поиска:")
+        return
+
+    st["search"] = {"group": st.get("group_name") or st.get("group_id"), "query": text, "page": 0}
+    try:
+        await _reply_search_page(event)
+    except Exception as e:
+        log.exception("homework search failed: %s", e)
+        await event.message.answer("Не удалось выполнить поиск ДЗ. Попробуйте ещё раз.")
 
 
 async def _start_add_flow(event: MessageCreated | MessageCallback):
@@ -376,6 +712,31 @@ async def _start_add_flow(event: MessageCreated | MessageCallback):
     await event.message.answer("Введите номер группы, для которой добавляете ДЗ (например: БИ25-6):")
 
 
+def _incoming_files(event) -> List[dict]:
+    msg = getattr(event, "message", None)
+    atts = getattr(msg, "attachments", None) or getattr(getattr(msg, "body", None), "attachments", None)
+    if not atts or not isinstance(atts, list):
+        return []
+    items = []
+    for n, a in enumerate(atts, start=1):
+        if isinstance(a, dict):
+            name = a.get("filename") or a.get("file_name") or a.get("name") or a.get("title")
+            payload = a.get("payload") or {}
+            url = payload.get("url") if isinstance(payload, dict) else None
+            size = a.get("size")
+        else:
+            name = (getattr(a, "filename", None) or getattr(a, "file_name", None)
+                    or getattr(a, "name", None) or getattr(a, "title", None))
+            url = getattr(getattr(a, "payload", None), "url", None)
+            size = getattr(a, "size", None)
+        if not url:
+            continue
+        if not name:
+            name = os.path.basename(url.split("?", 1)[0]) or f"file_{n}"
+        items.append({"name": name, "url": url, "size": size})
+    return items
+
+
 async def _try_handle_add_flow(event: MessageCreated, text: str) -> bool:
     key = _dialog_key(event)
     st = _st(key)
@@ -383,7 +744,9 @@ async def _try_handle_add_flow(event: MessageCreated, text: str) -> bool:
     add = st.setdefault("add", {})
 
     if mode == "ADD_ASK_GROUP":
-        group_name = text.strip()
+        group_name = await _choose_group(event, text)
+        if group_name is None:
+            return True
         add["group"] = group_name
         st["mode"] = "ADD_ASK_SUBJECT"
         await event.message.answer(f"Группа: {group_name}\nВведите название предмета:")
@@ -410,37 +773,41 @@ async def _try_handle_add_flow(event: MessageCreated, text: str) -> bool:
         add.setdefault("files", [])
         st["mode"] = "ADD_WAIT_FILES"
         await event.message.answer(
-            "Прикрепите сюда файлы при их наличии.\nЕсли файлов нет — нажмите кнопку ниже:\nВажно! В MAX пока нет механики добавления файлов. Как только она появится, файлы будут загружаться корректно.",
+            f"Прикрепите сюда файлы при их наличии (до {attachments.MAX_ATTACHMENT_BYTES // (1024 * 1024)} МБ каждый).\nЕсли файлов нет — нажмите кнопку ниже:",
             attachments=[_no_files_kb()],
         )
         return True
 
     if mode == "ADD_WAIT_FILES":
-        msg = getattr(event, "message", None)
-        atts = getattr(msg, "attachments", None)
-        if atts and isinstance(atts, list):
-            saved = 0
-            grp = add.get("group")
+        incoming = _incoming_files(event)
+        if incoming:
             d = add.get("deadline")
-            for a in atts:
-                name = None
-                if isinstance(a, dict):
-                    name = a.get("file_name") or a.get("name") or a.get("title")
-                else:
-                    name = getattr(a, "file_name", None) or getattr(a, "name", None) or getattr(a, "title", None)
-                if not name:
-                    continue
-                stem, dot, ext = name.partition(".")
+            items = []
+            for it in incoming:
+                stem, dot, ext = it["name"].partition(".")
                 new_name = f"{stem}_{_human_date(d)}{('.' + ext) if dot else ''}"
-                (DATA_DIR / grp).mkdir(parents=True, exist_ok=True)
-                add["files"].append(new_name)
-                saved += 1
-            if saved:
-                await event.message.answer(f"Принято файлов: {saved}. Нажмите «Нет файлов (сохранить)», чтобы записать ДЗ.")
+                items.append({"name": new_name, "url": it["url"], "size": it["size"]})
+
+            if items:
+                _ensure_db()
+                stored, failed = await attachments.store_attachments(items, DB_PATH)
+                add["files"].extend(stored)
+                lines = []
+                if stored:
+                    lines.append(f"Принято файлов: {len(stored)}.")
+                for name, reason in failed:
+                    lines.append(f"Не принят файл {name}: {reason}.")
+                lines.append("Нажмите «Нет файлов (сохранить)», чтобы записать ДЗ.")
+                await event.message.answer("\n".join(lines), attachments=[_no_files_kb()])
                 return True
         await event.message.answer("Прикрепите файлы (если есть) или нажмите «Нет файлов (сохранить)».")
         return True
 
+    if mode == "ADD_IMPORT":
+        import homework_import
+        await homework_import.handle_upload(event)
+        return True
+
     if mode == "ADD_CONFIRM":
         return True
 
@@ -455,14 +822,15 @@ async def _finalize_add(event: MessageCreated | MessageCallback):
     subj = (add.get("subject") or "").strip()
     dl: date = add.get("deadline")
     task = (add.get("task") or "").strip()
-    files: List[str] = add.get("files") or []
+    files: List[dict] = add.get("files") or []
 
     if not (grp and subj and dl and task):
         await event.message.answer("Похоже, не вся информация собрана. Попробуйте ещё раз / начните заново.")
         return
 
     _ensure_db()
-    with sqlite3.connect(DB_PATH) as conn:
+    with metrics.connect(DB_PATH, "homework") as conn:
+        attachments.add_refs(conn, files)
         _insert_homework(conn, grp, subj, dl, task, files)
 
     st["mode"] = "IN_GROUP"
@@ -479,7 +847,7 @@ async def _finalize_add(event: MessageCreated | MessageCallback):
     ]
     if files:
         lines.append("Файлы:")
-        lines.extend(files)
+        lines.extend(attachments.file_name(f) for f in files)
 
     await event.message.answer("\n".join(lines))
     await event.message.answer(
@@ -572,6 +940,44 @@ def register_homework_handlers(dp, bot):
             await event.message.answer("Раздел «Добавить» временно недоступен.")
 
 
+    @dp.message_callback(F.callback.payload == "hw:import")
+    async def _go_import_by_callback(event: MessageCallback):
+        if _is_old_event(event):
+            return
+        try:
+            import homework_import
+            await homework_import.start_upload(event)
+        except Exception as e:
+            log.exception("start_import_flow (callback) failed: %s", e)
+            await event.message.answer("Импорт ДЗ временно недоступен.")
+
+    @dp.message_callback(F.callback.payload == "hw:search")
+    async def _go_search_by_callback(event: MessageCallback):
+        if _is_old_event(event):
+            return
+        try:
+            await _start_search_flow(event)
+        except Exception as e:
+            log.exception("start_search_flow (callback) failed: %s", e)
+            await event.message.answer("Раздел «Поиск ДЗ» временно недоступен.")
+
+    @dp.message_callback(F.callback.payload == "hw:search_next")
+    async def _search_next(event: MessageCallback):
+        key = _dialog_key(event); st = _st(key)
+        search = st.get("search")
+        if search:
+            search["page"] = search.get("page", 0) + 1
+        await _reply_search_page(event)
+
+    @dp.message_callback(F.callback.payload == "hw:search_prev")
+    async def _search_prev(event: MessageCallback):
+        key = _dialog_key(event); st = _st(key)
+        search = st.get("search")
+        if search:
+            search["page"] = max(0, search.get("page", 0) - 1)
+        await _reply_search_page(event)
+
+
     @dp.message_callback(F.callback.payload == "hw:today")
     async def _hw_today(event: MessageCallback):
         key = _dialog_key(event); st = _st(key)
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import group_registry
+import homework
+import metrics
+
+log = logging.getLogger("homework_archive")
+
+ARCHIVE_PATH = Path(os.getenv("HW_ARCHIVE_PATH", str(homework.BASE_DIR / "data" / "homework_archive.db")))
+ARCHIVE_AFTER_DAYS = int(os.getenv("HW_ARCHIVE_AFTER_DAYS", "60"))
+ARCHIVE_HOUR = int(os.getenv("HW_ARCHIVE_HOUR", "4"))
+VACUUM_PAGES = int(os.getenv("HW_VACUUM_PAGES", "2000"))
+
+_DEADLINE_ISO = (
+    "CASE WHEN deadline LIKE '____-__-__' THEN deadline "
+    "ELSE substr(deadline, 7, 4) || '-' || substr(deadline, 4, 2) || '-' || substr(deadline, 1, 2) END"
+)
+
+
+def _ensure_archive(conn, schema: str = "main"):
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema}.homework_archive (
+            grp TEXT NOT NULL,
+            grp_key TEXT NOT NULL,
+            hw_id INTEGER NOT NULL,
+            subject TEXT NOT NULL,
+            deadline TEXT NOT NULL,
+            deadline_iso TEXT NOT NULL,
+            task TEXT NOT NULL,
+            files TEXT DEFAULT '[]',
+            created_at TEXT,
+            archived_at REAL NOT NULL,
+            PRIMARY KEY (grp, hw_id)
+        )
+        """
+    )
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.homework_archive_by_day ON homework_archive(grp_key, deadline_iso)"
+    )
+
+
+def cutoff(today: Optional[date] = None) -> Optional[date]:
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return None
+    return (today or datetime.now().date()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def is_archived(day: date) -> bool:
+    limit = cutoff()
+    return limit is not None and day < limit
+
+
+def _compact(conn):
+    conn.execute("ANALYZE")
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        log.warning("homework db switched to incremental auto_vacuum")
+        return
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if free:
+        conn.execute(f"PRAGMA incremental_vacuum({int(VACUUM_PAGES)})")
+
+
+def run(today: Optional[date] = None) -> Dict[str, int]:
+    limit = cutoff(today)
+    if limit is None:
+        return {}
+    homework._ensure_db()
+    ARCHIVE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    limit_iso = limit.isoformat()
+    now = time.time()
+    moved: Dict[str, int] = {}
+    gone: Dict[str, set] = {}
+
+    with metrics.connect(homework.DB_PATH, "homework") as conn:
+        conn.execute("ATTACH DATABASE ? AS arch", (str(ARCHIVE_PATH),))
+        try:
+            _ensure_archive(conn, "arch")
+            conn.commit()
+            with conn:
+                for table in homework._group_tables(conn):
+                    where = f"{_DEADLINE_ISO} < ?"
+                    days = {r[0] for r in conn.execute(f'SELECT DISTINCT deadline FROM "{table}" WHERE {where}', (limit_iso,))}
+                    if not days:
+                        continue
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO arch.homework_archive"
+                        f"(grp, grp_key, hw_id, subject, deadline, deadline_iso, task, files, created_at, archived_at) "
+                        f'SELECT ?, ?, id, subject, deadline, {_DEADLINE_ISO}, task, files, created_at, ? FROM "{table}" WHERE {where}',
+                        (table, group_registry.alias_key(table), now, limit_iso),
+                    )
+                    n = conn.execute(f'DELETE FROM "{table}" WHERE {where}', (limit_iso,)).rowcount
+                    moved[table] = n
+                    gone[table] = days
+        finally:
+            conn.execute("DETACH DATABASE arch")
+
+        for table, days in gone.items():
+            present = homework.PRESENCE.get(table)
+            if present is not None:
+                present.difference_update(days)
+
+        total = sum(moved.values())
+        if total:
+            metrics.HOMEWORK_ARCHIVED.inc(total)
+        _compact(conn)
+
+    with metrics.connect(ARCHIVE_PATH, "homework_archive") as arch:
+        arch.execute("ANALYZE")
+    return moved
+
+
+def select_for_dates(group: str, date_strs: List[str]) -> List[dict]:
+    if not ARCHIVE_PATH.exists():
+        return []
+    days = set()
+    for s in date_strs:
+        d = homework._parse_user_date(s)
+        if d is not None:
+            days.add(d.isoformat())
+    if not days:
+        return []
+    q = ",".join("?" for _ in days)
+    with metrics.connect(ARCHIVE_PATH, "homework_archive") as conn:
+        _ensure_archive(conn)
+        rows = conn.execute(
+            f"SELECT subject, deadline, task, files FROM homework_archive "
+            f"WHERE grp_key=? AND deadline_iso IN ({q}) ORDER BY hw_id ASC",
+            (group_registry.alias_key(group), *sorted(days)),
+        ).fetchall()
+    out = []
+    for subject, deadline, task, files in rows:
+        try:
+            files_list = json.loads(files) if isinstance(files, str) else (files or [])
+        except Exception:
+            files_list = []
+        out.append({"subject": subject, "deadline": deadline, "task": task, "files": files_list})
+    return out
+
+
+def _seconds_until_off_peak(now: datetime) -> float:
+    nxt = now.replace(hour=ARCHIVE_HOUR, minute=0, second=0, microsecond=0)
+    if nxt <= now:
+        nxt += timedelta(days=1)
+    return (nxt - now).total_seconds()
+
+
+async def archive_loop():
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return
+    while True:
+        await asyncio.sleep(_seconds_until_off_peak(datetime.now()))
+        t0 = time.perf_counter()
+        try:
+            moved = await asyncio.to_thread(run)
+        except Exception as e:
+            log.warning("homework archival failed: %s", e)
+            continue
+        log.warning(
+            "homework archival: %d rows from %d groups in %.2fs",
+            sum(moved.values()), len(moved), time.perf_counter() - t0,
+        )
+
+
+def main(argv=None) -> int:
+    global ARCHIVE_AFTER_DAYS
+    ap = argparse.ArgumentParser(description="Move homework with old deadlines into the archive DB and compact data/homework.db")
+    ap.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive deadlines older than this many days")
+    args = ap.parse_args(argv)
+    ARCHIVE_AFTER_DAYS = args.days
+    moved = run()
+    print(f"archived {sum(moved.values())} rows from {len(moved)} groups into {ARCHIVE_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+import group_registry
+import homework
+import metrics
+
+log = logging.getLogger("homework_import")
+
+IMPORT_MAX_BYTES = int(os.getenv("HW_IMPORT_MAX_MB", "5")) * 1024 * 1024
+IMPORT_MAX_ROWS = int(os.getenv("HW_IMPORT_MAX_ROWS", "20000"))
+IMPORT_MAX_GROUPS = int(os.getenv("HW_IMPORT_MAX_GROUPS", "50"))
+MAX_ERRORS_SHOWN = 10
+
+FIELDS = {
+    "group": ("group", "группа", "grp"),
+    "subject": ("subject", "предмет", "дисциплина", "discipline"),
+    "deadline": ("deadline", "дедлайн", "срок", "date", "дата"),
+    "task": ("task", "задание", "дз", "homework"),
+}
+_ALIASES = {alias: field for field, names in FIELDS.items() for alias in names}
+
+Row = Tuple[str, str, date, str]
+
+
+def _normalize(raw: dict) -> dict:
+    out = {}
+    for k, v in raw.items():
+        field = _ALIASES.get(str(k or "").strip().lower())
+        if field is not None and field not in out:
+            out[field] = v
+    return out
+
+
+def _records_from_json(data) -> List[dict]:
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        out = []
+        for group, items in data.items():
+            if not isinstance(items, list):
+                raise ValueError(f"группа {group}: ожидался список заданий")
+            for it in items:
+                if isinstance(it, dict):
+                    it = dict(it)
+                    it.setdefault("group", group)
+                out.append(it)
+        return out
+    raise ValueError("ожидался список заданий или объект {группа: [задания]}")
+
+
+def _records_from_csv(text: str) -> List[dict]:
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+def parse(data: bytes, name: str = "") -> List[dict]:
+    text = data.decode("utf-8-sig")
+    if name.lower().endswith(".json") or text.lstrip()[:1] in ("[", "{"):
+        return _records_from_json(json.loads(text))
+    return _records_from_csv(text)
+
+
+def validate(records: List[dict], default_group: Optional[str] = None) -> Tuple[List[Row], List[Tuple[int, str]]]:
+    rows: List[Row] = []
+    errors: List[Tuple[int, str]] = []
+    for n, raw in enumerate(records, start=1):
+        if not isinstance(raw, dict):
+            errors.append((n, "строка не является объектом"))
+            continue
+        rec = _normalize(raw)
+        group = str(rec.get("group") or default_group or "").strip()
+        subject = str(rec.get("subject") or "").strip()
+        task = str(rec.get("task") or "").strip()
+        deadline = homework._parse_user_date(str(rec.get("deadline") or ""))
+        missing = [f for f, v in (("группа", group), ("предмет", subject), ("задание", task)) if not v]
+        if missing:
+            errors.append((n, "не заполнено: " + ", ".join(missing)))
+            continue
+        if deadline is None:
+            errors.append((n, f"не понял дату «{rec.get('deadline') or ''}»"))
+            continue
+        if '"' in group or group.lower().startswith(homework.SERVICE_TABLE_PREFIXES):
+            errors.append((n, f"недопустимое имя группы «{group}»"))
+            continue
+        rows.append((group, subject, deadline, task))
+    return rows, errors
+
+
+def _plan(conn, rows: List[Row]) -> Tuple[Dict[str, List[tuple]], int]:
+    by_table: Dict[str, List[tuple]] = {}
+    tables: Dict[str, str] = {}
+    for group, subject, deadline, task in rows:
+        table = tables.get(group)
+        if table is None:
+            table = tables[group] = group_registry.canonical(group)
+        by_table.setdefault(table, []).append((subject, deadline, task))
+
+    skipped = 0
+    for table, items in by_table.items():
+        seen = set()
+        if homework._table_exists(conn, table):
+            days = sorted({homework._human_date(d) for _, d, _ in items})
+            for i in range(0, len(days), 500):
+                chunk = days[i:i + 500]
+                q = ",".join("?" for _ in chunk)
+                seen.update(conn.execute(
+                    f'SELECT subject, deadline, task FROM "{table}" WHERE deadline IN ({q})', chunk
+                ).fetchall())
+        fresh = []
+        for subject, deadline, task in items:
+            key = (subject, homework._human_date(deadline), task)
+            if key in seen:
+                skipped += 1
+                continue
+            seen.add(key)
+            fresh.append((subject, deadline, task))
+        by_table[table] = fresh
+    return {t: items for t, items in by_table.items() if items}, skipped
+
+
+def import_rows(rows: List[Row]) -> Tuple[Dict[str, int], int]:
+    homework._ensure_db()
+    with metrics.connect(homework.DB_PATH, "homework") as conn:
+        by_table, skipped = _plan(conn, rows)
+        if by_table:
+            homework._insert_homework_batch(conn, by_table)
+    return {t: len(items) for t, items in by_table.items()}, skipped
+
+
+async def resolve_groups(rows: List[Row]):
+    for group in sorted({r[0] for r in rows})[:IMPORT_MAX_GROUPS]:
+        try:
+            await group_registry.resolve(group)
+        except Exception as e:
+            log.info("homework import: group %s not resolved: %s", group, e)
+
+
+def _report(inserted: Dict[str, int], skipped: int, errors: List[Tuple[int, str]]) -> str:
+    total = sum(inserted.values())
+    lines = [f"✅ Импортировано заданий: {total}" + (f" (групп: {len(inserted)})" if inserted else "")]
+    for table, n in sorted(inserted.items()):
+        lines.append(f"• {table}: {n}")
+    if skipped:
+        lines.append(f"Пропущено дубликатов: {skipped}")
+    if errors:
+        lines.append(f"Строк с ошибками: {len(errors)}")
+        for n, reason in errors[:MAX_ERRORS_SHOWN]:
+            lines.append(f"  строка {n}: {reason}")
+        if len(errors) > MAX_ERRORS_SHOWN:
+            lines.append("  …")
+    return "\n".join(lines)
+
+
+async def _download(url: str) -> bytes:
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            if resp.content_length is not None and resp.content_length > IMPORT_MAX_BYTES:
+                raise ValueError("файл слишком большой")
+            buf = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                buf += chunk
+                if len(buf) > IMPORT_MAX_BYTES:
+                    raise ValueError("файл слишком большой")
+            return bytes(buf)
+
+
+async def start_upload(event):
+    key = homework._dialog_key(event)
+    st = homework._st(key)
+    group = st.get("group_name") if st.get("mode") == "IN_GROUP" else None
+    homework._reset(key)
+    st = homework._st(key)
+    st["mode"] = "ADD_IMPORT"
+    if group:
+        st["import_group"] = group
+    lines = [
+        "📥 Пришлите файл .json или .csv с заданиями.",
+        "Колонки: группа, предмет, дедлайн (YYYY-MM-DD или DD.MM.YYYY), задание.",
+    ]
+    if group:
+        lines.append(f"Если колонки «группа» нет, задания будут добавлены для {group}.")
+    await event.message.answer("\n".join(lines))
+
+
+async def handle_upload(event):
+    key = homework._dialog_key(event)
+    st = homework._st(key)
+    files = homework._incoming_files(event)
+    if not files:
+        await event.message.answer("Пришлите файл .json или .csv с заданиями.")
+        return
+    f = files[0]
+    if f.get("size") and f["size"] > IMPORT_MAX_BYTES:
+        await event.message.answer(f"Файл больше {IMPORT_MAX_BYTES // (1024 * 1024)} МБ, разбейте его на части.")
+        return
+
+    try:
+        data = await _download(f["url"])
+        records = parse(data, f["name"])
+    except Exception as e:
+        log.warning("homework import: cannot read %s: %s", f["name"], e)
+        await event.message.answer(f"Не удалось прочитать файл {f['name']}: {e}")
+        return
+    if len(records) > IMPORT_MAX_ROWS:
+        await event.message.answer(f"В файле больше {IMPORT_MAX_ROWS} строк, разбейте его на части.")
+        return
+
+    rows, errors = validate(records, st.get("import_group"))
+    await resolve_groups(rows)
+    t0 = time.perf_counter()
+    inserted, skipped = await asyncio.to_thread(import_rows, rows)
+    log.info("homework import: %d rows in %.3fs from %s", sum(inserted.values()), time.perf_counter() - t0, f["name"])
+
+    homework._reset(key)
+    await event.message.answer(_report(inserted, skipped, errors), attachments=[homework.homework_root_kb()])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Bulk import of homework from JSON or CSV into data/homework.db")
+    ap.add_argument("path", nargs="?", default=str(homework.BASE_DIR / "data" / "homework.json"))
+    ap.add_argument("--group", help="group for rows without a group column")
+    ap.add_argument("--db", help="homework database path")
+    ap.add_argument("--dry-run", action="store_true", help="validate only")
+    args = ap.parse_args(argv)
+
+    if args.db:
+        homework.DB_PATH = Path(args.db)
+    path = Path(args.path)
+    records = parse(path.read_bytes(), path.name)
+    rows, errors = validate(records, args.group)
+    for n, reason in errors:
+        print(f"row {n}: {reason}", file=sys.stderr)
+    if args.dry_run:
+        print(f"{len(rows)} valid rows, {len(errors)} errors")
+        return 1 if errors else 0
+
+    group_registry.load()
+    asyncio.run(resolve_groups(rows))
+    t0 = time.perf_counter()
+    inserted, skipped = import_rows(rows)
+    print(f"imported {sum(inserted.values())} rows into {len(inserted)} groups in {time.perf_counter() - t0:.3f}s, "
+          f"{skipped} duplicates skipped, {len(errors)} errors")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
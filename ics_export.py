@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+import semester
+import upload_cache
+
+log = logging.getLogger("ics_export")
+
+BASE_DIR = Path(__file__).resolve().parent
+ICS_DIR = BASE_DIR / "data" / "ics"
+ICS_TZ = os.getenv("ICS_TZ", "Europe/Moscow")
+ICS_TZ_OFFSET = os.getenv("ICS_TZ_OFFSET", "+0300")
+ICS_MAX_FILES = int(os.getenv("ICS_MAX_FILES", "2000"))
+ICS_GRACE_SEC = float(os.getenv("ICS_GRACE_SEC", str(24 * 3600)))
+
+_inflight: Dict[str, asyncio.Future] = {}
+_SAFE_RE = re.compile(r"[^\w.-]+")
+
+Row = Tuple[str, str, str, str, str, str, str]
+
+
+def _v(x) -> str:
+    return (x or "").strip() if isinstance(x, str) else ""
+
+
+def _rows(kind: str, records: List[dict]) -> List[Row]:
+    from groups_schedule import _teacher_names_from_record
+
+    rows = set()
+    for rec in records:
+        day = _v(rec.get("date"))
+        begin = _v(rec.get("beginLesson"))
+        end = _v(rec.get("endLesson"))
+        if not day or not begin:
+            continue
+        if kind == "group":
+            who = " / ".join(_teacher_names_from_record(rec))
+        else:
+            who = _v(rec.get("group"))
+        rows.add((
+            day, begin, end or begin,
+            _v(rec.get("discipline")),
+            _v(rec.get("kindOfWork")),
+            _v(rec.get("auditorium")),
+            who,
+        ))
+    return sorted(rows)
+
+
+def _escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _fold(line: str) -> str:
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    cur = b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(cur) + len(b) > (75 if not parts else 74):
+            parts.append(cur.decode("utf-8"))
+            cur = b""
+        cur += b
+    parts.append(cur.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _stamp(day: str, hhmm: str) -> str:
+    return day.replace("-", "") + "T" + hhmm.replace(":", "").ljust(4, "0")[:4] + "00"
+
+
+def _lines(kind: str, name: str, rows: List[Row]):
+    yield "BEGIN:VCALENDAR"
+    yield "VERSION:2.0"
+    yield "PRODID:-//FinMAX//timetable//RU"
+    yield "CALSCALE:GREGORIAN"
+    yield f"X-WR-CALNAME:{_escape(name)}"
+    yield f"X-WR-TIMEZONE:{ICS_TZ}"
+    yield "BEGIN:VTIMEZONE"
+    yield f"TZID:{ICS_TZ}"
+    yield "BEGIN:STANDARD"
+    yield "DTSTART:19700101T000000"
+    yield f"TZOFFSETFROM:{ICS_TZ_OFFSET}"
+    yield f"TZOFFSETTO:{ICS_TZ_OFFSET}"
+    yield "END:STANDARD"
+    yield "END:VTIMEZONE"
+
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    for day, begin, end, subj, work, aud, who in rows:
+        uid = hashlib.sha1(f"{kind}|{day}|{begin}|{subj}|{aud}".encode("utf-8")).hexdigest()
+        summary = subj or "Занятие"
+        if work:
+            summary = f"{summary} ({work})"
+        yield "BEGIN:VEVENT"
+        yield f"UID:{uid}@finmax"
+        yield f"DTSTAMP:{dtstamp}"
+        yield f"DTSTART;TZID={ICS_TZ}:{_stamp(day, begin)}"
+        yield f"DTEND;TZID={ICS_TZ}:{_stamp(day, end)}"
+        yield f"SUMMARY:{_escape(summary)}"
+        if aud:
+            yield f"LOCATION:{_escape(aud)}"
+        if who:
+            yield f"DESCRIPTION:{_escape(who)}"
+        yield "END:VEVENT"
+    yield "END:VCALENDAR"
+
+
+def _digest(kind: str, name: str, rows: List[Row]) -> str:
+    payload = json.dumps([kind, name, rows], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _prefix(kind: str, oid: str, start, end) -> str:
+    return f"{kind}-{_SAFE_RE.sub('_', str(oid))}-{start:%Y%m%d}-{end:%Y%m%d}-"
+
+
+def _write(path: Path, kind: str, name: str, rows: List[Row]) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    h = hashlib.sha256()
+    with open(tmp, "wb") as f:
+        for line in _lines(kind, name, rows):
+            chunk = _fold(line).encode("utf-8")
+            h.update(chunk)
+            f.write(chunk)
+    os.replace(tmp, path)
+    return h.hexdigest()
+
+
+def cleanup(now: Optional[float] = None) -> int:
+    if not ICS_DIR.exists():
+        return 0
+    now = time.time() if now is None else now
+    live = {snap["ics"][0] for snap in list(semester.SNAPSHOTS.values()) if snap.get("ics")}
+    files = []
+    for p in ICS_DIR.iterdir():
+        if p.suffix not in (".ics", ".tmp") or p in live:
+            continue
+        try:
+            files.append((p.stat().st_mtime, p))
+        except FileNotFoundError:
+            continue
+    files.sort()
+    extra = max(0, len(files) + len(live) - ICS_MAX_FILES)
+    removed = 0
+    for i, (mtime, p) in enumerate(files):
+        if mtime < now - ICS_GRACE_SEC or i < extra:
+            p.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+async def cleanup_loop():
+    from homework_archive import _seconds_until_off_peak
+
+    while True:
+        await asyncio.sleep(_seconds_until_off_peak(datetime.now()))
+        try:
+            removed = await asyncio.to_thread(cleanup)
+        except Exception as e:
+            log.warning("ics cleanup failed: %s", e)
+            continue
+        if removed:
+            log.warning("ics cleanup: removed %d stale files", removed)
+
+
+def _file_sha(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def build(kind: str, oid: str, name: str) -> Tuple[Path, str, Optional[str]]:
+    snap = await semester.snapshot(kind, oid, name)
+    cached = snap.get("ics")
+    if cached is not None and cached[0].exists():
+        metrics.cache_result("ics", True)
+        return cached[0], cached[1], snap["note"]
+
+    rows = _rows(kind, semester.records(snap))
+    prefix = _prefix(kind, oid, snap["start"], snap["end"])
+    path = ICS_DIR / f"{prefix}{_digest(kind, name, rows)[:16]}.ics"
+
+    hit = path.exists()
+    metrics.cache_result("ics", hit)
+    if hit:
+        sha = await asyncio.to_thread(_file_sha, path)
+    else:
+        key = str(path)
+        fut = _inflight.get(key)
+        if fut is not None:
+            sha = await asyncio.shield(fut)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            _inflight[key] = fut
+            try:
+                sha = await asyncio.to_thread(_write, path, kind, name, rows)
+                log.info("ics generated: %s (%d events)", path.name, len(rows))
+                fut.set_result(sha)
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()
+                raise
+            finally:
+                _inflight.pop(key, None)
+
+    snap["ics"] = (path, sha)
+    return path, sha, snap["note"]
+
+
+async def send(event, kind: str, oid: str, name: str):
+    import homework
+
+    try:
+        path, sha, note = await build(kind, oid, name)
+    except Exception as e:
+        await event.message.answer(f"Не удалось подготовить календарь: {e}")
+        return
+
+    text = f"📅 Расписание {name} на семестр. Откройте файл, чтобы добавить занятия в календарь телефона."
+    if note:
+        text = f"{text}\n\n{note}"
+    file_name = f"{_SAFE_RE.sub('_', name)}.ics"
+    sent = await upload_cache.send_path(event, homework.DB_PATH, path, sha, file_name, text)
+    if not sent and not path.exists():
+        try:
+            path, sha, note = await build(kind, oid, name)
+            sent = await upload_cache.send_path(event, homework.DB_PATH, path, sha, file_name, text)
+        except Exception as e:
+            log.warning("ics rebuild failed for %s %s: %s", kind, oid, e)
+    if not sent:
+        await event.message.answer("Не удалось отправить файл календаря, попробуйте позже.")
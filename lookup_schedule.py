@@ -0,0 +1,142 @@
+import logging
+from datetime import datetime, timedelta, date
+from typing import List, Optional, Tuple
+
+from maxapi.types import Command, MessageCreated
+
+import startup
+import timetable_cache
+from homework import _is_old_event, _is_from_bot
+
+log = logging.getLogger("lookup_schedule")
+
+MAX_RESULT_LINES = 40
+
+LOOKUP_COMMANDS = {
+    "find": ("discipline", "teacher", "auditorium"),
+    "subject": ("discipline",),
+    "lecturer": ("teacher",),
+    "room": ("auditorium",),
+}
+
+USAGE_TEXT = (
+    "Поиск по расписанию всех групп в кэше:\n"
+    "/find <слова> [период] — по предмету, преподавателю и аудитории\n"
+    "/subject <предмет> [период]\n"
+    "/lecturer <фамилия> [период]\n"
+    "/room <аудитория> [период]\n\n"
+    "Период: сегодня, завтра, неделя (по умолчанию) или дата YYYY-MM-DD / DD.MM.YYYY.\n"
+    "Пример: /find эконометрика иванов неделя"
+)
+
+
+def _parse_period(args: List[str]) -> Tuple[List[str], date, date]:
+    today = datetime.now().date()
+    monday = today - timedelta(days=today.weekday())
+    start, end = monday, monday + timedelta(days=6)
+
+    if not args:
+        return args, start, end
+
+    last = args[-1].strip().lower()
+    if last == "сегодня":
+        return args[:-1], today, today
+    if last == "завтра":
+        d = today + timedelta(days=1)
+        return args[:-1], d, d
+    if last == "неделя":
+        return args[:-1], start, end
+
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            d = datetime.strptime(last, fmt).date()
+            return args[:-1], d, d
+        except ValueError:
+            continue
+
+    return args, start, end
+
+
+def _fmt_lesson(lesson: dict) -> str:
+    from groups_schedule import _pair_no_by_begin, _num_emoji
+
+    begin, end = lesson["begin"], lesson["end"]
+    time_part = f"{begin}-{end}" if (begin and end) else (begin or end)
+    pno = _pair_no_by_begin(begin)
+    prefix = _num_emoji(pno) if pno else "▫️"
+
+    line = f"{prefix} {time_part} {lesson['discipline'] or 'Занятие'}"
+    details = [p for p in (
+        lesson["group_name"],
+        lesson["auditorium"],
+        " / ".join(lesson["teachers"]),
+    ) if p]
+    if details:
+        line += f" — {', '.join(details)}"
+    return line
+
+
+def _fmt_results(lessons: List[dict], start: date, end: date) -> str:
+    groups_total = timetable_cache.cached_groups_count()
+    if start == end:
+        period = start.strftime("%d.%m.%Y")
+    else:
+        period = f"{start.strftime('%d.%m.%Y')} — {end.strftime('%d.%m.%Y')}"
+
+    if not lessons:
+        return f"Ничего не найдено за {period} (в кэше групп: {groups_total})."
+
+    groups = {l["group_id"] for l in lessons}
+    lines = [
+        f"Найдено занятий: {len(lessons)}, групп: {len(groups)} за {period} (в кэше групп: {groups_total}).",
+    ]
+
+    shown = 0
+    cur_day: Optional[str] = None
+    for lesson in lessons:
+        if shown >= MAX_RESULT_LINES:
+            break
+        if lesson["date"] != cur_day:
+            cur_day = lesson["date"]
+            lines += ["", f"📅 {cur_day}"]
+        lines.append(_fmt_lesson(lesson))
+        shown += 1
+
+    if shown < len(lessons):
+        lines += ["", f"…и ещё {len(lessons) - shown}. Уточните запрос или период."]
+
+    return "\n".join(lines)
+
+
+async def _answer_lookup(event: MessageCreated, command: str, args: List[str]):
+    if _is_old_event(event) or _is_from_bot(event.message):
+        return
+    words, start, end = _parse_period(list(args or []))
+    query = " ".join(words).strip()
+    if not query:
+        await event.message.answer(USAGE_TEXT)
+        return
+
+    lessons = timetable_cache.find_lessons(query, LOOKUP_COMMANDS[command], start, end)
+    text = _fmt_results(lessons, start, end)
+    if not startup.ready("timetables"):
+        text += "\n\n⏳ Кэш расписаний ещё прогревается после запуска, результаты могут быть неполными."
+    await event.message.answer(text)
+
+
+def register_lookup_handlers(dp):
+    @dp.message_created(Command("find"))
+    async def _on_find(event: MessageCreated, args: list):
+        await _answer_lookup(event, "find", args)
+
+    @dp.message_created(Command("subject"))
+    async def _on_subject(event: MessageCreated, args: list):
+        await _answer_lookup(event, "subject", args)
+
+    @dp.message_created(Command("lecturer"))
+    async def _on_lecturer(event: MessageCreated, args: list):
+        await _answer_lookup(event, "lecturer", args)
+
+    @dp.message_created(Command("room"))
+    async def _on_room(event: MessageCreated, args: list):
+        await _answer_lookup(event, "room", args)
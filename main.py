@@ -1,11 +1,10 @@
 import asyncio
 import logging
 import os
-import time
-from datetime import datetime
 from typing import Literal
+import startup
 from pydantic import BaseModel
-from maxapi import Bot, Dispatcher, F
+from maxapi import Dispatcher, F
 from maxapi.types import BotStarted, Command, MessageCreated, MessageCallback
 
 from schedule import open_schedule_menu
@@ -13,6 +12,7 @@ from groups_schedule import (
     open_groups_menu,
     try_handle_group_message,
     reset_groups_flow_for,
+    prefetch_loop,
 )
 from teachers_schedule import (
     open_teachers_menu,
@@ -27,7 +27,28 @@ from homework import (
     _start_add_flow,
     homework_is_adding,       
     handle_add_message,       
+    homework_is_searching,
+    handle_search_message,
+    _is_old_event,
 )
+from lookup_schedule import register_lookup_handlers
+from profiling import register_profiling_handlers
+from semester import register_semester_handlers
+import reminders
+import notifications
+import metrics
+import tracing
+import profiling
+import upstream
+import catchup
+import dedup
+import actors
+import timetable_cache
+import groups_schedule
+import teachers_schedule
+import homework
+import homework_archive
+import ics_export
 
 
 STATE = {}
@@ -48,47 +69,6 @@ WELCOME_TEXT = (
     "Выбери одну из опций ниже:"
 )
 
-BOOT_TS = time.time()
-OLD_EVENT_SLOP = 1.5
-
-def _to_epoch_seconds(value):
-    if value is None:
-        return None
-    if isinstance(value, (int, float)):
-        return value / 1000.0 if value > 10**12 else float(value)
-    if isinstance(value, str):
-        try:
-            s = value.rstrip("Z")
-            return datetime.fromisoformat(s).timestamp()
-        except Exception:
-            return None
-    if isinstance(value, datetime):
-        return value.timestamp()
-    return None
-
-def _extract_event_ts(event):
-    for key in ("timestamp", "created_at", "date", "ts", "created_ts", "sent_at", "time", "created"):
-        ts = _to_epoch_seconds(getattr(event, key, None))
-        if ts is not None:
-            return ts
-    msg = getattr(event, "message", None)
-    if msg:
-        for key in ("timestamp", "created_at", "date", "ts", "created_ts", "sent_at", "time", "created"):
-            ts = _to_epoch_seconds(getattr(msg, key, None))
-            if ts is not None:
-                return ts
-        body = getattr(msg, "body", None)
-        if body:
-            for key in ("timestamp", "created_at", "date", "ts", "created_ts", "sent_at", "time", "created"):
-                ts = _to_epoch_seconds(getattr(body, key, None))
-                if ts is not None:
-                    return ts
-    return None
-
-def _is_old_event(event):
-    ts = _extract_event_ts(event)
-    return ts is not None and ts < (BOOT_TS - OLD_EVENT_SLOP)
-
 def _is_from_bot(message):
     author = getattr(message, "author", None) or getattr(message, "from_", None) or getattr(message, "sender", None)
     for attr in ("is_bot", "bot", "isBot"):
@@ -108,7 +88,9 @@ if not TOKEN:
     with open("token.txt", "r", encoding="utf-8") as f:
         TOKEN = f.readline().strip()
 
-bot = Bot(TOKEN)
+bot = metrics.MeteredBot(TOKEN)
+if os.getenv("MAX_API_URL"):
+    bot.set_api_url(os.getenv("MAX_API_URL"))
 dp = Dispatcher()
 
 class InlineKeyboardAttachment(BaseModel):
@@ -145,6 +127,10 @@ async def on_start(event: MessageCreated):
         return
     await event.message.answer(**main_menu_kwargs(WELCOME_TEXT))
 
+register_lookup_handlers(dp)
+register_profiling_handlers(dp)
+register_semester_handlers(dp)
+
 @dp.message_created(F.message.body.text == "Расписание")
 async def on_schedule_menu(event: MessageCreated):
     if _is_old_event(event) or _is_from_bot(event.message):
@@ -213,6 +199,10 @@ async def multiplex(event: MessageCreated):
         await open_teachers_menu(event)
         return
 
+    if text and homework_is_searching(event):
+        await handle_search_message(event)
+        return
+
     if await try_handle_group_message(event):
         return
 
@@ -248,6 +238,24 @@ async def main():
     except Exception:
         log.warning("Не удалось удалить webhook, продолжаю...")
 
+    try:
+        await metrics.start_server()
+    except OSError as e:
+        log.warning("Не удалось запустить /metrics: %s", e)
+
+    profiling.start()
+    await startup.warm_up()
+
+    asyncio.create_task(prefetch_loop())
+    asyncio.create_task(reminders.run_scheduler(bot))
+    asyncio.create_task(reminders.plan_loop())
+    asyncio.create_task(notifications.run_fanout(bot))
+    asyncio.create_task(notifications.refresh_loop())
+    asyncio.create_task(profiling.dump_loop())
+    asyncio.create_task(dedup.flush_loop())
+    asyncio.create_task(homework_archive.archive_loop())
+    asyncio.create_task(ics_export.cleanup_loop())
+
     log.warning("✅ Бот запущен в MAX (polling)…")
     await dp.start_polling(bot)
 
@@ -286,12 +294,32 @@ async def multiplex(event: MessageCreated):
         await open_teachers_menu(event)
         return
 
+    if text and homework_is_searching(event):
+        await handle_search_message(event)
+        return
+
     if await try_handle_group_message(event):
         return
 
     if await try_handle_teacher_message(event):
         return
 
+metrics.instrument_dispatcher(dp)
+tracing.instrument_dispatcher(dp)
+profiling.instrument_dispatcher(dp)
+upstream.instrument_dispatcher(dp)
+actors.install(dp)
+catchup.install(dp)
+dedup.install(dp)
+metrics.watch_size("main", STATE)
+metrics.watch_size("groups_schedule", groups_schedule.STATE)
+metrics.watch_size("teachers_schedule", teachers_schedule.STATE)
+metrics.watch_size("homework", homework.STATE)
+metrics.watch_size("timetable_cache.lessons", timetable_cache.LESSONS)
+metrics.watch_size("timetable_cache.days", timetable_cache.DAYS)
+metrics.watch_size("reminders.queue", reminders._items)
+startup.mark_imports()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,292 @@
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from maxapi import Bot
+from maxapi.filters.middleware import BaseMiddleware
+from maxapi.types.errors import Error
+
+import tracing
+
+log = logging.getLogger("metrics")
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQLITE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+REGISTRY: List["_Metric"] = []
+_lock = threading.Lock()
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, v in sorted(self.values.items()):
+            out.append(f"{self.name}{_labels(self.label_names, key)} {v:g}")
+        return out
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self.callbacks: Dict[Tuple, Callable[[], float]] = {}
+
+    def watch(self, fn: Callable[[], float], **labels):
+        self.callbacks[self._key(labels)] = fn
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, fn in sorted(self.callbacks.items()):
+            try:
+                v = fn()
+            except Exception:
+                continue
+            out.append(f"{self.name}{_labels(self.label_names, key)} {v:g}")
+        return out
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for key, row in sorted(self.values.items()):
+            acc = 0.0
+            for i, b in enumerate(self.buckets):
+                acc += row[i]
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {acc:g}")
+            acc += row[len(self.buckets)]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {acc:g}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {row[-1]:.6f}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {acc:g}")
+        return out
+
+
+EVENTS = Counter("finmax_events_total", "Incoming MAX updates", ("type",))
+HANDLER_LATENCY = Histogram("finmax_handler_seconds", "Handler latency", ("handler",))
+HANDLER_ERRORS = Counter("finmax_handler_errors_total", "Handlers that raised", ("handler",))
+UPSTREAM_LATENCY = Histogram("finmax_upstream_seconds", "ruz.fa.ru call latency", ("method",))
+UPSTREAM_ERRORS = Counter("finmax_upstream_errors_total", "ruz.fa.ru call errors", ("method",))
+SQLITE_LATENCY = Histogram("finmax_sqlite_seconds", "SQLite statement latency", ("db", "op"), SQLITE_BUCKETS)
+OUTBOUND = Counter("finmax_outbound_total", "Outbound MAX API sends", ("method", "result"))
+CACHE = Counter("finmax_cache_requests_total", "Cache lookups", ("cache", "result"))
+STATE_SIZE = Gauge("finmax_state_entries", "Entries in in-memory state dicts", ("name",))
+STARTUP_SECONDS = Gauge("finmax_startup_seconds", "Duration of startup stages", ("stage",))
+DUPLICATES = Counter("finmax_duplicate_updates_total", "Updates dropped as already processed", ("type",))
+CATCHUP = Counter("finmax_catchup_events_total", "Backlog events received after a restart", ("result",))
+BREAKER_STATE = Gauge("finmax_breaker_state", "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)", ("upstream",))
+BREAKER_REJECTED = Counter("finmax_breaker_rejected_total", "Upstream calls rejected by an open breaker", ("method",))
+UPSTREAM_RETRIES = Counter("finmax_upstream_retries_total", "Upstream calls retried within the request budget", ("method",))
+UPSTREAM_HEDGES = Counter("finmax_upstream_hedges_total", "Hedged second upstream requests", ("method",))
+HOMEWORK_ARCHIVED = Counter("finmax_homework_archived_total", "Homework rows moved to the archive DB")
+STALE_SERVED = Counter("finmax_stale_served_total", "Timetables served from cache while upstream failed", ("kind",))
+
+
+class track:
+    def __init__(self, hist: Histogram, errors: Optional[Counter] = None, **labels):
+        self.hist = hist
+        self.errors = errors
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(**self.labels)
+        return False
+
+
+def timed(name: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with track(HANDLER_LATENCY, HANDLER_ERRORS, handler=name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def cache_result(cache: str, hit: bool):
+    CACHE.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def watch_size(name: str, obj):
+    STATE_SIZE.watch(lambda: len(obj), name=name)
+
+
+class _EventCounter(BaseMiddleware):
+    async def __call__(self, handler, event_object, data):
+        EVENTS.inc(type=getattr(getattr(event_object, "update_type", None), "value", "unknown"))
+        with track(HANDLER_LATENCY, HANDLER_ERRORS, handler="dispatch"):
+            return await handler(event_object, data)
+
+
+class _HandlerTimer(BaseMiddleware):
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, handler, event_object, data):
+        with track(HANDLER_LATENCY, HANDLER_ERRORS, handler=self.name):
+            return await handler(event_object, data)
+
+
+def instrument_dispatcher(dp):
+    dp.outer_middleware(_EventCounter())
+    for h in dp.event_handlers:
+        h.middlewares.insert(0, _HandlerTimer(h.func_event.__name__))
+
+
+class MeteredBot(Bot):
+    async def send_message(self, *args, **kwargs):
+        try:
+            with tracing.span("send_message"):
+                res = await super().send_message(*args, **kwargs)
+        except Exception:
+            OUTBOUND.inc(method="send_message", result="exception")
+            raise
+        OUTBOUND.inc(method="send_message", result="error" if isinstance(res, Error) else "ok")
+        return res
+
+    async def send_callback(self, *args, **kwargs):
+        try:
+            with tracing.span("send_callback"):
+                res = await super().send_callback(*args, **kwargs)
+        except Exception:
+            OUTBOUND.inc(method="send_callback", result="exception")
+            raise
+        OUTBOUND.inc(method="send_callback", result="error" if isinstance(res, Error) else "ok")
+        return res
+
+
+def _sql_op(sql: str) -> str:
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head else ""
+
+
+_factories: Dict[str, type] = {}
+
+
+def _connection_class(db: str) -> type:
+    cls = _factories.get(db)
+    if cls is not None:
+        return cls
+
+    class _TimedConnection(sqlite3.Connection):
+        def execute(self, sql, *args):
+            op = _sql_op(sql)
+            with track(SQLITE_LATENCY, db=db, op=op), tracing.span("sqlite", db=db, op=op):
+                return super().execute(sql, *args)
+
+        def executemany(self, sql, *args):
+            op = _sql_op(sql)
+            with track(SQLITE_LATENCY, db=db, op=op), tracing.span("sqlite", db=db, op=op, many=True):
+                return super().executemany(sql, *args)
+
+        def executescript(self, sql):
+            with track(SQLITE_LATENCY, db=db, op="SCRIPT"), tracing.span("sqlite", db=db, op="SCRIPT"):
+                return super().executescript(sql)
+
+        def commit(self):
+            with track(SQLITE_LATENCY, db=db, op="COMMIT"), tracing.span("sqlite", db=db, op="COMMIT"):
+                return super().commit()
+
+    _factories[db] = _TimedConnection
+    return _TimedConnection
+
+
+def connect(path, db: str, **kwargs) -> sqlite3.Connection:
+    return sqlite3.connect(path, factory=_connection_class(db), **kwargs)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines += m.render()
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8", headers={"X-Prometheus-Format": "0.0.4"})
+
+
+async def start_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    if port <= 0:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.warning("metrics on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+import timetable_cache
+from sender import SENDER
+
+log = logging.getLogger("notifications")
+
+BASE_DIR = Path(__file__).resolve().parent
+SUBSCRIPTIONS_DB_PATH = BASE_DIR / "data" / "subscriptions.db"
+
+REFRESH_INTERVAL = float(os.getenv("CHANGES_REFRESH_INTERVAL_SEC", "600"))
+REFRESH_DAYS = 7
+REFRESH_CONCURRENCY = 4
+MAX_CHANGES_PER_MESSAGE = 20
+
+_pending: List[dict] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+def _connect() -> sqlite3.Connection:
+    SUBSCRIPTIONS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = metrics.connect(SUBSCRIPTIONS_DB_PATH, "subscriptions")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_subscriptions (
+            kind TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            entity_name TEXT NOT NULL,
+            chat_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, entity_id, chat_id)
+        )
+        """
+    )
+    return conn
+
+
+def _chat_id(event) -> Optional[int]:
+    msg = getattr(event, "message", None)
+    recipient = getattr(msg, "recipient", None)
+    return getattr(recipient, "chat_id", None) or getattr(event, "chat_id", None)
+
+
+def _toggle(kind: str, entity_id: str, entity_name: str, chat_id: int) -> bool:
+    with _connect() as conn:
+        cur = conn.execute(
+            "DELETE FROM change_subscriptions WHERE kind=? AND entity_id=? AND chat_id=?",
+            (kind, entity_id, chat_id),
+        )
+        if cur.rowcount:
+            return False
+        conn.execute(
+            "INSERT INTO change_subscriptions(kind, entity_id, entity_name, chat_id) VALUES (?,?,?,?)",
+            (kind, entity_id, entity_name, chat_id),
+        )
+        return True
+
+
+async def toggle_subscription(event, kind: str, entity_id: str, entity_name: str) -> Optional[bool]:
+    chat_id = _chat_id(event)
+    if chat_id is None:
+        return None
+    return await asyncio.to_thread(_toggle, kind, str(entity_id), entity_name, chat_id)
+
+
+def _subscribed_entities() -> List[Tuple[str, str, str]]:
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT DISTINCT kind, entity_id, entity_name FROM change_subscriptions"
+        ).fetchall()
+
+
+def subscriber_counts(kind: str) -> List[Tuple[str, str, int]]:
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT entity_id, MAX(entity_name), COUNT(*) FROM change_subscriptions WHERE kind=? GROUP BY entity_id",
+            (kind,),
+        ).fetchall()
+
+
+def _subscribers(kind: str, entity_ids: List[str]) -> Dict[str, List[int]]:
+    out: Dict[str, List[int]] = {}
+    if not entity_ids:
+        return out
+    with _connect() as conn:
+        for eid in entity_ids:
+            rows = conn.execute(
+                "SELECT chat_id FROM change_subscriptions WHERE kind=? AND entity_id=?",
+                (kind, eid),
+            ).fetchall()
+            if rows:
+                out[eid] = [r[0] for r in rows]
+    return out
+
+
+def _on_changes(changes: List[dict]):
+    if _wakeup is None:
+        return
+    _pending.extend(changes)
+    _wakeup.set()
+
+
+timetable_cache.CHANGE_LISTENERS.append(_on_changes)
+
+
+def _fmt_change(ch: dict, with_group: bool) -> str:
+    d = ch["date"]
+    try:
+        d = datetime.strptime(d, "%Y-%m-%d").strftime("%d.%m")
+    except ValueError:
+        pass
+    subj = ch["discipline"] or "Занятие"
+    if with_group:
+        subj = f"{subj} ({ch['group_name']})"
+    old, new = ch["old"], ch["new"]
+
+    if ch["kind"] == "moved":
+        return f"• {d} {subj}: перенесено {old['begin']}-{old['end']} → {new['begin']}-{new['end']}"
+    if ch["kind"] == "room":
+        return f"• {d} {new['begin']} {subj}: аудитория {old['auditorium'] or '—'} → {new['auditorium'] or '—'}"
+    if ch["kind"] == "teacher":
+        return f"• {d} {new['begin']} {subj}: преподаватель {' / '.join(new['teachers']) or '—'}"
+    if ch["kind"] == "cancelled":
+        return f"• {d} {old['begin']} {subj}: отменено"
+    return f"• {d} {new['begin']}-{new['end']} {subj}: добавлено" + (f", {new['auditorium']}" if new["auditorium"] else "")
+
+
+def _fmt_message(title: str, changes: List[dict], with_group: bool) -> str:
+    changes = sorted(changes, key=lambda c: (c["date"], (c["new"] or c["old"])["begin"]))
+    lines = [f"📣 Изменения в расписании {title}:"]
+    lines += [_fmt_change(c, with_group) for c in changes[:MAX_CHANGES_PER_MESSAGE]]
+    if len(changes) > MAX_CHANGES_PER_MESSAGE:
+        lines.append(f"…и ещё {len(changes) - MAX_CHANGES_PER_MESSAGE}.")
+    return "\n".join(lines)
+
+
+async def _fan_out(bot, changes: List[dict]):
+    by_group: Dict[str, List[dict]] = {}
+    by_teacher: Dict[str, List[dict]] = {}
+    for ch in changes:
+        by_group.setdefault(ch["group_id"], []).append(ch)
+        for oid in ch["teacher_oids"]:
+            by_teacher.setdefault(oid, []).append(ch)
+
+    group_subs = await asyncio.to_thread(_subscribers, "group", list(by_group))
+    teacher_subs = await asyncio.to_thread(_subscribers, "teacher", list(by_teacher))
+
+    messages: List[Tuple[int, str]] = []
+    for gid, chats in group_subs.items():
+        text = _fmt_message(by_group[gid][0]["group_name"], by_group[gid], with_group=False)
+        messages += [(chat_id, text) for chat_id in chats]
+    for oid, chats in teacher_subs.items():
+        teacher_name = next(
+            (t for ch in by_teacher[oid] for l in (ch["new"], ch["old"]) if l for t in l["teachers"]),
+            "преподавателя",
+        )
+        text = _fmt_message(teacher_name, by_teacher[oid], with_group=True)
+        messages += [(chat_id, text) for chat_id in chats]
+
+    if messages:
+        log.info("Рассылка изменений: %s сообщений", len(messages))
+        await SENDER.send_many(bot, messages)
+
+
+async def run_fanout(bot):
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        await _wakeup.wait()
+        _wakeup.clear()
+        batch = _pending[:]
+        _pending.clear()
+        try:
+            await _fan_out(bot, batch)
+        except Exception as e:
+            log.warning("fan-out failed: %s", e)
+
+
+async def refresh_subscribed():
+    from groups_schedule import _timetable_group
+    from teachers_schedule import _fetch_teacher_upstream
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    end = today + timedelta(days=REFRESH_DAYS - 1)
+    days = [(today + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(REFRESH_DAYS)]
+
+    entities = await asyncio.to_thread(_subscribed_entities)
+    groups: Dict[str, str] = {}
+    sem = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+    async def _roster(tid: str, name: str):
+        known = [timetable_cache.TEACHER_DAYS.get((tid, d)) for d in days]
+        if any(r is None for r in known):
+            async with sem:
+                try:
+                    await _fetch_teacher_upstream(tid, today, end)
+                except Exception as e:
+                    log.debug("teacher roster refresh failed for %s: %s", name, e)
+                    return
+            known = [timetable_cache.TEACHER_DAYS.get((tid, d)) for d in days]
+        for r in known:
+            if r is not None:
+                for gid in r["groups"]:
+                    groups.setdefault(gid, timetable_cache.GROUPS.get(gid) or r["names"].get(gid, ""))
+
+    await asyncio.gather(*(_roster(eid, name) for kind, eid, name in entities if kind == "teacher"))
+    for kind, eid, name in entities:
+        if kind == "group":
+            groups[eid] = name
+
+    async def _one(gid: str, name: str):
+        async with sem:
+            try:
+                await _timetable_group(gid, today, end, group_name=name)
+            except Exception as e:
+                log.debug("change refresh failed for %s: %s", name, e)
+
+    await asyncio.gather(*(_one(gid, name) for gid, name in groups.items()))
+
+
+async def refresh_loop():
+    while True:
+        try:
+            await refresh_subscribed()
+        except Exception as e:
+            log.warning("change refresh loop error: %s", e)
+        await asyncio.sleep(REFRESH_INTERVAL)
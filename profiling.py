@@ -0,0 +1,299 @@
+import asyncio
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from maxapi.filters.middleware import BaseMiddleware
+from maxapi.types import Command, MessageCreated
+
+log = logging.getLogger("profiling")
+
+BASE_DIR = Path(__file__).resolve().parent
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "data" / "profiles")))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "off").strip().lower()
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_DUMP_SEC = float(os.getenv("PROFILE_DUMP_SEC", "300"))
+PROFILE_ADMIN_IDS = {int(x) for x in os.getenv("PROFILE_ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+MODES = ("sample", "cprofile")
+MAX_DEPTH = 64
+
+STATE: Dict[str, object] = {"mode": "off", "slow_ms": 0.0, "since": 0.0, "events": 0, "slow_events": 0}
+_stacks: Counter = Counter()
+_pending: Dict[asyncio.Task, List[str]] = {}
+_lock = threading.Lock()
+_sampler: Optional["_Sampler"] = None
+_profile: Optional[cProfile.Profile] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[int] = None
+
+_IDLE = {"select", "poll", "epoll", "kqueue", "_run_once"}
+
+
+def _label(code) -> str:
+    return f"{Path(code.co_filename).stem}:{code.co_name}"
+
+
+def _collapse(frame) -> Optional[str]:
+    if frame.f_code.co_name in _IDLE:
+        return None
+    parts = []
+    while frame is not None and len(parts) < MAX_DEPTH:
+        code = frame.f_code
+        if code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            break
+        parts.append(_label(code))
+        frame = frame.f_back
+    if not parts:
+        return None
+    parts.reverse()
+    return ";".join(parts)
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, loop: asyncio.AbstractEventLoop, interval: float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.loop = loop
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = _collapse(frame)
+            del frame
+            if stack is None:
+                continue
+            try:
+                task = asyncio.current_task(self.loop)
+            except RuntimeError:
+                task = None
+            with _lock:
+                buf = _pending.get(task) if task is not None else None
+                if buf is not None:
+                    buf.append(stack)
+                elif STATE["slow_ms"] <= 0:
+                    _stacks[stack] += 1
+
+
+def _start_collector(mode: str):
+    global _sampler, _profile
+    if mode == "sample":
+        if _loop is None or _loop_thread is None:
+            raise RuntimeError("profiling.start() was not called")
+        _sampler = _Sampler(_loop_thread, _loop, PROFILE_INTERVAL_MS / 1000.0)
+        _sampler.start()
+    elif mode == "cprofile":
+        _profile = cProfile.Profile()
+        _profile.enable()
+
+
+def _stop_collector():
+    global _sampler, _profile
+    if _sampler is not None:
+        _sampler.stopped.set()
+        _sampler.join(timeout=1.0)
+        _sampler = None
+    if _profile is not None:
+        _profile.disable()
+
+
+def enable(mode: str = "sample", slow_ms: Optional[float] = None):
+    if mode not in MODES:
+        raise ValueError(f"unknown profiling mode: {mode}")
+    if STATE["mode"] != "off":
+        disable()
+    STATE["slow_ms"] = float(slow_ms if slow_ms is not None else PROFILE_SLOW_MS)
+    STATE["since"] = time.time()
+    STATE["events"] = 0
+    STATE["slow_events"] = 0
+    _start_collector(mode)
+    STATE["mode"] = mode
+    log.warning("profiling enabled: mode=%s slow_ms=%g", mode, STATE["slow_ms"])
+
+
+def disable() -> Optional[Path]:
+    global _profile
+    if STATE["mode"] == "off":
+        return None
+    _stop_collector()
+    path = dump(restart=False)
+    STATE["mode"] = "off"
+    _profile = None
+    with _lock:
+        _pending.clear()
+    log.warning("profiling disabled")
+    return path
+
+
+def _target(suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR / f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{suffix}"
+
+
+def dump(restart: bool = True) -> Optional[Path]:
+    global _profile
+    mode = STATE["mode"]
+    if mode == "sample":
+        with _lock:
+            stacks = dict(_stacks)
+            _stacks.clear()
+        if not stacks:
+            return None
+        path = _target("collapsed")
+        lines = [f"{s} {n}" for s, n in sorted(stacks.items(), key=lambda kv: -kv[1])]
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+    if mode == "cprofile" and _profile is not None:
+        prof = _profile
+        prof.disable()
+        path = _target("pstats")
+        prof.dump_stats(str(path))
+        _profile = None
+        if restart:
+            _profile = cProfile.Profile()
+            _profile.enable()
+        return path
+    return None
+
+
+def status() -> dict:
+    with _lock:
+        samples = sum(_stacks.values())
+    return {
+        "mode": STATE["mode"],
+        "slow_ms": STATE["slow_ms"],
+        "since": STATE["since"],
+        "events": STATE["events"],
+        "slow_events": STATE["slow_events"],
+        "samples": samples,
+    }
+
+
+class _EventProfiler(BaseMiddleware):
+    async def __call__(self, handler, event_object, data):
+        if STATE["mode"] == "off":
+            return await handler(event_object, data)
+        STATE["events"] += 1
+        slow_ms = STATE["slow_ms"]
+        if STATE["mode"] != "sample" or slow_ms <= 0:
+            return await handler(event_object, data)
+
+        task = asyncio.current_task()
+        with _lock:
+            if task in _pending:
+                task = None
+            else:
+                _pending[task] = []
+        t0 = time.perf_counter()
+        try:
+            return await handler(event_object, data)
+        finally:
+            if task is not None:
+                ms = (time.perf_counter() - t0) * 1000
+                with _lock:
+                    samples = _pending.pop(task, [])
+                    if ms >= slow_ms:
+                        STATE["slow_events"] += 1
+                        kind = getattr(getattr(event_object, "update_type", None), "value", "unknown")
+                        for s in samples:
+                            _stacks[f"{kind};{s}"] += 1
+
+
+def instrument_dispatcher(dp):
+    dp.outer_middleware(_EventProfiler())
+
+
+def start(loop: Optional[asyncio.AbstractEventLoop] = None):
+    global _loop, _loop_thread
+    _loop = loop or asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+    if PROFILE_MODE in MODES:
+        enable(PROFILE_MODE)
+
+
+async def dump_loop():
+    while True:
+        await asyncio.sleep(PROFILE_DUMP_SEC)
+        if STATE["mode"] == "off":
+            continue
+        try:
+            path = dump()
+        except OSError as e:
+            log.warning("profile dump failed: %s", e)
+            continue
+        if path is not None:
+            log.warning("profile saved to %s", path)
+
+
+PROFILE_USAGE = (
+    "/profile status\n"
+    "/profile on [sample|cprofile] [порог_мс]\n"
+    "/profile dump\n"
+    "/profile off"
+)
+
+
+def _is_admin(event: MessageCreated) -> bool:
+    sender = getattr(event.message, "sender", None)
+    return getattr(sender, "user_id", None) in PROFILE_ADMIN_IDS
+
+
+def _status_text() -> str:
+    st = status()
+    if st["mode"] == "off":
+        return "Профилирование выключено."
+    since = datetime.fromtimestamp(st["since"]).strftime("%d.%m %H:%M:%S")
+    return (
+        f"Профилирование: {st['mode']}, порог {st['slow_ms']:g} мс, с {since}\n"
+        f"Событий: {st['events']}, медленных: {st['slow_events']}, сэмплов в буфере: {st['samples']}"
+    )
+
+
+def register_profiling_handlers(dp):
+    @dp.message_created(Command("profile"))
+    async def _on_profile(event: MessageCreated, args: list):
+        from homework import _is_old_event, _is_from_bot
+
+        if _is_old_event(event) or _is_from_bot(event.message):
+            return
+        if not _is_admin(event):
+            await event.message.answer(text="Команда доступна только администраторам.")
+            return
+
+        cmd = (args[0].lower() if args else "status")
+        if cmd == "on":
+            mode = "sample"
+            slow_ms = None
+            for a in args[1:]:
+                if a.lower() in MODES:
+                    mode = a.lower()
+                else:
+                    try:
+                        slow_ms = float(a)
+                    except ValueError:
+                        await event.message.answer(text=PROFILE_USAGE)
+                        return
+            enable(mode, slow_ms)
+            await event.message.answer(text=_status_text())
+        elif cmd == "off":
+            path = disable()
+            await event.message.answer(text=f"Профилирование выключено. Профиль: {path.name if path else 'пусто'}")
+        elif cmd == "dump":
+            path = dump()
+            await event.message.answer(text=f"Профиль: {path.name}" if path else "Пока нечего сохранять.")
+        elif cmd == "status":
+            await event.message.answer(text=_status_text())
+        else:
+            await event.message.answer(text=PROFILE_USAGE)
@@ -0,0 +1,396 @@
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, date
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import metrics
+from sender import SENDER
+
+log = logging.getLogger("reminders")
+
+BASE_DIR = Path(__file__).resolve().parent
+REMINDERS_DB_PATH = BASE_DIR / "data" / "reminders.db"
+
+DEFAULT_LEAD_MIN = int(os.getenv("REMINDER_LEAD_MIN", "15"))
+HW_REMIND_HOUR = int(os.getenv("REMINDER_HW_HOUR", "18"))
+PLAN_DAYS = 2
+PLAN_INTERVAL = float(os.getenv("REMINDER_PLAN_INTERVAL_SEC", "1800"))
+PLAN_CONCURRENCY = 4
+CATCHUP_WINDOW = float(os.getenv("REMINDER_CATCHUP_SEC", "1800"))
+DISPATCH_BATCH = 500
+MAX_SLEEP = 60.0
+
+_heap: List[Tuple[float, int]] = []
+_items: Dict[int, dict] = {}
+_keys: Dict[str, int] = {}
+_scopes: Dict[str, Set[int]] = {}
+_next_id = {"v": 1}
+_wakeup: Optional[asyncio.Event] = None
+_loaded: Optional[asyncio.Future] = None
+
+
+def _connect() -> sqlite3.Connection:
+    REMINDERS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = metrics.connect(REMINDERS_DB_PATH, "reminders")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reminder_queue (
+            id INTEGER PRIMARY KEY,
+            due_ts REAL NOT NULL,
+            chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            key TEXT NOT NULL UNIQUE,
+            scope TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS reminder_subscriptions (
+            chat_id INTEGER NOT NULL,
+            group_id TEXT NOT NULL,
+            group_name TEXT NOT NULL,
+            lead_min INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, group_id)
+        )
+        """
+    )
+    return conn
+
+
+def _chat_id(event) -> Optional[int]:
+    msg = getattr(event, "message", None)
+    recipient = getattr(msg, "recipient", None)
+    return getattr(recipient, "chat_id", None) or getattr(event, "chat_id", None)
+
+
+def _push(item: dict):
+    rid = item["id"]
+    _items[rid] = item
+    _keys[item["key"]] = rid
+    _scopes.setdefault(item["scope"], set()).add(rid)
+    heapq.heappush(_heap, (item["due"], rid))
+
+
+def _forget(rid: int) -> Optional[dict]:
+    item = _items.pop(rid, None)
+    if item is None:
+        return None
+    _keys.pop(item["key"], None)
+    ids = _scopes.get(item["scope"])
+    if ids is not None:
+        ids.discard(rid)
+        if not ids:
+            del _scopes[item["scope"]]
+    return item
+
+
+def pending_count() -> int:
+    return len(_items)
+
+
+def _db_insert(rows: List[tuple]):
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO reminder_queue(id, due_ts, chat_id, text, key, scope) VALUES (?,?,?,?,?,?)",
+            rows,
+        )
+
+
+def _db_delete(ids: List[int]):
+    if not ids:
+        return
+    with _connect() as conn:
+        conn.executemany("DELETE FROM reminder_queue WHERE id=?", [(i,) for i in ids])
+
+
+async def schedule_many(items: List[dict]):
+    await load_queue()
+    rows = []
+    head = _heap[0][0] if _heap else None
+    earliest = None
+    for it in items:
+        if it["key"] in _keys:
+            continue
+        rid = _next_id["v"]
+        _next_id["v"] += 1
+        item = {"id": rid, **it}
+        _push(item)
+        rows.append((rid, item["due"], item["chat_id"], item["text"], item["key"], item["scope"]))
+        if earliest is None or item["due"] < earliest:
+            earliest = item["due"]
+
+    if rows:
+        await asyncio.to_thread(_db_insert, rows)
+    if earliest is not None and (head is None or earliest < head) and _wakeup is not None:
+        _wakeup.set()
+
+
+async def cancel_scope_except(scope: str, keep_keys: Set[str]):
+    await load_queue()
+    drop = [rid for rid in list(_scopes.get(scope, ())) if _items[rid]["key"] not in keep_keys]
+    for rid in drop:
+        _forget(rid)
+    if drop:
+        await asyncio.to_thread(_db_delete, drop)
+
+
+def _load_queue() -> int:
+    with _connect() as conn:
+        rows = conn.execute("SELECT id, due_ts, chat_id, text, key, scope FROM reminder_queue").fetchall()
+    for rid, due, chat_id, text, key, scope in rows:
+        if rid in _items or key in _keys:
+            continue
+        _push({"id": rid, "due": due, "chat_id": chat_id, "text": text, "key": key, "scope": scope})
+        _next_id["v"] = max(_next_id["v"], rid + 1)
+    return len(rows)
+
+
+async def load_queue() -> int:
+    global _loaded
+    if _loaded is None:
+        _loaded = asyncio.ensure_future(asyncio.to_thread(_load_queue))
+    try:
+        return await asyncio.shield(_loaded)
+    except Exception:
+        _loaded = None
+        raise
+
+
+def _pop_due(now: float) -> Tuple[List[dict], List[int]]:
+    batch, stale = [], []
+    while _heap and _heap[0][0] <= now and len(batch) < DISPATCH_BATCH:
+        _, rid = heapq.heappop(_heap)
+        item = _forget(rid)
+        if item is None:
+            continue
+        if now - item["due"] > CATCHUP_WINDOW:
+            stale.append(rid)
+        else:
+            batch.append(item)
+    return batch, stale
+
+
+async def _dispatch(bot, batch: List[dict]):
+    await SENDER.send_many(bot, ((it["chat_id"], it["text"]) for it in batch))
+
+
+async def run_scheduler(bot):
+    global _wakeup
+    _wakeup = asyncio.Event()
+    loaded = await load_queue()
+    if loaded:
+        log.warning("Загружено напоминаний из очереди: %s", loaded)
+
+    while True:
+        now = time.time()
+        batch, stale = _pop_due(now)
+        if batch or stale:
+            if stale:
+                log.info("Пропущено устаревших напоминаний: %s", len(stale))
+            await _dispatch(bot, batch)
+            await asyncio.to_thread(_db_delete, [it["id"] for it in batch] + stale)
+            continue
+
+        delay = MAX_SLEEP if not _heap else min(MAX_SLEEP, max(0.0, _heap[0][0] - now))
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _load_subscriptions(group_id: Optional[str] = None) -> List[tuple]:
+    with _connect() as conn:
+        if group_id is None:
+            return conn.execute("SELECT chat_id, group_id, group_name, lead_min FROM reminder_subscriptions").fetchall()
+        return conn.execute(
+            "SELECT chat_id, group_id, group_name, lead_min FROM reminder_subscriptions WHERE group_id=?",
+            (group_id,),
+        ).fetchall()
+
+
+def subscriber_counts() -> List[tuple]:
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT group_id, MAX(group_name), COUNT(*) FROM reminder_subscriptions GROUP BY group_id"
+        ).fetchall()
+
+
+def _toggle_subscription(chat_id: int, group_id: str, group_name: str, lead_min: int) -> bool:
+    with _connect() as conn:
+        cur = conn.execute(
+            "DELETE FROM reminder_subscriptions WHERE chat_id=? AND group_id=?",
+            (chat_id, group_id),
+        )
+        if cur.rowcount:
+            return False
+        conn.execute(
+            "INSERT INTO reminder_subscriptions(chat_id, group_id, group_name, lead_min) VALUES (?,?,?,?)",
+            (chat_id, group_id, group_name, lead_min),
+        )
+        return True
+
+
+def _drop_chat_group(chat_id: int, group_id: str):
+    prefix_l, prefix_h = f"lesson:{group_id}:", f"hw:{group_id}:"
+    drop = [
+        rid for rid, it in _items.items()
+        if it["chat_id"] == chat_id and (it["scope"].startswith(prefix_l) or it["scope"].startswith(prefix_h))
+    ]
+    for rid in drop:
+        _forget(rid)
+    return drop
+
+
+async def toggle_subscription(event, group_id: str, group_name: str, lead_min: int = DEFAULT_LEAD_MIN) -> Optional[bool]:
+    chat_id = _chat_id(event)
+    if chat_id is None:
+        return None
+    on = await asyncio.to_thread(_toggle_subscription, chat_id, str(group_id), group_name, lead_min)
+    if on:
+        asyncio.create_task(plan_group(str(group_id), group_name))
+    else:
+        await load_queue()
+        await asyncio.to_thread(_db_delete, _drop_chat_group(chat_id, str(group_id)))
+    return on
+
+
+async def _group_records(group_id: str, group_name: str, start: datetime, end: datetime) -> List[dict]:
+    import timetable_cache
+    from groups_schedule import _timetable_group
+
+    cached = timetable_cache.group_records(group_id, start, end)
+    metrics.cache_result("group_timetable", cached is not None)
+    if cached is not None:
+        return cached
+    return await _timetable_group(group_id, start, end, group_name=group_name) or []
+
+
+def _lesson_items(group_id: str, day: str, records: List[dict], subs: List[tuple], now: float) -> List[dict]:
+    items = []
+    for rec in records:
+        if (rec.get("date") or "") != day:
+            continue
+        begin = (rec.get("beginLesson") or "").strip()
+        try:
+            start_dt = datetime.strptime(f"{day} {begin}", "%Y-%m-%d %H:%M")
+        except ValueError:
+            continue
+        subj = (rec.get("discipline") or "Пара").strip()
+        aud = (rec.get("auditorium") or "").strip()
+        end = (rec.get("endLesson") or "").strip()
+        kind = (rec.get("kindOfWork") or "").strip()
+        for chat_id, _, _, lead in subs:
+            due = (start_dt - timedelta(minutes=lead)).timestamp()
+            if due < now:
+                continue
+            text = f"🔔 Через {lead} мин: {subj}"
+            if kind:
+                text += f" ({kind})"
+            text += f"\n{begin}-{end}" if end else f"\n{begin}"
+            if aud:
+                text += f", {aud}"
+            items.append({
+                "due": due,
+                "chat_id": chat_id,
+                "text": text,
+                "key": f"lesson:{group_id}:{day}:{chat_id}:{begin}:{subj}:{aud}",
+                "scope": f"lesson:{group_id}:{day}",
+            })
+    return items
+
+
+def _homework_rows(group_name: str, deadline: date) -> List[dict]:
+    from homework import DB_PATH, _resolve_table_name, _select_for_dates, _human_date, _iso_date
+
+    if not DB_PATH.exists():
+        return []
+    with metrics.connect(DB_PATH, "homework") as conn:
+        table = _resolve_table_name(conn, group_name)
+        if not table:
+            return []
+        return _select_for_dates(conn, table, [_human_date(deadline), _iso_date(deadline)])
+
+
+def _homework_items(group_id: str, deadline: date, rows: List[dict], subs: List[tuple], now: float) -> List[dict]:
+    items = []
+    remind_at = datetime.combine(deadline - timedelta(days=1), datetime.min.time()) + timedelta(hours=HW_REMIND_HOUR)
+    due = remind_at.timestamp()
+    if due < now:
+        return items
+    d_human = deadline.strftime("%d.%m.%Y")
+    for n, row in enumerate(rows):
+        subj = (row.get("subject") or "Предмет").strip()
+        task = (row.get("task") or "").strip()
+        for chat_id, _, _, _ in subs:
+            items.append({
+                "due": due,
+                "chat_id": chat_id,
+                "text": f"📚 Завтра ({d_human}) дедлайн по ДЗ: {subj}\n{task}",
+                "key": f"hw:{group_id}:{d_human}:{chat_id}:{n}:{subj}:{task[:64]}",
+                "scope": f"hw:{group_id}:{d_human}",
+            })
+    return items
+
+
+async def plan_group(group_id: str, group_name: str, subs: Optional[List[tuple]] = None):
+    if subs is None:
+        subs = await asyncio.to_thread(_load_subscriptions, group_id)
+    if not subs:
+        return
+
+    now = time.time()
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    end = today + timedelta(days=PLAN_DAYS - 1)
+
+    try:
+        records = await _group_records(group_id, group_name, today, end)
+    except Exception as e:
+        log.warning("reminder planning: timetable for %s failed: %s", group_name, e)
+        records = None
+
+    for i in range(PLAN_DAYS):
+        day_dt = today + timedelta(days=i)
+        if records is not None:
+            day = day_dt.strftime("%Y-%m-%d")
+            items = _lesson_items(group_id, day, records, subs, now)
+            await cancel_scope_except(f"lesson:{group_id}:{day}", {it["key"] for it in items})
+            await schedule_many(items)
+
+        deadline = day_dt.date() + timedelta(days=1)
+        rows = await asyncio.to_thread(_homework_rows, group_name, deadline)
+        items = _homework_items(group_id, deadline, rows, subs, now)
+        await cancel_scope_except(f"hw:{group_id}:{deadline.strftime('%d.%m.%Y')}", {it["key"] for it in items})
+        await schedule_many(items)
+
+
+async def plan_all():
+    subs = await asyncio.to_thread(_load_subscriptions)
+    by_group: Dict[str, List[tuple]] = {}
+    names: Dict[str, str] = {}
+    for row in subs:
+        by_group.setdefault(row[1], []).append(row)
+        names[row[1]] = row[2]
+
+    sem = asyncio.Semaphore(PLAN_CONCURRENCY)
+
+    async def _one(gid: str):
+        async with sem:
+            await plan_group(gid, names[gid], by_group[gid])
+
+    await asyncio.gather(*(_one(gid) for gid in by_group))
+
+
+async def plan_loop():
+    while True:
+        try:
+            await plan_all()
+        except Exception as e:
+            log.warning("reminder planning failed: %s", e)
+        await asyncio.sleep(PLAN_INTERVAL)
@@ -0,0 +1,175 @@
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from maxapi import F
+from maxapi.types import ButtonsPayload, CallbackButton, MessageButton, MessageCallback
+
+import metrics
+import upstream
+from compact_snapshot import CompactStore
+
+log = logging.getLogger("semester")
+
+SEMESTER_TTL = float(os.getenv("SEMESTER_TTL_SEC", "3600"))
+SEMESTER_STALE_RETRY = 60.0
+SEMESTER_MAX_SNAPSHOTS = int(os.getenv("SEMESTER_MAX_SNAPSHOTS", "500"))
+MAX_PAGE_CHARS = 3800
+
+SNAPSHOTS: Dict[Tuple[str, str], dict] = {}
+STORE = CompactStore()
+NAMES: Dict[Tuple[str, str], str] = {}
+
+
+def semester_bounds(today: date) -> Tuple[date, date]:
+    if today.month >= 9:
+        return date(today.year, 9, 1), date(today.year + 1, 1, 31)
+    if today.month == 1:
+        return date(today.year - 1, 9, 1), date(today.year, 1, 31)
+    return date(today.year, 2, 1), date(today.year, 6, 30)
+
+
+def _monday(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+async def _fetch(kind: str, oid: str, name: str, start: date, end: date) -> List[dict]:
+    s = datetime.combine(start, datetime.min.time())
+    e = datetime.combine(end, datetime.min.time())
+    if kind == "group":
+        from groups_schedule import _timetable_group
+        return await _timetable_group(oid, s, e, group_name=name, ingest=False) or []
+    from teachers_schedule import _timetable_teacher
+    return await _timetable_teacher(oid, s, e, ingest=False) or []
+
+
+def _evict():
+    if len(SNAPSHOTS) <= SEMESTER_MAX_SNAPSHOTS:
+        return
+    oldest = sorted(SNAPSHOTS, key=lambda k: SNAPSHOTS[k]["fetched_at"])
+    for k in oldest[: len(SNAPSHOTS) - SEMESTER_MAX_SNAPSHOTS]:
+        del SNAPSHOTS[k]
+        STORE.drop(k)
+
+
+async def snapshot(kind: str, oid: str, name: str) -> dict:
+    key = (kind, str(oid))
+    start, end = semester_bounds(datetime.now().date())
+    snap = SNAPSHOTS.get(key)
+    fresh = snap is not None and snap["start"] == start and time.time() - snap["fetched_at"] <= SEMESTER_TTL
+    metrics.cache_result("semester", fresh)
+    if fresh:
+        return snap
+
+    try:
+        raw = await _fetch(kind, str(oid), name, start, end)
+    except Exception as e:
+        if snap is None or snap["start"] != start:
+            raise
+        log.warning("serving stale semester for %s %s: %s", kind, oid, e)
+        if not snap["note"]:
+            snap["note"] = upstream.stale_note(upstream.stale([], snap["fetched_at"], kind))
+        snap["fetched_at"] = time.time() - (SEMESTER_TTL - SEMESTER_STALE_RETRY)
+        return snap
+    note = upstream.stale_note(raw)
+    STORE.put(key, raw)
+    snap = {
+        "key": key,
+        "fetched_at": time.time() - (SEMESTER_TTL - SEMESTER_STALE_RETRY if note else 0),
+        "start": start,
+        "end": end,
+        "note": note,
+    }
+    SNAPSHOTS[key] = snap
+    _evict()
+    return snap
+
+
+def records(snap: dict, start: Optional[date] = None, end: Optional[date] = None) -> List[dict]:
+    return STORE.get(snap["key"], start, end) or []
+
+
+def _page_kb(kind: str, oid: str, monday: date, start: date, end: date) -> dict:
+    nav = []
+    prev_mon = monday - timedelta(days=7)
+    next_mon = monday + timedelta(days=7)
+    if prev_mon >= _monday(start):
+        nav.append(CallbackButton(text="◀️ Неделя", payload=f"sem:{kind}:{oid}:{prev_mon.isoformat()}"))
+    if next_mon <= end:
+        nav.append(CallbackButton(text="Неделя ▶️", payload=f"sem:{kind}:{oid}:{next_mon.isoformat()}"))
+    buttons = []
+    if nav:
+        buttons.append(nav)
+    buttons.append([CallbackButton(text="Текущая неделя", payload=f"sem:{kind}:{oid}:now")])
+    buttons.append([MessageButton(text="⬅️ В меню", payload="menu:home")])
+    return ButtonsPayload(buttons=buttons).pack()
+
+
+def _render(kind: str, name: str, snap: dict, monday: date) -> str:
+    if kind == "group":
+        from groups_schedule import _fmt_day
+    else:
+        from teachers_schedule import _fmt_day
+
+    start, end = snap["start"], snap["end"]
+    week_no = (monday - _monday(start)).days // 7 + 1
+    weeks = (_monday(end) - _monday(start)).days // 7 + 1
+    sunday = monday + timedelta(days=6)
+    parts = [f"📚 {name}: неделя {week_no} из {weeks} ({monday.strftime('%d.%m')} — {sunday.strftime('%d.%m.%Y')})"]
+    by_date: Dict[str, List[dict]] = {}
+    for rec in records(snap, monday, sunday):
+        by_date.setdefault(rec["date"], []).append(rec)
+    for day in sorted(by_date):
+        parts.append(_fmt_day(by_date[day], name))
+    if len(parts) == 1:
+        parts.append("На этой неделе занятий нет.")
+    if snap["note"]:
+        parts.append(snap["note"])
+
+    text = "\n\n".join(parts)
+    if len(text) > MAX_PAGE_CHARS:
+        text = text[:MAX_PAGE_CHARS].rsplit("\n", 1)[0] + "\n…"
+    return text
+
+
+async def show_week(event, kind: str, oid: str, monday: Optional[date] = None):
+    name = NAMES.get((kind, str(oid))) or ("Группа" if kind == "group" else "Преподаватель")
+    try:
+        snap = await snapshot(kind, oid, name)
+    except Exception as e:
+        await event.message.answer(f"Ошибка при запросе расписания: {e}")
+        return
+
+    start, end = snap["start"], snap["end"]
+    if monday is None:
+        today = datetime.now().date()
+        monday = _monday(min(max(today, start), end))
+    monday = min(max(monday, _monday(start)), _monday(end))
+    await event.message.answer(
+        text=_render(kind, name, snap, monday),
+        attachments=[_page_kb(kind, str(oid), monday, start, end)],
+    )
+
+
+async def open_semester(event, kind: str, oid: str, name: str):
+    NAMES[(kind, str(oid))] = name
+    await event.message.answer("Загружаю расписание на семестр…")
+    await show_week(event, kind, oid)
+
+
+def register_semester_handlers(dp):
+    @dp.message_callback(F.callback.payload.startswith("sem:"))
+    async def _on_semester_page(event: MessageCallback):
+        try:
+            _, kind, oid, week = event.callback.payload.split(":", 3)
+        except ValueError:
+            return
+        monday = None
+        if week != "now":
+            try:
+                monday = date.fromisoformat(week)
+            except ValueError:
+                return
+        await show_week(event, kind, oid, monday)
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Iterable, Tuple
+
+from maxapi.types.errors import Error
+
+log = logging.getLogger("sender")
+
+SEND_RATE_PER_SEC = float(os.getenv("MAX_SEND_RATE_PER_SEC", "25"))
+SEND_CONCURRENCY = int(os.getenv("MAX_SEND_CONCURRENCY", "20"))
+
+
+class RateLimitedSender:
+    def __init__(self, rate: float = SEND_RATE_PER_SEC, concurrency: int = SEND_CONCURRENCY):
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.sem = asyncio.Semaphore(concurrency)
+        self.sent = 0
+        self.failed = 0
+
+    async def _acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    async def _send_one(self, bot, chat_id: int, text: str):
+        async with self.sem:
+            try:
+                res = await bot.send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                self.failed += 1
+                log.warning("send to %s failed: %s", chat_id, e)
+                return
+            if isinstance(res, Error):
+                self.failed += 1
+                log.warning("send to %s rejected: code=%s, raw=%s", chat_id, res.code, res.raw)
+                return
+            self.sent += 1
+
+    async def send_many(self, bot, messages: Iterable[Tuple[int, str]]):
+        tasks = []
+        for chat_id, text in messages:
+            await self._acquire()
+            tasks.append(asyncio.create_task(self._send_one(bot, chat_id, text)))
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+SENDER = RateLimitedSender()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+
+T0 = time.perf_counter()
+
+import metrics  # noqa: E402
+
+log = logging.getLogger("startup")
+
+WARMUP_GROUPS = int(os.getenv("WARMUP_GROUPS", "30"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_BUDGET = float(os.getenv("WARMUP_BUDGET_SEC", "60"))
+
+TIMINGS: Dict[str, float] = {}
+READY: Dict[str, bool] = {"directory": False, "homework": False, "timetables": False}
+
+
+class stage:
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self.t0, failed=exc_type is not None)
+        return False
+
+
+def _record(name: str, seconds: float, failed: bool = False):
+    TIMINGS[name] = seconds
+    metrics.STARTUP_SECONDS.watch(lambda v=seconds: v, stage=name)
+    log.warning("stage %-12s %7.1f ms%s", name, seconds * 1000, " (failed)" if failed else "")
+
+
+def mark_imports():
+    _record("imports", time.perf_counter() - T0)
+
+
+def ready(feature: str) -> bool:
+    return READY.get(feature, False)
+
+
+def _directory() -> List[Tuple[str, str, int]]:
+    import notifications
+    import reminders
+
+    weights: Dict[str, List] = {}
+    for rows in (notifications.subscriber_counts("group"), reminders.subscriber_counts()):
+        for gid, name, n in rows:
+            entry = weights.setdefault(str(gid), [name or "", 0])
+            entry[0] = entry[0] or name or ""
+            entry[1] += n
+    return sorted(((gid, name, n) for gid, (name, n) in weights.items()), key=lambda r: -r[2])
+
+
+async def _warm_directory() -> List[Tuple[str, str, int]]:
+    import group_registry
+    import timetable_cache
+
+    with stage("directory"):
+        groups = await asyncio.to_thread(_directory)
+        for gid, name, _ in groups:
+            timetable_cache.GROUPS.setdefault(gid, name or gid)
+        await asyncio.to_thread(
+            group_registry.remember_many,
+            [(gid, name, ()) for gid, name, _ in groups if name and gid not in group_registry.NAMES],
+        )
+    READY["directory"] = True
+    return groups
+
+
+async def _warm_homework():
+    import group_registry
+    import homework
+
+    with stage("homework"):
+        await asyncio.to_thread(group_registry.load)
+        n = await asyncio.to_thread(homework.load_presence)
+    log.info("homework presence loaded for %d groups", n)
+    READY["homework"] = True
+
+
+async def _warm_timetables(groups: List[Tuple[str, str, int]]):
+    from datetime import datetime, timedelta
+    from groups_schedule import _timetable_group, _week_bounds
+    import upstream
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    monday, sunday = _week_bounds(today)
+    end = sunday + timedelta(days=7)
+    sem = asyncio.Semaphore(WARMUP_CONCURRENCY)
+    failed = {"n": 0}
+
+    async def _one(gid: str, name: str):
+        async with sem:
+            try:
+                await _timetable_group(gid, monday, end, group_name=name)
+            except Exception as e:
+                failed["n"] += 1
+                log.debug("warm-up failed for %s: %s", name, e)
+
+    with stage("timetables"), upstream.budget(WARMUP_BUDGET):
+        await asyncio.gather(*(_one(gid, name) for gid, name, _ in groups[:WARMUP_GROUPS]))
+    if failed["n"]:
+        log.warning("timetable warm-up: %d of %d groups failed", failed["n"], min(len(groups), WARMUP_GROUPS))
+    READY["timetables"] = True
+
+
+async def warm_up() -> asyncio.Task:
+    t0 = time.perf_counter()
+    results = await asyncio.gather(_warm_directory(), _warm_homework(), return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            log.warning("warm-up stage failed: %s", r)
+    groups = results[0] if isinstance(results[0], list) else []
+    _record("gate", time.perf_counter() - t0)
+
+    async def _rest():
+        try:
+            await _warm_timetables(groups)
+        except Exception as e:
+            log.warning("timetable warm-up failed: %s", e)
+        _record("total", time.perf_counter() - T0)
+
+    return asyncio.create_task(_rest())
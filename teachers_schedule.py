@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict
@@ -6,7 +5,14 @@ import re
 from pydantic import BaseModel
 from maxapi.types import MessageCreated
 
-from fa_api import FaAPI
+
+import metrics
+import tracing
+import timetable_cache
+import upstream
+import ics_export
+import semester
+import notifications
 
 log = logging.getLogger("teachers_schedule")
 
@@ -91,6 +97,12 @@ def _conv_key(event: MessageCreated) -> str:
         v = getattr(event, name, None)
         if v is not None:
             parts.append(f"{name}={v}")
+    if not parts:
+        try:
+            chat_id, user_id = event.get_ids()
+            parts = [f"chat_id={chat_id}", f"user_id={user_id}"]
+        except Exception:
+            pass
     return "|".join(parts) if parts else "global"
 
 def _st(event: MessageCreated) -> dict:
@@ -122,6 +134,11 @@ def _range_kb() -> InlineKeyboardAttachment:
                     {"type": "message", "text": "Выбрать дату"},
                     {"type": "message", "text": "Сменить преподавателя"},
                 ],
+                [
+                    {"type": "message", "text": "📚 Семестр"},
+                    {"type": "message", "text": "📅 В календарь"},
+                    {"type": "message", "text": "📣 Изменения"},
+                ],
                 [
                     {
                         "type": "message",
@@ -133,16 +150,45 @@ def _range_kb() -> InlineKeyboardAttachment:
         }
     )
 
-fa = FaAPI()
-
 async def _search_teacher(query: str):
-    return await asyncio.to_thread(fa.search_teacher, query)
+    with tracing.span("search_teacher"), metrics.track(metrics.UPSTREAM_LATENCY, metrics.UPSTREAM_ERRORS, method="search_teacher"):
+        return await upstream.call("search_teacher", upstream.fa.search_teacher, query)
+
+async def _timetable_teacher(teacher_id: str, start: datetime, end: datetime, ingest: bool = True):
+    with tracing.span("timetable_teacher", teacher_id=teacher_id) as sp:
+        cached = timetable_cache.teacher_records(teacher_id, start, end)
+        metrics.cache_result("teacher_timetable", cached is not None)
+        sp.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        try:
+            return await _fetch_teacher_upstream(teacher_id, start, end, ingest)
+        except Exception as ex:
+            cached = upstream.stale(
+                timetable_cache.teacher_records(teacher_id, start, end, ttl=upstream.STALE_TTL),
+                timetable_cache.teacher_seen_at(teacher_id, start, end),
+                "teacher",
+            )
+            if cached is None:
+                raise
+            log.warning("serving stale timetable for teacher %s: %s", teacher_id, ex)
+            sp.set(stale=True)
+            return cached
 
-async def _timetable_teacher(teacher_id: str, start: datetime, end: datetime):
+async def _fetch_teacher_upstream(teacher_id: str, start: datetime, end: datetime, ingest: bool = True):
     s = start.strftime("%Y.%m.%d")
     e = end.strftime("%Y.%m.%d")
-    return await asyncio.to_thread(fa.timetable_teacher, teacher_id, s, e)
+    with metrics.track(metrics.UPSTREAM_LATENCY, metrics.UPSTREAM_ERRORS, method="timetable_teacher"):
+        raw = await upstream.call("timetable_teacher", upstream.fa.timetable_teacher, teacher_id, s, e)
+    if not ingest:
+        return raw
+    try:
+        timetable_cache.remember_teacher_roster(teacher_id, raw, start, end)
+    except Exception as ex:
+        log.debug("teacher roster update failed for %s: %s", teacher_id, ex)
+    return raw
 
+@tracing.traced("fmt_day")
 def _fmt_day(records, teacher_name: str) -> str:
     if not records:
         return f"Расписание для {teacher_name} на этот день пустое."
@@ -211,6 +257,7 @@ async def open_teachers_menu(event: MessageCreated):
         "Введите фамилию преподавателя (например: Неизвестный):"
     )
 
+@metrics.timed("try_handle_teacher_message")
 async def try_handle_teacher_message(event: MessageCreated) -> bool:
     body = getattr(event.message, "body", None) or event.message
     text = (getattr(body, "text", None) or "").strip()
@@ -294,6 +341,27 @@ async def try_handle_teacher_message(event: MessageCreated) -> bool:
                 "Введите фамилию преподавателя (например: Неизвестный):"
             )
             return True
+        elif text == "📚 Семестр":
+            await semester.open_semester(event, "teacher", tid, name)
+            return True
+        elif text == "📅 В календарь":
+            await ics_export.send(event, "teacher", tid, name)
+            return True
+        elif text == "📣 Изменения":
+            on = await notifications.toggle_subscription(event, "teacher", tid, name)
+            if on is None:
+                await event.message.answer("Не удалось определить чат для уведомлений.")
+            elif on:
+                await event.message.answer(
+                    f"📣 Уведомления об изменениях в расписании {name} включены.",
+                    attachments=[_range_kb()],
+                )
+            else:
+                await event.message.answer(
+                    f"Уведомления об изменениях в расписании {name} выключены.",
+                    attachments=[_range_kb()],
+                )
+            return True
         else:
             return False
 
@@ -326,6 +394,9 @@ async def try_handle_teacher_message(event: MessageCreated) -> bool:
                 items = [r for r in raw if r.get("date") == day_iso] or raw
                 txt = _fmt_day(items, teacher_name=name)
                 await event.message.answer(txt)
+        note = upstream.stale_note(raw)
+        if note:
+            await event.message.answer(note)
 
         await event.message.answer(
             text="Выберите период:",
@@ -373,6 +444,9 @@ async def try_handle_teacher_message(event: MessageCreated) -> bool:
             items = [r for r in raw if r.get("date") == day_iso] or raw
             txt = _fmt_day(items, teacher_name=name)
             await event.message.answer(txt)
+        note = upstream.stale_note(raw)
+        if note:
+            await event.message.answer(note)
 
         st["mode"] = "IN_TEACHER"
         await event.message.answer(
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MAX_TOKEN", "test")
+
+from bench.loadtest import FakeBot, _isolate_storage, message_callback, message_created  # noqa: E402
+
+
+class SlowBot(FakeBot):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+        self.sending = None
+
+    async def send_message(self, chat_id=None, user_id=None, text=None, attachments=None, **kwargs):
+        self.sending.set()
+        await asyncio.sleep(self.delay)
+        await super().send_message(chat_id=chat_id, user_id=user_id, text=text, attachments=attachments, **kwargs)
+
+
+class CatchupReplayTest(unittest.TestCase):
+    def setUp(self):
+        import catchup
+        import main
+
+        _isolate_storage(Path(tempfile.mkdtemp(prefix="finmax-test-")))
+        catchup.CATCHUP_SETTLE = 0.05
+        self.main = main
+        self.dp = main.dp
+        if self.dp not in self.dp.routers:
+            self.dp.routers.append(self.dp)
+
+    def _pre_boot(self, raw: dict) -> dict:
+        import homework
+
+        ts = int((homework.BOOT_TS - 60) * 1000)
+        raw["timestamp"] = raw["message"]["timestamp"] = ts
+        return raw
+
+    async def _handle(self, event):
+        done = await self.dp.handle(event)
+        if isinstance(done, asyncio.Future):
+            await done
+
+    async def _wait_for(self, bot, chat_id: int, n: int):
+        for _ in range(100):
+            if len(bot.texts.get(chat_id, [])) >= n:
+                return
+            await asyncio.sleep(0.05)
+
+    def test_pre_boot_start_is_replayed(self):
+        from maxapi.methods.types.getted_updates import get_update_model
+
+        bot = FakeBot()
+        self.dp.bot = bot
+        chat_id = 4242
+        raw = self._pre_boot(message_created(chat_id, 4343, "/start", 1))
+
+        async def _run():
+            event = await get_update_model(raw, bot)
+            self.assertTrue(self.main._is_old_event(event))
+            await self._handle(event)
+            await self._wait_for(bot, chat_id, 1)
+
+        asyncio.run(_run())
+        self.assertIn(self.main.WELCOME_TEXT, bot.texts.get(chat_id, []))
+
+    def test_live_event_during_replay_is_delivered(self):
+        from maxapi.methods.types.getted_updates import get_update_model
+
+        bot = SlowBot(0.2)
+        self.dp.bot = bot
+        chat_id = 4244
+        raw_old = self._pre_boot(message_created(chat_id, 4345, "/start", 1))
+        raw_live = message_callback(chat_id, 4345, "hw:today", 2)
+
+        async def _run():
+            bot.sending = asyncio.Event()
+            await self._handle(await get_update_model(raw_old, bot))
+            await asyncio.wait_for(bot.sending.wait(), timeout=5)
+            await self._handle(await get_update_model(raw_live, bot))
+            await self._wait_for(bot, chat_id, 2)
+
+        asyncio.run(_run())
+        texts = bot.texts.get(chat_id, [])
+        self.assertEqual(len(texts), 2)
+        self.assertEqual(texts[0], self.main.WELCOME_TEXT)
+        self.assertEqual(texts[1], "Группа не выбрана. Введите номер группы:")
+
+
+if __name__ == "__main__":
+    unittest.main()
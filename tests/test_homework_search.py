@@ -0,0 +1,36 @@
+import sqlite3
+import sys
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import homework  # noqa: E402
+
+
+class HomeworkSearchTest(unittest.TestCase):
+    def setUp(self):
+        homework._FTS_STATE.update(ready=False, available=True)
+        self.conn = sqlite3.connect(":memory:")
+        homework._insert_homework(self.conn, "БИ25-6", "Математика", date(2030, 12, 1), "Решить задачи 1-10", [])
+        homework._insert_homework(self.conn, "БИ25-6", "История", date(2030, 12, 2), "Подготовить доклад", [])
+        homework._insert_homework(self.conn, "БИ25-7", "Математика", date(2030, 12, 1), "Подготовить доклад", [])
+
+    def tearDown(self):
+        self.conn.close()
+        homework._FTS_STATE.update(ready=False, available=True)
+
+    def test_terms_match_content_in_group(self):
+        total, rows = homework._search_homework(self.conn, "БИ25-6", "доклад", 0)
+        self.assertEqual(total, 1)
+        self.assertEqual(rows[0]["subject"], "История")
+        self.assertEqual(homework._search_homework(self.conn, "БИ25-6", "матем", 0)[0], 1)
+
+    def test_group_name_is_not_searchable(self):
+        for q in ("би25", "6", "БИ25-6"):
+            self.assertEqual(homework._search_homework(self.conn, "БИ25-6", q, 0), (0, []), q)
+
+
+if __name__ == "__main__":
+    unittest.main()
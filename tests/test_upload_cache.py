@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import upload_cache  # noqa: E402
+from maxapi.types.errors import Error  # noqa: E402
+
+
+class FakeUploadServer:
+    def __init__(self):
+        self.uploads = 0
+        self.runner = None
+        self.url = None
+
+    async def _upload(self, request):
+        data = await request.post()
+        data["data"].file.read()
+        self.uploads += 1
+        return web.json_response({"token": f"tok-{self.uploads}"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/upload", self._upload)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/upload"
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+class FakeBot:
+    def __init__(self, server: FakeUploadServer):
+        self.server = server
+
+    async def get_upload_url(self, upload_type):
+        return SimpleNamespace(url=self.server.url, token=None)
+
+
+class FakeMessage:
+    def __init__(self, bot):
+        self.bot = bot
+        self.sent = []
+        self.revoked = set()
+        self.failure = None
+
+    async def answer(self, text=None, attachments=None, **kwargs):
+        token = attachments[0].payload.token
+        if self.failure is not None:
+            return self.failure
+        if token in self.revoked:
+            return Error(code=400, raw={"code": "attachment.invalid", "message": "Invalid attachment token"})
+        self.sent.append(token)
+        return SimpleNamespace(text=text)
+
+
+class UploadCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = Path(tempfile.mkdtemp(prefix="finmax-test-"))
+        self.db = tmp / "homework.db"
+        self.path = tmp / "task.txt"
+        self.path.write_bytes(b"homework " * 1000)
+
+    def _run(self, scenario):
+        async def _main():
+            server = FakeUploadServer()
+            await server.start()
+            try:
+                msg = FakeMessage(FakeBot(server))
+                await scenario(server, msg, SimpleNamespace(message=msg))
+            finally:
+                await server.stop()
+
+        asyncio.run(_main())
+
+    def _send(self, event):
+        return upload_cache.send_path(event, self.db, self.path, "sha-1", "task.txt", "📎 task.txt")
+
+    def test_token_is_reused(self):
+        async def scenario(server, msg, event):
+            self.assertTrue(await self._send(event))
+            self.assertTrue(await self._send(event))
+            self.assertEqual(server.uploads, 1)
+            self.assertEqual(msg.sent, ["tok-1", "tok-1"])
+
+        self._run(scenario)
+
+    def test_rejected_token_is_uploaded_again(self):
+        async def scenario(server, msg, event):
+            self.assertTrue(await self._send(event))
+            msg.revoked.add("tok-1")
+            self.assertTrue(await self._send(event))
+            self.assertEqual(server.uploads, 2)
+            self.assertEqual(msg.sent, ["tok-1", "tok-2"])
+            self.assertTrue(await self._send(event))
+            self.assertEqual(server.uploads, 2)
+
+        self._run(scenario)
+
+    def test_server_error_keeps_token(self):
+        async def scenario(server, msg, event):
+            self.assertTrue(await self._send(event))
+            msg.failure = Error(code=503, raw={"code": "service.unavailable", "message": "Try later"})
+            self.assertFalse(await self._send(event))
+            msg.failure = None
+            self.assertTrue(await self._send(event))
+            self.assertEqual(server.uploads, 1)
+            self.assertEqual(msg.sent, ["tok-1", "tok-1"])
+
+        self._run(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import upstream  # noqa: E402
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"RUZ отдал код {status}", response=response)
+
+
+class UpstreamRetryTest(unittest.TestCase):
+    def setUp(self):
+        upstream.BREAKER.state = upstream.CLOSED
+        upstream.BREAKER.calls.clear()
+        self.retry_base = upstream.RETRY_BASE
+        upstream.RETRY_BASE = 0.0
+
+    def tearDown(self):
+        upstream.RETRY_BASE = self.retry_base
+        upstream.BREAKER.calls.clear()
+
+    def _call(self, status: int) -> int:
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise _http_error(status)
+
+        with self.assertRaises(requests.HTTPError):
+            asyncio.run(upstream.call("test", fn))
+        return len(calls)
+
+    def test_client_error_is_not_retried(self):
+        self.assertEqual(self._call(404), 1)
+        self.assertEqual(list(ok for ok, _ in upstream.BREAKER.calls), [True])
+
+    def test_server_error_is_retried(self):
+        self.assertEqual(self._call(503), upstream.RETRY_MAX + 1)
+        self.assertFalse(any(ok for ok, _ in upstream.BREAKER.calls))
+
+
+if __name__ == "__main__":
+    unittest.main()
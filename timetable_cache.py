@@ -0,0 +1,399 @@
+import os
+import re
+import time
+import logging
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger("timetable_cache")
+
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL_SEC", "1800"))
+TEACHER_ROSTER_TTL = float(os.getenv("TEACHER_ROSTER_TTL_SEC", str(3 * 24 * 3600)))
+
+INDEX_FIELDS = ("discipline", "teacher", "auditorium")
+
+GROUPS: Dict[str, str] = {}
+DAYS: Dict[Tuple[str, str], dict] = {}
+LESSONS: Dict[int, dict] = {}
+INDEX: Dict[str, Dict[str, Set[int]]] = {f: {} for f in INDEX_FIELDS}
+TEACHER_DAYS: Dict[Tuple[str, str], dict] = {}
+CHANGE_LISTENERS: List[Callable[[List[dict]], None]] = []
+
+_next_id = 1
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _norm(s: str) -> str:
+    s = (s or "").strip().lower().replace("ё", "е")
+    return " ".join(s.split())
+
+
+def _tokens(s: str) -> List[str]:
+    return _TOKEN_RE.findall(_norm(s))
+
+
+def _iso(d) -> str:
+    if isinstance(d, datetime):
+        d = d.date()
+    return d.strftime("%Y-%m-%d")
+
+
+def _days_between(start, end) -> List[str]:
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    out = []
+    d = start
+    while d <= end:
+        out.append(_iso(d))
+        d += timedelta(days=1)
+    return out
+
+
+def _teacher_oids(rec: dict) -> List[str]:
+    oids = []
+    arr = rec.get("listOfLecturers")
+    if isinstance(arr, list):
+        for t in arr:
+            if isinstance(t, dict) and t.get("lecturerOid") is not None:
+                oids.append(str(t["lecturerOid"]))
+    if not oids and rec.get("lecturerOid") is not None:
+        oids.append(str(rec["lecturerOid"]))
+    return oids
+
+
+def _lesson_terms(lesson: dict) -> Dict[str, Set[str]]:
+    terms = {
+        "discipline": set(_tokens(lesson["discipline"])),
+        "auditorium": set(_tokens(lesson["auditorium"])),
+        "teacher": set(),
+    }
+    for name in lesson["teachers"]:
+        terms["teacher"].update(_tokens(name))
+    for f in ("discipline", "auditorium"):
+        full = _norm(lesson[f])
+        if full:
+            terms[f].add(full)
+    for name in lesson["teachers"]:
+        full = _norm(name)
+        if full:
+            terms["teacher"].add(full)
+    return terms
+
+
+def _make_lesson(group_id: str, group_name: str, rec: dict) -> dict:
+    from groups_schedule import _teacher_names_from_record
+
+    def _v(x):
+        return (x or "").strip() if isinstance(x, str) else ""
+
+    return {
+        "group_id": group_id,
+        "group_name": group_name,
+        "date": _v(rec.get("date")),
+        "begin": _v(rec.get("beginLesson")),
+        "end": _v(rec.get("endLesson")),
+        "discipline": _v(rec.get("discipline")),
+        "auditorium": _v(rec.get("auditorium")),
+        "kind": _v(rec.get("kindOfWork")),
+        "teachers": _teacher_names_from_record(rec),
+        "teacher_oids": _teacher_oids(rec),
+        "lesson_oid": rec.get("lessonOid"),
+        "rec": rec,
+    }
+
+
+def _add_lesson(lesson: dict) -> int:
+    global _next_id
+    lid = _next_id
+    _next_id += 1
+    LESSONS[lid] = lesson
+    for oid in lesson["teacher_oids"]:
+        roster = TEACHER_DAYS.get((oid, lesson["date"]))
+        if roster is not None:
+            roster["groups"].add(lesson["group_id"])
+    for field, terms in _lesson_terms(lesson).items():
+        postings = INDEX[field]
+        for t in terms:
+            postings.setdefault(t, set()).add(lid)
+    return lid
+
+
+def _drop_lesson(lid: int):
+    lesson = LESSONS.pop(lid, None)
+    if lesson is None:
+        return
+    for field, terms in _lesson_terms(lesson).items():
+        postings = INDEX[field]
+        for t in terms:
+            ids = postings.get(t)
+            if ids is None:
+                continue
+            ids.discard(lid)
+            if not ids:
+                del postings[t]
+
+
+def _identity(lesson: dict):
+    if lesson["lesson_oid"] is not None:
+        return ("oid", lesson["lesson_oid"])
+    return ("key", _norm(lesson["discipline"]), _norm(lesson["kind"]), lesson["begin"])
+
+
+def _change(kind: str, old: Optional[dict], new: Optional[dict]) -> dict:
+    base = new or old
+    oids = set(base["teacher_oids"])
+    if old and new:
+        oids |= set(old["teacher_oids"])
+    return {
+        "kind": kind,
+        "group_id": base["group_id"],
+        "group_name": base["group_name"],
+        "date": base["date"],
+        "discipline": base["discipline"],
+        "old": old,
+        "new": new,
+        "teacher_oids": oids,
+    }
+
+
+def _diff_day(old_lessons: List[dict], new_lessons: List[dict]) -> List[dict]:
+    changes: List[dict] = []
+    old_by_id = {_identity(l): l for l in old_lessons}
+    new_by_id = {_identity(l): l for l in new_lessons}
+
+    for ident, new in new_by_id.items():
+        old = old_by_id.get(ident)
+        if old is None:
+            continue
+        if (old["begin"], old["end"]) != (new["begin"], new["end"]):
+            changes.append(_change("moved", old, new))
+        elif _norm(old["auditorium"]) != _norm(new["auditorium"]):
+            changes.append(_change("room", old, new))
+        elif [_norm(t) for t in old["teachers"]] != [_norm(t) for t in new["teachers"]]:
+            changes.append(_change("teacher", old, new))
+
+    removed = [l for i, l in old_by_id.items() if i not in new_by_id]
+    added = [l for i, l in new_by_id.items() if i not in old_by_id]
+    for old in list(removed):
+        match = next(
+            (n for n in added if _norm(n["discipline"]) == _norm(old["discipline"]) and _norm(n["kind"]) == _norm(old["kind"])),
+            None,
+        )
+        if match is not None:
+            added.remove(match)
+            removed.remove(old)
+            changes.append(_change("moved", old, match))
+
+    changes += [_change("cancelled", l, None) for l in removed]
+    changes += [_change("added", None, l) for l in added]
+    return changes
+
+
+def ingest_group_snapshot(group_id: str, group_name: str, records: List[dict], start, end) -> List[dict]:
+    group_id = str(group_id)
+    GROUPS[group_id] = group_name or GROUPS.get(group_id) or group_id
+    now = time.time()
+    today = _iso(datetime.now())
+
+    by_day: Dict[str, List[dict]] = {d: [] for d in _days_between(start, end)}
+    for rec in records or []:
+        if not isinstance(rec, dict):
+            continue
+        d = (rec.get("date") or "").strip()
+        if d:
+            by_day.setdefault(d, []).append(rec)
+
+    changes: List[dict] = []
+    for day, recs in by_day.items():
+        key = (group_id, day)
+        old = DAYS.get(key)
+        old_lessons = []
+        if old:
+            old_lessons = [LESSONS[lid] for lid in old["ids"] if lid in LESSONS]
+            for lid in old["ids"]:
+                _drop_lesson(lid)
+        ids = [_add_lesson(_make_lesson(group_id, GROUPS[group_id], r)) for r in recs]
+        DAYS[key] = {"fetched_at": now, "ids": ids}
+        if old and day >= today:
+            changes += _diff_day(old_lessons, [LESSONS[lid] for lid in ids])
+
+    if changes:
+        for listener in CHANGE_LISTENERS:
+            try:
+                listener(changes)
+            except Exception as e:
+                log.warning("change listener failed: %s", e)
+    return changes
+
+
+def group_day_is_fresh(group_id: str, day: str, ttl: float = SNAPSHOT_TTL) -> bool:
+    snap = DAYS.get((str(group_id), day))
+    return snap is not None and (time.time() - snap["fetched_at"]) <= ttl
+
+
+def group_records(group_id: str, start, end, ttl: float = SNAPSHOT_TTL) -> Optional[List[dict]]:
+    group_id = str(group_id)
+    out = []
+    for day in _days_between(start, end):
+        if not group_day_is_fresh(group_id, day, ttl):
+            return None
+        out.extend(LESSONS[lid]["rec"] for lid in DAYS[(group_id, day)]["ids"])
+    return out
+
+
+def group_fetched_at(group_id: str, start, end) -> Optional[float]:
+    group_id = str(group_id)
+    stamps = []
+    for day in _days_between(start, end):
+        snap = DAYS.get((group_id, day))
+        if snap is None:
+            return None
+        stamps.append(snap["fetched_at"])
+    return min(stamps) if stamps else None
+
+
+def teacher_seen_at(teacher_id: str, start, end) -> Optional[float]:
+    teacher_id = str(teacher_id)
+    stamps = []
+    for day in _days_between(start, end):
+        roster = TEACHER_DAYS.get((teacher_id, day))
+        if roster is None:
+            return None
+        stamps.append(roster["seen_at"])
+    return min(stamps) if stamps else None
+
+
+def find_group_by_name(name: str) -> List[dict]:
+    key = _norm(name)
+    return [{"id": gid, "label": gname, "type": "group"} for gid, gname in GROUPS.items() if _norm(gname) == key]
+
+
+def _lesson_key(rec: dict) -> tuple:
+    return (
+        (rec.get("date") or "").strip(),
+        (rec.get("beginLesson") or "").strip(),
+        _norm(rec.get("discipline") or ""),
+        _norm(rec.get("auditorium") or ""),
+    )
+
+
+def _rec_group_oids(rec: dict) -> Dict[str, str]:
+    oids: Dict[str, str] = {}
+    arr = rec.get("listGroups")
+    if isinstance(arr, list):
+        for g in arr:
+            if isinstance(g, dict) and g.get("groupOid") is not None:
+                oids[str(g["groupOid"])] = (g.get("group") or "").strip()
+    if rec.get("groupOid") is not None:
+        gid = str(rec["groupOid"])
+        if not oids.get(gid) and "," not in (rec.get("group") or ""):
+            oids[gid] = (rec.get("group") or "").strip()
+        else:
+            oids.setdefault(gid, "")
+    return oids
+
+
+def remember_teacher_roster(teacher_id: str, records: List[dict], start, end):
+    teacher_id = str(teacher_id)
+    now = time.time()
+    days = {d: {"names": {}, "keys": set()} for d in _days_between(start, end)}
+    for rec in records or []:
+        if not isinstance(rec, dict):
+            continue
+        d = (rec.get("date") or "").strip()
+        if d not in days:
+            continue
+        for gid, name in _rec_group_oids(rec).items():
+            if name or gid not in days[d]["names"]:
+                days[d]["names"][gid] = name
+        days[d]["keys"].add(_lesson_key(rec))
+
+    for d, info in days.items():
+        TEACHER_DAYS[(teacher_id, d)] = {
+            "seen_at": now,
+            "groups": set(info["names"]),
+            "names": info["names"],
+            "count": len(info["keys"]),
+        }
+
+
+def teacher_records(teacher_id: str, start, end, ttl: float = SNAPSHOT_TTL) -> Optional[List[dict]]:
+    teacher_id = str(teacher_id)
+    now = time.time()
+    out: List[dict] = []
+
+    for day in _days_between(start, end):
+        roster = TEACHER_DAYS.get((teacher_id, day))
+        if roster is None or now - roster["seen_at"] > TEACHER_ROSTER_TTL:
+            return None
+        if not roster["groups"] and now - roster["seen_at"] > ttl:
+            return None
+
+        merged: Dict[tuple, dict] = {}
+        for gid in roster["groups"]:
+            if not group_day_is_fresh(gid, day, ttl):
+                return None
+            for lid in DAYS[(gid, day)]["ids"]:
+                lesson = LESSONS[lid]
+                if teacher_id not in lesson["teacher_oids"]:
+                    continue
+                key = _lesson_key(lesson["rec"])
+                entry = merged.get(key)
+                if entry is None:
+                    merged[key] = {"rec": lesson["rec"], "groups": [lesson["group_name"]]}
+                elif lesson["group_name"] not in entry["groups"]:
+                    entry["groups"].append(lesson["group_name"])
+
+        if len(merged) != roster["count"]:
+            return None
+
+        for entry in merged.values():
+            rec = dict(entry["rec"])
+            rec["group"] = ", ".join(sorted(entry["groups"]))
+            out.append(rec)
+
+    return out
+
+
+def find_lessons(
+    query: str,
+    fields: Tuple[str, ...] = INDEX_FIELDS,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[dict]:
+    terms = _tokens(query)
+    if not terms:
+        return []
+
+    candidates: Optional[Set[int]] = None
+    for t in terms:
+        hits: Set[int] = set()
+        for f in fields:
+            hits |= INDEX[f].get(t, set())
+        if not hits:
+            return []
+        candidates = hits if candidates is None else (candidates & hits)
+        if not candidates:
+            return []
+
+    lo = _iso(start) if start else None
+    hi = _iso(end) if end else None
+    out = []
+    for lid in candidates:
+        lesson = LESSONS[lid]
+        d = lesson["date"]
+        if lo and d < lo:
+            continue
+        if hi and d > hi:
+            continue
+        out.append(lesson)
+
+    out.sort(key=lambda l: (l["date"], l["begin"], l["group_name"]))
+    return out
+
+
+def cached_groups_count() -> int:
+    return len(GROUPS)
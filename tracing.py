@@ -0,0 +1,193 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from maxapi.filters.middleware import BaseMiddleware
+
+log = logging.getLogger("tracing")
+
+BASE_DIR = Path(__file__).resolve().parent
+TRACE_PATH = Path(os.getenv("TRACE_PATH", str(BASE_DIR / "data" / "traces.jsonl")))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "0"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_MB", "50")) * 1024 * 1024
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attrs", "ts", "t0", "ms", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attrs: dict):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.ts = time.time()
+        self.t0 = time.perf_counter()
+        self.ms = 0.0
+        self.error = None
+
+    def as_dict(self, conv: str) -> dict:
+        d = {
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "conv": conv,
+            "ts": round(self.ts, 6),
+            "ms": round(self.ms, 3),
+        }
+        if self.error:
+            d["error"] = self.error
+        if self.attrs:
+            d.update(self.attrs)
+        return d
+
+
+class _Trace:
+    __slots__ = ("trace_id", "conv", "spans")
+
+    def __init__(self, conv: str):
+        self.trace_id = uuid.uuid4().hex
+        self.conv = conv
+        self.spans: List[Span] = []
+
+
+_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("trace", default=None)
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+def enabled() -> bool:
+    return TRACE_SAMPLE_RATE > 0 or TRACE_SLOW_MS > 0
+
+
+class span:
+    __slots__ = ("name", "attrs", "sp", "token")
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.sp = None
+
+    def __enter__(self):
+        tr = _trace.get()
+        if tr is None:
+            return self
+        parent = _current.get()
+        self.sp = Span(tr.trace_id, parent.span_id if parent else None, self.name, self.attrs)
+        self.token = _current.set(self.sp)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        sp = self.sp
+        if sp is None:
+            return False
+        sp.ms = (time.perf_counter() - sp.t0) * 1000
+        if exc_type is not None:
+            sp.error = f"{exc_type.__name__}: {exc}"
+        _current.reset(self.token)
+        tr = _trace.get()
+        if tr is not None:
+            tr.spans.append(sp)
+        return False
+
+    def set(self, **attrs):
+        if self.sp is not None:
+            self.sp.attrs.update(attrs)
+
+
+def traced(name: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _write(lines: List[str]):
+    TRACE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if TRACE_PATH.exists() and TRACE_PATH.stat().st_size > TRACE_MAX_BYTES:
+            os.replace(TRACE_PATH, TRACE_PATH.with_suffix(TRACE_PATH.suffix + ".1"))
+    except OSError:
+        pass
+    with open(TRACE_PATH, "a", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+class trace_root:
+    __slots__ = ("name", "conv", "attrs", "sampled", "tr", "root", "token")
+
+    def __init__(self, name: str, conv: str, **attrs):
+        self.name = name
+        self.conv = conv
+        self.attrs = attrs
+        self.tr = None
+
+    def __enter__(self):
+        if not enabled() or _trace.get() is not None:
+            return self
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.tr = _Trace(self.conv)
+        self.token = _trace.set(self.tr)
+        self.root = span(self.name, **self.attrs)
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.tr is None:
+            return False
+        self.root.__exit__(exc_type, exc, tb)
+        _trace.reset(self.token)
+        root = self.root.sp
+        if self.sampled or (TRACE_SLOW_MS > 0 and root.ms >= TRACE_SLOW_MS):
+            root.attrs["root"] = True
+            root.attrs["sampled"] = self.sampled
+            try:
+                _write([json.dumps(s.as_dict(self.tr.conv), ensure_ascii=False) for s in self.tr.spans])
+            except OSError as e:
+                log.warning("trace export failed: %s", e)
+        return False
+
+
+def _conv_key(event) -> str:
+    try:
+        chat_id, user_id = event.get_ids()
+        return f"{chat_id}:{user_id}"
+    except Exception:
+        return "unknown"
+
+
+class _EventTracer(BaseMiddleware):
+    async def __call__(self, handler, event_object, data):
+        kind = getattr(getattr(event_object, "update_type", None), "value", "unknown")
+        with trace_root("event", _conv_key(event_object), update_type=kind):
+            return await handler(event_object, data)
+
+
+class _HandlerSpan(BaseMiddleware):
+    def __init__(self, name: str):
+        self.name = name
+
+    async def __call__(self, handler, event_object, data):
+        with span("handler", handler=self.name):
+            return await handler(event_object, data)
+
+
+def instrument_dispatcher(dp):
+    if not enabled():
+        return
+    dp.outer_middleware(_EventTracer())
+    for h in dp.event_handlers:
+        h.middlewares.append(_HandlerSpan(h.func_event.__name__))
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import aiofiles
+import aiohttp
+from maxapi.enums.upload_type import UploadType
+from maxapi.types.attachments.upload import AttachmentPayload, AttachmentUpload
+from maxapi.types.errors import Error
+from maxapi.types.input_media import InputMedia
+
+import attachments
+import metrics
+
+log = logging.getLogger("upload_cache")
+
+UPLOAD_TOKEN_TTL = float(os.getenv("MAX_UPLOAD_TOKEN_TTL_SEC", str(7 * 24 * 3600)))
+UPLOAD_TIMEOUT_SEC = float(os.getenv("MAX_UPLOAD_TIMEOUT_SEC", "120"))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+TOKEN_ERROR_MARKERS = ("token", "attachment", "expired", "file.not.found")
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+class UploadFailed(Exception):
+    pass
+
+
+def _ensure_table(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS homework_upload_tokens (
+            sha256 TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            token TEXT NOT NULL,
+            uploaded_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """
+    )
+
+
+def _get_cached(db_path: Path, sha256: str) -> Optional[AttachmentUpload]:
+    with metrics.connect(db_path, "homework") as conn:
+        _ensure_table(conn)
+        row = conn.execute(
+            "SELECT type, token FROM homework_upload_tokens WHERE sha256=? AND expires_at > ?",
+            (sha256, time.time()),
+        ).fetchone()
+    if not row:
+        return None
+    return AttachmentUpload(type=UploadType(row[0]), payload=AttachmentPayload(token=row[1]))
+
+
+def _put_cached(db_path: Path, sha256: str, att: AttachmentUpload):
+    now = time.time()
+    with metrics.connect(db_path, "homework") as conn:
+        _ensure_table(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO homework_upload_tokens(sha256, type, token, uploaded_at, expires_at) VALUES (?,?,?,?,?)",
+            (sha256, UploadType(att.type).value, att.payload.token, now, now + UPLOAD_TOKEN_TTL),
+        )
+
+
+def invalidate(db_path: Path, sha256: str):
+    with metrics.connect(db_path, "homework") as conn:
+        _ensure_table(conn)
+        conn.execute("DELETE FROM homework_upload_tokens WHERE sha256=?", (sha256,))
+
+
+def _token_rejected(res: Error) -> bool:
+    if res.code >= 500 or res.code == 429:
+        return False
+    raw = res.raw if isinstance(res.raw, dict) else {}
+    text = f"{raw.get('code') or ''} {raw.get('message') or ''}".lower()
+    if "not.ready" in text:
+        return False
+    return any(m in text for m in TOKEN_ERROR_MARKERS)
+
+
+async def _file_sender(path: Path):
+    async with aiofiles.open(path, "rb") as f:
+        while True:
+            chunk = await f.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def _upload_blob(bot, path: Path, name: str) -> AttachmentUpload:
+    upload_type = (await asyncio.to_thread(InputMedia, str(path))).type
+    upload = await bot.get_upload_url(upload_type)
+    if isinstance(upload, Error):
+        raise UploadFailed(f"upload url: code={upload.code}, raw={upload.raw}")
+
+    form = aiohttp.FormData()
+    form.add_field("data", _file_sender(path), filename=name, content_type="application/octet-stream")
+    timeout = aiohttp.ClientTimeout(total=UPLOAD_TIMEOUT_SEC)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with session.post(upload.url, data=form) as resp:
+            body = await resp.text()
+            if resp.status >= 400:
+                raise UploadFailed(f"upload: HTTP {resp.status}: {body[:200]}")
+
+    if upload_type in (UploadType.VIDEO, UploadType.AUDIO):
+        token = upload.token
+    elif upload_type == UploadType.IMAGE:
+        photos = json.loads(body)["photos"]
+        token = photos[next(iter(photos))]["token"]
+    else:
+        token = json.loads(body)["token"]
+    if not token:
+        raise UploadFailed("upload: empty token")
+
+    return AttachmentUpload(type=upload_type, payload=AttachmentPayload(token=token))
+
+
+async def _get_or_upload(bot, db_path: Path, sha: str, path: Path, name: str) -> AttachmentUpload:
+    cached = await asyncio.to_thread(_get_cached, db_path, sha)
+    metrics.cache_result("upload_token", cached is not None)
+    if cached is not None:
+        return cached
+
+    fut = _inflight.get(sha)
+    if fut is not None:
+        return await asyncio.shield(fut)
+
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[sha] = fut
+    try:
+        att = await _upload_blob(bot, path, name)
+        await asyncio.to_thread(_put_cached, db_path, sha, att)
+        fut.set_result(att)
+        return att
+    except asyncio.CancelledError:
+        fut.cancel()
+        raise
+    except Exception as e:
+        fut.set_exception(e)
+        fut.exception()
+        raise
+    finally:
+        _inflight.pop(sha, None)
+
+
+async def get_attachment(bot, db_path: Path, entry: dict) -> AttachmentUpload:
+    sha = entry["sha256"]
+    return await _get_or_upload(bot, db_path, sha, attachments.blob_path(sha), attachments.file_name(entry))
+
+
+async def send_file(event, db_path: Path, entry: dict) -> bool:
+    sha = entry["sha256"]
+    name = attachments.file_name(entry)
+    return await send_path(event, db_path, attachments.blob_path(sha), sha, name, f"📎 {name}")
+
+
+async def send_path(event, db_path: Path, path: Path, sha: str, name: str, text: str) -> bool:
+    msg = event.message
+    if not path.exists():
+        return False
+
+    for attempt in range(2):
+        att = await _get_or_upload(msg.bot, db_path, sha, path, name)
+        res = await msg.answer(text=text, attachments=[att])
+        if not isinstance(res, Error):
+            return True
+        if not _token_rejected(res):
+            log.warning("Не удалось отправить файл %s: code=%s, raw=%s", sha, res.code, res.raw)
+            return False
+        log.warning("Токен файла %s отклонён (%s), загружаю заново", sha, res.raw)
+        await asyncio.to_thread(invalidate, db_path, sha)
+    return False
@@ -0,0 +1,311 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+import requests
+from maxapi.filters.middleware import BaseMiddleware
+from fa_api import FaAPI
+
+import metrics
+
+log = logging.getLogger("upstream")
+
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT_SEC", "8"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SEC = float(os.getenv("BREAKER_SLOW_SEC", "4"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SEC = float(os.getenv("BREAKER_OPEN_SEC", "30"))
+BREAKER_PROBES = int(os.getenv("BREAKER_PROBES", "1"))
+STALE_TTL = float(os.getenv("STALE_TTL_SEC", str(7 * 24 * 3600)))
+
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET_SEC", "12"))
+UPSTREAM_MIN_TIMEOUT = float(os.getenv("UPSTREAM_MIN_TIMEOUT_SEC", "1.5"))
+TIMEOUT_FACTOR = float(os.getenv("UPSTREAM_TIMEOUT_FACTOR", "2"))
+LATENCY_WINDOW = int(os.getenv("UPSTREAM_LATENCY_WINDOW", "200"))
+LATENCY_MIN_SAMPLES = int(os.getenv("UPSTREAM_LATENCY_MIN_SAMPLES", "20"))
+RETRY_MAX = int(os.getenv("UPSTREAM_RETRIES", "2"))
+RETRY_BASE = float(os.getenv("UPSTREAM_RETRY_BASE_SEC", "0.3"))
+MIN_ATTEMPT = float(os.getenv("UPSTREAM_MIN_ATTEMPT_SEC", "0.5"))
+HEDGE = os.getenv("UPSTREAM_HEDGE", "0") == "1"
+HEDGE_MAX_RATIO = float(os.getenv("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+UPSTREAM_POOL = int(os.getenv("UPSTREAM_POOL", "16"))
+
+RUZ_HOST = os.getenv("RUZ_HOST", "").rstrip("/")
+
+
+class FaClient(FaAPI):
+    def __init__(self, timeout: float = UPSTREAM_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = False
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=UPSTREAM_POOL)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _FaAPI__request(self, sub_url: str):
+        url = self.HOST + sub_url
+        r = self.session.get(url, timeout=self.timeout)
+        if r.status_code == 200:
+            return r.json()
+        raise requests.HTTPError(f"[Ошибка] RUZ отдал код {r.status_code}!\nURL: '{url}'", response=r)
+
+
+fa = FaClient()
+if RUZ_HOST:
+    fa.HOST = RUZ_HOST
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_in: float):
+        super().__init__(f"РУЗ временно недоступен, попробуйте через {max(1, int(retry_in))} с")
+        self.retry_in = retry_in
+
+
+class Breaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.calls = deque(maxlen=BREAKER_WINDOW)
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < BREAKER_OPEN_SEC:
+                    return False
+                self.state = HALF_OPEN
+                self.probes = 0
+                log.warning("breaker %s half-open, probing", self.name)
+            if self.probes >= BREAKER_PROBES:
+                return False
+            self.probes += 1
+            return True
+
+    def retry_in(self) -> float:
+        return max(0.0, BREAKER_OPEN_SEC - (time.monotonic() - self.opened_at))
+
+    def record(self, ok: bool, seconds: float):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+                if ok and seconds < BREAKER_SLOW_SEC:
+                    self.state = CLOSED
+                    self.calls.clear()
+                    log.warning("breaker %s closed", self.name)
+                else:
+                    self._trip("probe failed")
+                return
+            self.calls.append((ok, seconds))
+            if self.state != CLOSED or len(self.calls) < BREAKER_MIN_CALLS:
+                return
+            n = len(self.calls)
+            errors = sum(1 for c_ok, _ in self.calls if not c_ok)
+            slow = sum(1 for _, s in self.calls if s >= BREAKER_SLOW_SEC)
+            if errors / n >= BREAKER_ERROR_RATE:
+                self._trip(f"{errors}/{n} errors")
+            elif slow / n >= BREAKER_SLOW_RATE:
+                self._trip(f"{slow}/{n} slow calls")
+
+    def _trip(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.probes = 0
+        self.calls.clear()
+        log.warning("breaker %s open: %s", self.name, reason)
+
+
+BREAKER = Breaker("ruz")
+metrics.BREAKER_STATE.watch(lambda: _STATE_VALUE[BREAKER.state], upstream=BREAKER.name)
+
+
+class _Latency:
+    def __init__(self):
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_latency: Dict[str, _Latency] = {}
+_hedged = deque(maxlen=100)
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+def _stats(method: str) -> _Latency:
+    st = _latency.get(method)
+    if st is None:
+        st = _latency[method] = _Latency()
+    return st
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class budget:
+    def __init__(self, seconds: float = REQUEST_BUDGET):
+        self.seconds = seconds
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.seconds
+        outer = _deadline.get()
+        self.token = _deadline.set(deadline if outer is None else min(outer, deadline))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _deadline.reset(self.token)
+        return False
+
+
+def attempt_timeout(method: str) -> float:
+    timeout = UPSTREAM_TIMEOUT
+    p99 = _stats(method).quantile(0.99)
+    if p99 is not None and BREAKER.state == CLOSED:
+        timeout = min(UPSTREAM_TIMEOUT, max(UPSTREAM_MIN_TIMEOUT, p99 * TIMEOUT_FACTOR))
+    left = remaining()
+    if left is not None:
+        timeout = min(timeout, left)
+    return timeout
+
+
+def _hedge_after(method: str, timeout: float) -> Optional[float]:
+    if not HEDGE or BREAKER.state != CLOSED:
+        return None
+    p95 = _stats(method).quantile(0.95)
+    if p95 is None or p95 >= timeout:
+        return None
+    if _hedged and sum(_hedged) >= HEDGE_MAX_RATIO * _hedged.maxlen:
+        return None
+    return p95
+
+
+def _client_error(e: Exception) -> bool:
+    response = getattr(e, "response", None)
+    return response is not None and 400 <= response.status_code < 500
+
+
+async def _run(method: str, fn, args):
+    t0 = time.monotonic()
+    try:
+        res = await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        BREAKER.record(_client_error(e), time.monotonic() - t0)
+        raise
+    dt = time.monotonic() - t0
+    BREAKER.record(True, dt)
+    _stats(method).add(dt)
+    return res
+
+
+async def _attempt(method: str, fn, args, timeout: float):
+    if not BREAKER.allow():
+        metrics.BREAKER_REJECTED.inc(method=method)
+        raise CircuitOpen(BREAKER.retry_in())
+    t0 = time.monotonic()
+    end = t0 + timeout
+    tasks = {asyncio.ensure_future(_run(method, fn, args))}
+    hedge_after = _hedge_after(method, timeout)
+    hedged = False
+    error = None
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and BREAKER.allow():
+                metrics.UPSTREAM_HEDGES.inc(method=method)
+                tasks.add(asyncio.ensure_future(_run(method, fn, args)))
+                hedged = True
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, timeout=max(0.0, end - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = t.exception()
+        if error is not None and not tasks:
+            raise error
+        BREAKER.record(False, timeout)
+        _stats(method).add(timeout)
+        raise TimeoutError(f"РУЗ не ответил за {timeout:.1f} с")
+    finally:
+        _hedged.append(hedged)
+        for t in tasks:
+            t.cancel()
+
+
+async def call(method: str, fn, *args):
+    retries = 0
+    while True:
+        timeout = attempt_timeout(method)
+        if timeout < MIN_ATTEMPT and remaining() is not None:
+            raise TimeoutError("Не успели получить ответ РУЗ, попробуйте ещё раз")
+        try:
+            return await _attempt(method, fn, args, timeout)
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            if retries >= RETRY_MAX or _client_error(e):
+                raise
+            retries += 1
+            delay = random.uniform(0, RETRY_BASE * (2 ** (retries - 1)))
+            left = remaining()
+            if left is not None and left - delay < MIN_ATTEMPT:
+                raise
+            metrics.UPSTREAM_RETRIES.inc(method=method)
+            log.info("retrying %s in %.2fs after %s", method, delay, e)
+            await asyncio.sleep(delay)
+
+
+class _Budget(BaseMiddleware):
+    async def __call__(self, handler, event_object, data):
+        with budget():
+            return await handler(event_object, data)
+
+
+def instrument_dispatcher(dp):
+    dp.outer_middleware(_Budget())
+
+
+class StaleRecords(list):
+    def __init__(self, records, fetched_at: float):
+        super().__init__(records)
+        self.fetched_at = fetched_at
+
+
+def stale(records, fetched_at: Optional[float], kind: str) -> Optional[StaleRecords]:
+    if records is None or fetched_at is None:
+        return None
+    metrics.STALE_SERVED.inc(kind=kind)
+    return StaleRecords(records, fetched_at)
+
+
+def stale_note(raw) -> Optional[str]:
+    if not isinstance(raw, StaleRecords):
+        return None
+    when = datetime.fromtimestamp(raw.fetched_at).strftime("%d.%m %H:%M")
+    return f"⚠️ РУЗ сейчас недоступен. Показано сохранённое расписание от {when}, оно могло измениться."